@@ -0,0 +1,205 @@
+"""Measure DDS throughput per entry point, input format, chunk size and threads.
+
+Deals come from a seeded NumPy generator, so every run solves the same
+boards and no deal tool is needed. Each thread count runs in a fresh
+interpreter because SetMaxThreads sizes DDS once per process. Table
+entry points solve full DD tables; board entry points solve one board
+per deal (No-Trump, West on lead). Usage:
+
+    python bench_dds.py [--deals N] [--threads 1,2,4] [--json] [--output FILE]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from ctypes import byref, c_int, memmove
+
+import numpy as np
+
+try:
+    from . import dds, symmetry
+except ImportError:
+    import dds
+    import symmetry
+
+
+def random_holdings(num_deals: int, seed: int) -> np.ndarray:
+    """Uniformly random complete deals as (n, 4, 4) DDS holdings."""
+
+    rng = np.random.default_rng(seed)
+    seats = np.repeat(np.arange(dds.DDS_HANDS, dtype=np.uint8), 13)
+    owners = rng.permuted(np.tile(seats, (num_deals, 1)), axis=1)
+    return symmetry.owners_to_holdings(owners.reshape(num_deals, dds.DDS_SUITS, 13))
+
+
+def _calc_all_tables(function, table_deals, fill):
+    def run(num_deals: int, chunk: int) -> None:
+        filter_arg = (c_int * dds.DDS_STRAINS)()
+        results = dds.ddTablesRes()
+        par_results = dds.allParResults()
+        for start in range(0, num_deals, chunk):
+            stop = min(start + chunk, num_deals)
+            table_deals.noOfTables = stop - start
+            fill(start, stop)
+            ret = function(byref(table_deals), -1, filter_arg, byref(results), byref(par_results))
+            if ret != dds.RETURN_NO_FAULT:
+                raise dds.DDSError(function.__name__, ret)
+
+    return run
+
+
+def _solve_boards(function, bo, fill, pass_chunk: bool):
+    def run(num_deals: int, chunk: int) -> None:
+        solved = dds.solvedBoards()
+        step = dds.MAXNOOFBOARDS if pass_chunk else chunk
+        for start in range(0, num_deals, step):
+            stop = min(start + step, num_deals)
+            bo.noOfBoards = stop - start
+            fill(start, stop)
+            args = (byref(bo), byref(solved), chunk) if pass_chunk else (byref(bo), byref(solved))
+            ret = function(*args)
+            if ret != dds.RETURN_NO_FAULT:
+                raise dds.DDSError(function.__name__, ret)
+
+    return run
+
+
+def entry_points(holdings: np.ndarray) -> dict[str, tuple[str, str, object]]:
+    """name -> (input format, unit, run(num_deals, chunk))."""
+
+    holdings = np.ascontiguousarray(holdings, dtype=np.uint32)
+    pbn = [deal.encode("ascii") for deal in dds.holdings_to_pbn(holdings)]
+
+    table_deals = dds.ddTableDeals()
+    table_deals_pbn = dds.ddTableDealsPBN()
+
+    def fill_tables(start, stop):
+        chunk = holdings[start:stop]
+        memmove(table_deals.deals, chunk.ctypes.data, chunk.nbytes)
+
+    def fill_tables_pbn(start, stop):
+        for i, cards in enumerate(pbn[start:stop]):
+            table_deals_pbn.deals[i].cards = cards
+
+    boards = dds.boards()
+    boards_pbn = dds.boardsPBN()
+    for bo in (boards, boards_pbn):
+        for i in range(dds.MAXNOOFBOARDS):
+            bo.deals[i].trump = dds.SUIT_NT
+            bo.deals[i].first = dds.HAND_WEST
+            bo.target[i] = -1
+            bo.solutions[i] = 1
+            bo.mode[i] = 1
+
+    def fill_boards(start, stop):
+        for i in range(stop - start):
+            memmove(boards.deals[i].remainCards, holdings[start + i].ctypes.data, holdings[start + i].nbytes)
+
+    def fill_boards_pbn(start, stop):
+        for i, cards in enumerate(pbn[start:stop]):
+            boards_pbn.deals[i].remainCards = cards
+
+    return {
+        "CalcAllTables": ("binary", "table", _calc_all_tables(dds.CalcAllTables, table_deals, fill_tables)),
+        "CalcAllTablesPBN": ("pbn", "table", _calc_all_tables(dds.CalcAllTablesPBN, table_deals_pbn, fill_tables_pbn)),
+        "SolveAllBoards": ("pbn", "board", _solve_boards(dds.SolveAllBoards, boards_pbn, fill_boards_pbn, False)),
+        "SolveAllChunksBin": ("binary", "board", _solve_boards(dds.solveAllChunksBin, boards, fill_boards, True)),
+        "SolveAllChunksPBN": ("pbn", "board", _solve_boards(dds.SolveAllChunksPBN, boards_pbn, fill_boards_pbn, True)),
+    }
+
+
+def run_worker(args) -> list[dict]:
+    """Measure every entry point and chunk size with one SetMaxThreads value."""
+
+    dds.SetMaxThreads(args.worker_threads)
+    info = dds.DDSInfo()
+    dds.GetDDSInfo(byref(info))
+    holdings = random_holdings(args.deals, args.seed)
+    records = []
+    for name, (input_format, unit, run) in entry_points(holdings).items():
+        chunks = args.table_chunks if unit == "table" else args.board_chunks
+        for chunk in chunks:
+            run(min(chunk, args.deals), chunk)  # warm up transposition tables
+            best = float("inf")
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                run(args.deals, chunk)
+                best = min(best, time.perf_counter() - started)
+            records.append(
+                {
+                    "entry_point": name,
+                    "input": input_format,
+                    "unit": unit,
+                    "threads": args.worker_threads,
+                    "dds_threads": info.noOfThreads,
+                    "chunk": chunk,
+                    "deals": args.deals,
+                    "seconds": best,
+                    "deals_per_second": args.deals / best,
+                }
+            )
+    return records
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(part) for part in text.split(",") if part]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--deals", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--threads", type=_int_list, default=[1, os.cpu_count() or 1],
+                        help="comma-separated SetMaxThreads values (0 = DDS default)")
+    parser.add_argument("--table-chunks", type=_int_list, default=[10, dds.MAXNOOFTABLES],
+                        help="tables per CalcAllTables* call (at most MAXNOOFTABLES)")
+    parser.add_argument("--board-chunks", type=_int_list, default=[1, 10, dds.MAXNOOFBOARDS],
+                        help="boards per SolveAllBoards call / SolveAllChunks* chunkSize")
+    parser.add_argument("--repeat", type=int, default=1, help="keep the best of N runs")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--worker-threads", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_threads is not None:
+        print(json.dumps(run_worker(args)))
+        return
+
+    records = []
+    for threads in dict.fromkeys(args.threads):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--worker-threads", str(threads)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        records.extend(json.loads(output.splitlines()[-1]))
+
+    results = {
+        "seed": args.seed,
+        "deals": args.deals,
+        "cpu_count": os.cpu_count(),
+        "results": records,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for record in records:
+        print(
+            f"{record['entry_point']:18s} {record['input']:6s} threads {record['threads']:2d}"
+            f" ({record['dds_threads']:2d} in DDS)  chunk {record['chunk']:3d}"
+            f"  {record['deals_per_second']:9.1f} {record['unit']}s/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
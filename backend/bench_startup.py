@@ -0,0 +1,80 @@
+"""Measure cold-start latency of the backend modules.
+
+Every sample runs in a fresh interpreter, so nothing is cached in
+sys.modules between runs (the OS page cache still is). Usage:
+
+    python bench_startup.py [--repeat N] [--json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    "import conditional_probability": "import conditional_probability",
+    "import dds": "import dds",
+    "import main": "import main",
+    "import main + load libdds": "import main, dds; dds.load_library()",
+    "import main + first DD table": (
+        "import main; main.analyse_deal(main.DealPBN(pbn="
+        "'N:AKQJ.T98.765.432 T98.AKQJ.432.765 765.432.AKQJ.T98 432.765.T98.AKQJ'))"
+    ),
+}
+
+TIMER = """
+import time
+_started = time.perf_counter()
+{statement}
+import sys
+print(time.perf_counter() - _started)
+print(int("dds" in sys.modules and sys.modules["dds"].is_loaded()))
+"""
+
+
+def measure(statement: str, repeat: int) -> dict[str, float | bool]:
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    loaded = False
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", TIMER.format(statement=statement)],
+            cwd=backend_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        samples.append(float(output[-2]) * 1000)
+        loaded = output[-1] == "1"
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+        "libdds_loaded": loaded,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = {name: measure(statement, args.repeat) for name, statement in SCENARIOS.items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, result in results.items():
+        print(
+            f"{name:32s} median {result['median_ms']:8.1f} ms"
+            f"  (min {result['min_ms']:.1f}, max {result['max_ms']:.1f})"
+            f"  libdds loaded: {'yes' if result['libdds_loaded'] else 'no'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Compare the variance of plain and shape-stratified single-dummy estimates.
+
+North and South are fixed and East/West unknown. A pool of random deals
+is solved once for one contract; replicate runs of n deals then draw
+from the pool, either uniformly (plain Monte Carlo) or with the
+systematic allocation of stratified.py over East's patterns, drawing
+each pattern's deals from the pool deals with that pattern (patterns
+the pool lacks get a uniform pool deal). The ratio of the two variances
+is how many times more DDS calls plain sampling needs for the same
+standard error. --cache keeps the solved pool in an .npz file for
+later runs. Usage:
+
+    python bench_stratified.py [--pool N] [--deals N] [--repeats N] [--contract 6S] [--cache FILE] [--json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    from . import bitboard, dds, deal_generator, stopping, stratified
+except ImportError:
+    import bitboard
+    import dds
+    import deal_generator
+    import stopping
+    import stratified
+
+NORTH = "AQ982.K74.A6.K93"
+SOUTH = "KJ63.A52.K84.A72"
+
+
+def solve_pool(known, size: int, strain: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """(masks (size, 4), North's tricks in strain (size,)) of random deals."""
+
+    masks = deal_generator.ConstrainedDealGenerator(known, seed=seed).generate(size)
+    tables = dds.calc_all_tables(bitboard.to_holdings(masks), dds.make_trump_filter([strain]))
+    return masks, tables[:, strain, dds.HAND_NORTH]
+
+
+def replicate(tricks, pool_strata, strata, deals: int, repeats: int, seed: int) -> dict[str, np.ndarray]:
+    """Mean tricks of repeats runs of deals each, plain and stratified."""
+
+    rng = np.random.default_rng(seed)
+    members = [np.flatnonzero(pool_strata == stratum) for stratum in range(len(strata))]
+    plain = tricks[rng.integers(len(tricks), size=(repeats, deals))].mean(axis=1)
+    stratified_means = np.empty(repeats)
+    for run in range(repeats):
+        quotas = stratified.allocate(strata.probabilities, deals, rng)
+        rows = [
+            rng.choice(members[stratum] if len(members[stratum]) else len(tricks), size=quota)
+            for stratum, quota in enumerate(quotas)
+            if quota
+        ]
+        stratified_means[run] = tricks[np.concatenate(rows)].mean()
+    return {"plain": plain, "stratified": stratified_means}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pool", type=int, default=1000, help="deals solved with DDS")
+    parser.add_argument("--deals", type=int, default=100, help="deals per replicate run")
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--contract", default="6S")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--cache", help="load the solved pool from / save it to this .npz file")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    level, strain = stopping.parse_contract(args.contract)
+    known = {dds.HAND_NORTH: deal_generator.hand_mask(NORTH), dds.HAND_SOUTH: deal_generator.hand_mask(SOUTH)}
+    strata = stratified.ShapeStrata.build(known, {})
+    started = time.perf_counter()
+    cached = None
+    if args.cache and os.path.exists(args.cache):
+        with np.load(args.cache) as data:
+            if int(data["strain"]) == strain and len(data["tricks"]) >= args.pool:
+                cached = data["masks"][: args.pool], data["tricks"][: args.pool]
+    if cached is not None:
+        masks, tricks = cached
+    else:
+        masks, tricks = solve_pool(known, args.pool, strain, args.seed)
+        if args.cache:
+            np.savez(args.cache, masks=masks, tricks=tricks, strain=strain)
+    seconds = time.perf_counter() - started
+    pool_strata = strata.classify(masks)
+
+    results = {"pool": args.pool, "deals": args.deals, "repeats": args.repeats, "contract": args.contract,
+               "strata": len(strata), "solve_seconds": seconds, "estimates": {}}
+    for name, values in (("tricks", tricks.astype(float)), ("make", (tricks >= level + 6).astype(float))):
+        means = replicate(values, pool_strata, strata, args.deals, args.repeats, args.seed + 1)
+        variance = {method: float(np.var(runs, ddof=1)) for method, runs in means.items()}
+        results["estimates"][name] = {
+            **{f"{method}_variance": value for method, value in variance.items()},
+            "variance_ratio": variance["plain"] / variance["stratified"] if variance["stratified"] else None,
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.pool} deals solved in {seconds:.1f} s, {len(strata)} East patterns, "
+          f"{args.repeats} runs of {args.deals} deals, {args.contract} by North")
+    for name, estimate in results["estimates"].items():
+        ratio = estimate["variance_ratio"]
+        print(f"{name:7s} plain {estimate['plain_variance']:.3g}  stratified {estimate['stratified_variance']:.3g}"
+              f"  ratio {'-' if ratio is None else f'{ratio:.2f}'}")
+
+
+if __name__ == "__main__":
+    main()
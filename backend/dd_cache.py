@@ -0,0 +1,302 @@
+"""Content-addressed cache of double-dummy tables.
+
+A deal is keyed by a canonical 52-card encoding: the owner seat (0-3, in
+DDS hand order N, E, S, W) of every card in S, H, D, C x A..2 order, two
+bits per card, i.e. 13 bytes. The same deal therefore gets the same key
+whichever seat its PBN string started with.
+
+cached_calc_all_tables() keys and stores every deal in its canonical form
+under seat rotation and suit relabelling (see symmetry.py), so deals that
+only differ by those share one entry. Tables are stored as 20 signed
+bytes in ddTableResults.resTable order; -1 marks a strain that was
+filtered out when the deal was solved, so a later request for that
+strain is a miss and fills the gap.
+
+The cache has a bounded in-memory LRU tier and an optional sqlite tier
+that every uvicorn worker on the host can share.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Sequence
+
+import numpy as np
+
+try:
+    from . import dds, symmetry
+except ImportError:
+    import dds
+    import symmetry
+
+
+__all__ = [
+    "DDTableCache",
+    "UNSOLVED",
+    "cached_calc_all_tables",
+    "deal_keys",
+]
+
+UNSOLVED = -1
+TABLE_SHAPE = (dds.DDS_STRAINS, dds.DDS_HANDS)
+
+
+def deal_keys(holdings) -> list[bytes | None]:
+    """Canonical 13-byte keys for (n, 4, 4) DDS holdings.
+
+    Deals that do not place each of the 52 cards exactly once get None
+    and are never cached.
+    """
+
+    holdings = np.asarray(holdings, dtype=np.uint32)
+    if len(holdings) == 0:
+        return []
+    owners, complete = symmetry.card_owners(holdings)
+    seats = owners.reshape(len(holdings), 13, 4)
+    packed = seats[..., 0] | (seats[..., 1] << 2) | (seats[..., 2] << 4) | (seats[..., 3] << 6)
+    return [
+        row.tobytes() if is_complete else None
+        for row, is_complete in zip(packed, complete)
+    ]
+
+
+class DDTableCache:
+    """LRU tier in front of an optional sqlite tier, with hit counters."""
+
+    def __init__(self, max_entries: int = 100_000, path: str | None = None) -> None:
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory: OrderedDict[bytes, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS dd_tables (key BLOB PRIMARY KEY, tricks BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> DDTableCache:
+        """Cache sized by DD_CACHE_SIZE with the sqlite tier at DD_CACHE_PATH."""
+
+        return cls(
+            max_entries=int(os.environ.get("DD_CACHE_SIZE", "100000")),
+            path=os.environ.get("DD_CACHE_PATH") or None,
+        )
+
+    def get(self, key: bytes | None, strains: Sequence[int] | None = None) -> np.ndarray | None:
+        """Cached table for key if every strain in strains is solved."""
+
+        return self.get_many([key], strains)[0]
+
+    def get_many(self, keys: Sequence[bytes | None], strains=None) -> list[np.ndarray | None]:
+        """Cached tables for keys, None where a required strain is missing.
+
+        strains is a list of strain indices required for every key, or an
+        (n, 5) boolean array of the strains required per key.
+        """
+
+        wanted = np.ones((len(keys), dds.DDS_STRAINS), dtype=bool)
+        if strains is not None and np.ndim(strains) == 2:
+            wanted[:] = strains
+        elif strains is not None:
+            wanted[:] = False
+            wanted[:, list(strains)] = True
+        found: list[np.ndarray | None] = []
+        disk_keys = []
+        with self._lock:
+            for key in keys:
+                stored = None if key is None else self._memory.get(key)
+                if stored is not None:
+                    self._memory.move_to_end(key)
+                elif key is not None and self._db is not None:
+                    disk_keys.append(key)
+                found.append(None if stored is None else _decode(stored))
+        if disk_keys:
+            from_disk = self._load(disk_keys)
+            with self._lock:
+                for index, key in enumerate(keys):
+                    if found[index] is None and key in from_disk:
+                        self._remember(key, from_disk[key])
+                        found[index] = _decode(from_disk[key])
+                        self.disk_hits += 1
+
+        results: list[np.ndarray | None] = []
+        with self._lock:
+            for table, required in zip(found, wanted):
+                if table is not None and (table[required] != UNSOLVED).all():
+                    self.hits += 1
+                    results.append(table)
+                else:
+                    self.misses += 1
+                    results.append(None)
+        return results
+
+    def put_many(self, keys: Sequence[bytes | None], tables) -> None:
+        """Store tables, merging strains already cached for the same deal.
+
+        With the sqlite tier the merge reads the stored rows inside the
+        write transaction, so strains evicted from memory or added by
+        another worker are kept.
+        """
+
+        merged: dict[bytes, np.ndarray] = {}
+        for key, table in zip(keys, tables):
+            if key is None:
+                continue
+            table = np.asarray(table, dtype=np.int8).reshape(TABLE_SHAPE)
+            merged[key] = _merge(table, merged[key]) if key in merged else table
+        if not merged:
+            return
+        with self._lock:
+            for key in merged:
+                previous = self._memory.get(key)
+                if previous is not None:
+                    merged[key] = _merge(merged[key], _decode(previous))
+            if self._db is not None:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    for key, stored in self._select(list(merged)).items():
+                        merged[key] = _merge(merged[key], _decode(stored))
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO dd_tables (key, tricks) VALUES (?, ?)",
+                        [(key, table.tobytes()) for key, table in merged.items()],
+                    )
+                    self._db.commit()
+                except BaseException:
+                    self._db.rollback()
+                    raise
+            for key, table in merged.items():
+                self._remember(key, table.tobytes())
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+            }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: bytes, encoded: bytes) -> None:
+        self._memory[key] = encoded
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys: list[bytes]) -> dict[bytes, bytes]:
+        with self._lock:
+            return self._select(keys)
+
+    def _select(self, keys: list[bytes]) -> dict[bytes, bytes]:
+        # Called with the lock held.
+        loaded: dict[bytes, bytes] = {}
+        # Stay well below sqlite's bound-parameter limit.
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._db.execute(
+                f"SELECT key, tricks FROM dd_tables WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            loaded.update(rows)
+        return loaded
+
+
+def _merge(table: np.ndarray, other: np.ndarray) -> np.ndarray:
+    # Strains solved in either table; table wins where both are.
+    return np.where(table == UNSOLVED, other, table)
+
+
+def cached_calc_all_tables(
+    cache: DDTableCache | None,
+    holdings,
+    trump_filter: Sequence[int] | None = None,
+    solve: Callable = dds.calc_all_tables,
+    vulnerable: int | None = None,
+):
+    """dds.calc_all_tables() with a cache in front of it.
+
+    Only deals missing from the cache are passed to solve (any callable
+    with the calc_all_tables signature, e.g. a DDSProcessPool method),
+    and deals repeated inside the batch, up to symmetry, are solved once.
+
+    With vulnerable, (tricks, par) is returned like calc_all_tables does.
+    Par is not cached: it comes with the solve for missing deals and from
+    dds.par_from_tables() for cached ones.
+    """
+
+    holdings = np.asarray(holdings, dtype=np.uint32)
+    if cache is None:
+        if vulnerable is None:
+            return solve(holdings, trump_filter)
+        return solve(holdings, trump_filter, vulnerable)
+
+    canonical, transforms = symmetry.canonicalize(holdings)
+    keys = deal_keys(canonical)
+    required = np.ones((len(holdings), dds.DDS_STRAINS), dtype=bool)
+    if trump_filter is not None:
+        required[:] = [not skip for skip in trump_filter]
+    required = symmetry.tables_to_canonical(
+        np.broadcast_to(required[:, :, None], (len(holdings), *TABLE_SHAPE)), transforms
+    )[:, :, 0]
+
+    canonical_tables = np.zeros((len(holdings), *TABLE_SHAPE), dtype=np.int8)
+    missing: dict[object, list[int]] = {}
+    for index, table in enumerate(cache.get_many(keys, required)):
+        if table is not None:
+            canonical_tables[index] = table
+        elif keys[index] is None:
+            # Uncacheable deals are keyed by position so they are still solved.
+            missing[index] = [index]
+        else:
+            missing.setdefault((keys[index], required[index].tobytes()), []).append(index)
+
+    par = np.zeros((len(holdings), 2), dtype=np.intc)
+    solved_par = None
+    if missing:
+        firsts = [indices[0] for indices in missing.values()]
+        if vulnerable is None:
+            solved = solve(holdings[firsts], trump_filter)
+        else:
+            solved, solved_par = solve(holdings[firsts], trump_filter, vulnerable)
+        solved = np.asarray(solved).astype(np.int8)
+        if trump_filter is not None:
+            solved[:, [bool(skip) for skip in trump_filter]] = UNSOLVED
+        solved = symmetry.tables_to_canonical(solved, transforms[firsts])
+        cache.put_many([keys[index] for index in firsts], solved)
+        for table, indices in zip(solved, missing.values()):
+            canonical_tables[indices] = table
+
+    tricks = symmetry.tables_from_canonical(canonical_tables, transforms).astype(np.intc)
+    tricks[tricks == UNSOLVED] = 0
+    if vulnerable is None:
+        return tricks
+    solved_rows = np.zeros(len(holdings), dtype=bool)
+    if solved_par is not None:
+        for scores, indices in zip(solved_par, missing.values()):
+            par[indices[0]] = scores
+            solved_rows[indices[0]] = True
+    others = np.flatnonzero(~solved_rows)
+    par[others] = dds.par_from_tables(tricks[others], vulnerable)
+    return tricks, par
+
+
+def _decode(encoded: bytes) -> np.ndarray:
+    return np.frombuffer(encoded, dtype=np.int8).reshape(TABLE_SHAPE).copy()
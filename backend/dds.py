@@ -15,32 +15,66 @@ See the License for the specific language governing permissions and
 limitations under the License."""
 
 import os
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from ctypes import *
 
-# dds = cdll.LoadLibrary(
-#     "C:/Users/t572w/OneDrive/ドキュメント/programs/board-ocr/dds.dll"
-# )
+import numpy as np
+
 script_path = os.path.abspath(__file__)
-# このファイルがあるディレクトリ（つまり 'dds' フォルダ）のパスを取得
+# このファイルがあるディレクトリのパスを取得
 script_dir = os.path.dirname(script_path)
-# 1つ上の階層（プロジェクトルート）にあるはずのdllへのパスを構築
-# これにより、実行場所に関わらず、常に正しい場所のdllを探しに行きます。
-# dll_path = os.path.join(script_dir, "dds.dll")
-dll_path = os.path.join(script_dir, "libdds.so")
-# パスを正規化（例: C:\path\dds\..\dds.dll -> C:\path\dds.dll）
-dll_path = os.path.normpath(dll_path)
-
-# デバッグ用に、どのパスを読み込もうとしているか表示
-print(f"DEBUG: Attempting to load DLL from absolute path: {dll_path}")
-
-if not os.path.exists(dll_path):
-    raise FileNotFoundError(
-        f"DLL not found at the constructed absolute path: {dll_path}"
-    )
+# これにより、実行場所に関わらず、常に正しい場所のライブラリを探しに行きます。
+dll_path = os.path.normpath(os.path.join(script_dir, "libdds.so"))
+
+# ライブラリは最初に DDS 関数を呼び出したときに読み込む。
+# import するだけのプロセス（確率計算のみ、テストなど）は .so を必要としない。
+_library = None
+_library_lock = threading.Lock()
+
+
+def library_available():
+    return os.path.exists(dll_path)
+
+
+def is_loaded():
+    return _library is not None
+
+
+def load_library():
+    """Load libdds.so on first use and return the CDLL handle."""
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                if not library_available():
+                    raise FileNotFoundError(
+                        f"DLL not found at the constructed absolute path: {dll_path}"
+                    )
+                _library = cdll.LoadLibrary(dll_path)
+    return _library
+
+
+class _LazyFunction:
+    """A DDS entry point whose symbol is resolved on the first call."""
+
+    def __init__(self, symbol, argtypes, restype):
+        self.__name__ = symbol
+        self.argtypes = argtypes
+        self.restype = restype
+        self._function = None
+
+    def __call__(self, *args):
+        function = self._function
+        if function is None:
+            function = getattr(load_library(), self.__name__)
+            function.argtypes = self.argtypes
+            function.restype = self.restype
+            self._function = function
+        return function(*args)
 
-# 絶対パスを使ってDLLを読み込む
-dds = cdll.LoadLibrary(dll_path)
-print("Loaded lib {0}".format(dds))
 
 DDS_VERSION = 20700
 
@@ -59,8 +93,15 @@ HAND_SOUTH = 2
 HAND_EAST = 1
 HAND_WEST = 3
 
+VUL_NONE = 0
+VUL_BOTH = 1
+VUL_NS = 2
+VUL_EW = 3
+
 MAXNOOFBOARDS = 200  # 200
 
+MAXNOOFTABLES = 40
+
 MAXNOOFHANDS = 32
 
 RETURN_NO_FAULT = 1
@@ -207,7 +248,7 @@ class ddTableDeal(Structure):
 class ddTableDeals(Structure):
     _fields_ = [
         ("noOfTables", c_int),
-        ("deals", ddTableDeal * (MAXNOOFBOARDS >> 2)),
+        ("deals", ddTableDeal * (MAXNOOFTABLES * DDS_STRAINS)),
     ]
 
 
@@ -218,7 +259,7 @@ class ddTableDealPBN(Structure):
 class ddTableDealsPBN(Structure):
     _fields_ = [
         ("noOfTables", c_int),
-        ("deals", ddTableDealPBN * (MAXNOOFBOARDS >> 2)),
+        ("deals", ddTableDealPBN * (MAXNOOFTABLES * DDS_STRAINS)),
     ]
 
 
@@ -229,7 +270,7 @@ class ddTableResults(Structure):
 class ddTablesRes(Structure):
     _fields_ = [
         ("noOfBoards", c_int),
-        ("results", ddTableResults * (MAXNOOFBOARDS >> 2)),
+        ("results", ddTableResults * (MAXNOOFTABLES * DDS_STRAINS)),
     ]
 
 
@@ -245,7 +286,7 @@ class parResults(Structure):
 
 
 class allParResults(Structure):
-    _fields_ = [("presults", parResults * (MAXNOOFBOARDS // 20))]
+    _fields_ = [("presults", parResults * MAXNOOFTABLES)]
 
 
 class parResultsDealer(Structure):
@@ -327,257 +368,699 @@ class solvedPlays(Structure):
     ]
 
 
-SetMaxThreads = dds.SetMaxThreads
-"""int userThreads"""
-SetMaxThreads.argtypes = [c_int]
-SetMaxThreads.restype = None
+class DDSInfo(Structure):
+    """threading: 0 = none, 1 = Windows, 2 = OpenMP, 3 = GCD, 4 = Boost,
+        5 = STL, 6 = TBB, 7 = STLIMPL, 8 = PPLIMPL
+    noOfThreads: number of thread slots actually configured"""
+
+    _fields_ = [
+        ("major", c_int),
+        ("minor", c_int),
+        ("patch", c_int),
+        ("versionString", c_char * 10),
+        ("system", c_int),
+        ("numBits", c_int),
+        ("compiler", c_int),
+        ("constructor", c_int),
+        ("numCores", c_int),
+        ("threading", c_int),
+        ("noOfThreads", c_int),
+        ("threadSizes", c_char * 128),
+        ("systemString", c_char * 1024),
+    ]
 
-FreeMemory = dds.FreeMemory
-FreeMemory.argtypes = None
-FreeMemory.restype = None
 
-SolveBoard = dds.SolveBoard
+SetMaxThreads = _LazyFunction(
+    "SetMaxThreads",
+    [c_int],
+    None,
+)
+"""int userThreads"""
+
+FreeMemory = _LazyFunction(
+    "FreeMemory",
+    [],
+    None,
+)
+
+GetDDSInfo = _LazyFunction(
+    "GetDDSInfo",
+    [POINTER(DDSInfo)],
+    None,
+)
+"""pointer to struct DDSInfo * info"""
+
+SolveBoard = _LazyFunction(
+    "SolveBoard",
+    [deal, c_int, c_int, c_int, POINTER(futureTricks), c_int],
+    c_int,
+)
 """deal dl
 int target
 int solutions
 int mode,
 pointer to struct futureTricks * futp
 int threadIndex"""
-SolveBoard.argtypes = [deal, c_int, c_int, c_int, POINTER(futureTricks), c_int]
-SolveBoard.restype = c_int
 
-SolveBoardPBN = dds.SolveBoardPBN
+SolveBoardPBN = _LazyFunction(
+    "SolveBoardPBN",
+    [
+        dealPBN,
+        c_int,
+        c_int,
+        c_int,
+        POINTER(futureTricks),
+        c_int,
+    ],
+    c_int,
+)
 """dealPBN dlpbn
 int target
 int solutions
 int mode
 pointer to struct futureTricks * futp
 int thrId"""
-SolveBoardPBN.argtypes = [
-    dealPBN,
-    c_int,
-    c_int,
-    c_int,
-    POINTER(futureTricks),
-    c_int,
-]
-SolveBoardPBN.restype = c_int
 
-CalcDDtable = dds.CalcDDtable
+CalcDDtable = _LazyFunction(
+    "CalcDDtable",
+    [ddTableDeal, POINTER(ddTableResults)],
+    c_int,
+)
 """struct ddTableDeal tableDeal
 pointer to struct ddTableResults * tablep"""
-CalcDDtable.argtypes = [ddTableDeal, POINTER(ddTableResults)]
-CalcDDtable.restype = c_int
 
-CalcDDtablePBN = dds.CalcDDtablePBN
+CalcDDtablePBN = _LazyFunction(
+    "CalcDDtablePBN",
+    [ddTableDealPBN, POINTER(ddTableResults)],
+    c_int,
+)
 """srtuct ddTableDealPBN tableDealPBN
 pointer to struct ddTableResults * tablep"""
-CalcDDtablePBN.argtypes = [ddTableDealPBN, POINTER(ddTableResults)]
-CalcDDtablePBN.restype = c_int
 
-CalcAllTables = dds.CalcAllTables
+CalcAllTables = _LazyFunction(
+    "CalcAllTables",
+    [
+        POINTER(ddTableDeals),
+        c_int,
+        c_int * DDS_STRAINS,
+        POINTER(ddTablesRes),
+        POINTER(allParResults),
+    ],
+    c_int,
+)
 """pointer to struct dd TableDeals * dealsp
 int mode
 int trumpFilter[DDS_STRAINS]
 poiter to struct ddTablesRes * resp
 pointer to struct allParResults'* presp"""
-CalcAllTables.argtypes = [
-    POINTER(ddTableDeals),
-    c_int * DDS_STRAINS,
-    c_int,
-    POINTER(ddTablesRes),
-    POINTER(allParResults),
-]
-CalcAllTables.restype = c_int
 
-CalcAllTablesPBN = dds.CalcAllTablesPBN
+CalcAllTablesPBN = _LazyFunction(
+    "CalcAllTablesPBN",
+    [
+        POINTER(ddTableDealsPBN),
+        c_int,
+        c_int * DDS_STRAINS,
+        POINTER(ddTablesRes),
+        POINTER(allParResults),
+    ],
+    c_int,
+)
 """pointer to struct ddTableDealsPBN * dealsp
 int mode
 int trumpFilter[DDS_STRINS]
 pointer to struct ddTablesRes *resp
 pointer to struct allParResults * presp"""
-CalcAllTablesPBN.argtypes = [
-    POINTER(ddTableDealsPBN),
-    c_int * DDS_STRAINS,
-    c_int,
-    POINTER(ddTablesRes),
-    POINTER(allParResults),
-]
-CalcAllTablesPBN.restype = c_int
 
-SolveAllBoards = dds.SolveAllBoards
+SolveAllBoards = _LazyFunction(
+    "SolveAllBoards",
+    [POINTER(boardsPBN), POINTER(solvedBoards)],
+    c_int,
+)
 """pointer to struct boardsPBN * bop
 pointer to struct solvedBoards * solvedp"""
-SolveAllBoards.argtypes = [POINTER(boardsPBN), POINTER(solvedBoards)]
-SolveAllBoards.restype = c_int
 
-SolveAllChunks = dds.SolveAllChunks
+SolveAllChunks = _LazyFunction(
+    "SolveAllChunks",
+    [POINTER(boardsPBN), POINTER(solvedBoards), c_int],
+    c_int,
+)
 """pointer to struct boardsPBN * bop
 pointer to struct solvedBoards * solvedP
 int chunkSize"""
-SolveAllChunks.argtypes = [POINTER(boardsPBN), POINTER(solvedBoards), c_int]
-SolveAllChunks.restype = c_int
 
-solveAllChunksBin = dds.SolveAllChunksBin
+solveAllChunksBin = _LazyFunction(
+    "SolveAllChunksBin",
+    [POINTER(boards), POINTER(solvedBoards), c_int],
+    c_int,
+)
 """pointer to struct boards * bop
 pointer to struct solvedBoards * solvedp
 int chunkSize"""
-solveAllChunksBin.argtypes = [POINTER(boards), POINTER(solvedBoards), c_int]
-solveAllChunksBin.restype = c_int
 
-solveAllChunksPBN = dds.SolveAllChunksPBN
+solveAllChunksPBN = _LazyFunction(
+    "SolveAllChunksPBN",
+    [POINTER(boardsPBN), POINTER(solvedBoards), c_int],
+    c_int,
+)
 """pointer to struct boardsPBN * bop
 pointer to struct solvedBoards * solvedp
 int chunkSize"""
-solveAllChunksPBN.argtypes = [POINTER(boardsPBN), POINTER(solvedBoards), c_int]
-solveAllChunksPBN.restype = c_int
 
-SolveAllChunksPBN = dds.SolveAllChunksPBN
+SolveAllChunksPBN = _LazyFunction(
+    "SolveAllChunksPBN",
+    [POINTER(boardsPBN), POINTER(solvedBoards), c_int],
+    c_int,
+)
 """pointer to struct boardsPBN * bop
 pointer to struct solvedBoards * solvedp
 int chunkSize"""
-SolveAllChunksPBN.argtypes = [POINTER(boardsPBN), POINTER(solvedBoards), c_int]
-SolveAllChunksPBN.restype = c_int
 
-Par = dds.Par
+Par = _LazyFunction(
+    "Par",
+    [POINTER(ddTableResults), POINTER(parResults), c_int],
+    c_int,
+)
 """pointer to struct ddTableResults * tablep
 pointer to struct parResults * presp
 int vulnerable"""
-Par.argtypes = [POINTER(ddTableResults), POINTER(parResults), c_int]
-Par.restype = c_int
 
-CalcPar = dds.CalcPar
-"""struct ddTableDeal
-int ulnerable
-pointer to struct ddTablesRes * tablep
-pointer to parResults * presp"""
-CalcPar.argtypes = [
-    ddTableDeal,
+CalcPar = _LazyFunction(
+    "CalcPar",
+    [
+        ddTableDeal,
+        c_int,
+        POINTER(ddTableResults),
+        POINTER(parResults),
+    ],
     c_int,
-    POINTER(ddTableResults),
-    POINTER(parResults),
-]
-CalcPar.restype = c_int
-
-CalcPar = dds.CalcPar
+)
 """struct ddTableDeal tableDeal
 int vulnerable
 pointer to struct ddTableResults * tablep
 pointer to parResults * presp"""
-CalcPar.argtypes = [
-    ddTableDeal,
-    c_int,
-    POINTER(ddTableResults),
-    POINTER(parResults),
-]
-CalcPar.restype = c_int
 
-CalcParPBN = dds.CalcParPBN
+CalcParPBN = _LazyFunction(
+    "CalcParPBN",
+    [
+        ddTableDealPBN,
+        POINTER(ddTableResults),
+        c_int,
+        POINTER(parResults),
+    ],
+    c_int,
+)
 """struct ddTableDealPBN tableDealPBN
 pointer tostruct ddTableResults * tablep
 int vulnerable
 pointer to struct parResults * presp"""
-CalcParPBN.argtypes = [
-    ddTableDealPBN,
-    POINTER(ddTableResults),
-    c_int,
-    POINTER(parResults),
-]
-CalcParPBN.restype = c_int
 
-SidesPar = dds.SidesPar
+SidesPar = _LazyFunction(
+    "SidesPar",
+    [POINTER(ddTableResults), parResultsDealer * 2, c_int],
+    c_int,
+)
 """pointer to struct ddTableResults * tablep,
 array struct parResultsDealer sidesRes[2],
 int vulnerable"""
-SidesPar.argtypes = [POINTER(ddTableResults), parResultsDealer * 2, c_int]
-SidesPar.restypes = c_int
 
-DealerPar = dds.DealerPar
+DealerPar = _LazyFunction(
+    "DealerPar",
+    [
+        POINTER(ddTableResults),
+        POINTER(parResultsDealer),
+        c_int,
+        c_int,
+    ],
+    c_int,
+)
 """pointer to struct ddTableResults * tablep
 pointer to struct parResultsDealer * presp
 int dealer
 int vulnerable"""
-DealerPar.argtypes = [
-    POINTER(ddTableResults),
-    POINTER(parResultsDealer),
-    c_int,
-    c_int,
-]
-DealerPar.restype = c_int
 
-DealerParBin = dds.DealerParBin
+DealerParBin = _LazyFunction(
+    "DealerParBin",
+    [
+        POINTER(ddTableResults),
+        POINTER(parResultsMaster),
+        c_int,
+        c_int,
+    ],
+    c_int,
+)
 """pointer to struct ddTableResults * tablep
 pointer to struct parResultsMaster * presp
 int dealer
 int vulnerable"""
-DealerParBin.argtypes = [
-    POINTER(ddTableResults),
-    POINTER(parResultsMaster),
-    c_int,
-    c_int,
-]
-DealerParBin.restype = c_int
 
-SidesParBin = dds.SidesParBin
+SidesParBin = _LazyFunction(
+    "SidesParBin",
+    [POINTER(ddTableResults), parResultsMaster * 2, c_int],
+    c_int,
+)
 """pointer to struct ddTableResults * tablep
 array struct parResultsMaster sidesRes[2]
 int vulnerable"""
-SidesParBin.argtypes = [POINTER(ddTableResults), parResultsMaster * 2, c_int]
-SidesParBin.restype = c_int
 
-ConvertToDealerTextFormat = dds.ConvertToDealerTextFormat
+ConvertToDealerTextFormat = _LazyFunction(
+    "ConvertToDealerTextFormat",
+    [POINTER(parResultsMaster), c_char_p],
+    c_int,
+)
 """pointer to struct parResultsMaster *pres
 pointer to char *resp"""
-ConvertToDealerTextFormat.argtypes = [POINTER(parResultsMaster), c_char_p]
-ConvertToDealerTextFormat.restype = c_int
 
-ConvertToSidesTextFormat = dds.ConvertToSidesTextFormat
+ConvertToSidesTextFormat = _LazyFunction(
+    "ConvertToSidesTextFormat",
+    [
+        POINTER(parResultsMaster),
+        POINTER(parTextResults),
+    ],
+    c_int,
+)
 """pointer to struct parResultsMaster * pres, 
 pointer to struct parTextResults * resp"""
-ConvertToSidesTextFormat.argtypes = [
-    POINTER(parResultsMaster),
-    POINTER(parTextResults),
-]
-ConvertToSidesTextFormat.restype = c_int
 
-AnalysePlayBin = dds.AnalysePlayBin
+AnalysePlayBin = _LazyFunction(
+    "AnalysePlayBin",
+    [deal, playTraceBin, POINTER(solvedPlay), c_int],
+    c_int,
+)
 """struct deal dl
 struct playTraceBin play
 pointer to struct solvedPlay * solved
 int thrId"""
-AnalysePlayBin.argtypes = [deal, playTraceBin, POINTER(solvedPlay), c_int]
-AnalysePlayBin.restype = c_int
 
-AnalysePlayPBN = dds.AnalysePlayPBN
+AnalysePlayPBN = _LazyFunction(
+    "AnalysePlayPBN",
+    [dealPBN, playTracePBN, POINTER(solvedPlay), c_int],
+    c_int,
+)
 """struct dealPBN dlPBN
 struct playTracePBN playPBN                                 
 pointer to struct solvedPlay * solvedp
 int thrId"""
-AnalysePlayPBN.argtypes = [dealPBN, playTracePBN, POINTER(solvedPlay), c_int]
-AnalysePlayPBN.restype = c_int
 
-AnalyseAllPlaysBin = dds.AnalyseAllPlaysBin
+AnalyseAllPlaysBin = _LazyFunction(
+    "AnalyseAllPlaysBin",
+    [
+        POINTER(boards),
+        POINTER(playTracesBin),
+        POINTER(solvedPlays),
+        c_int,
+    ],
+    c_int,
+)
 """pointer to struct boards * bop
 pointer to struct playTracesBin * plp
 pointer to struct solvedPlays * solvedp
 int chunkSize"""
-AnalyseAllPlaysBin.argtypes = [
-    POINTER(boards),
-    POINTER(playTracesBin),
-    POINTER(solvedPlays),
-    c_int,
-]
-AnalyseAllPlaysBin.restype = c_int
 
-AnalyseAllPlaysPBN = dds.AnalyseAllPlaysPBN
+AnalyseAllPlaysPBN = _LazyFunction(
+    "AnalyseAllPlaysPBN",
+    [
+        POINTER(boardsPBN),
+        POINTER(playTracesPBN),
+        POINTER(solvedPlays),
+        c_int,
+    ],
+    c_int,
+)
 """pointer to struct boardsPBN * bopPBN
 pointer to struct playTracesPBN * plpPBN
 pointer to struct solvedPlays * solvedp
 int chunkSize"""
-AnalyseAllPlaysPBN.argtypes = [
-    POINTER(boardsPBN),
-    POINTER(playTracesPBN),
-    POINTER(solvedPlays),
-    c_int,
-]
-AnalyseAllPlaysPBN.restype = c_int
+
+
+class DDSError(RuntimeError):
+    """Raised when a DDS call returns something other than RETURN_NO_FAULT."""
+
+    def __init__(self, function, code):
+        super().__init__(f"{function} failed with return code: {code}")
+        self.function = function
+        self.code = code
+
+
+def make_trump_filter(strains):
+    """Build a CalcAllTables* trumpFilter that solves only the given strains.
+
+    strains holds DDS strain indices (SUIT_SPADE .. SUIT_NT).
+    """
+    wanted = set(strains)
+    return tuple(0 if strain in wanted else 1 for strain in range(DDS_STRAINS))
+
+
+def tables_per_call(trump_filter=None):
+    """Number of deals one CalcAllTables* call accepts for this filter.
+
+    DDS limits a call to MAXNOOFBOARDS (deal, strain) pairs, so solving
+    fewer strains lets more deals share one call.
+    """
+    if trump_filter is None:
+        strains = DDS_STRAINS
+    else:
+        strains = sum(1 for skip in trump_filter if not skip)
+    if strains == 0:
+        raise DDSError("CalcAllTablesPBN", RETURN_NO_SUIT)
+    return min(MAXNOOFBOARDS // strains, MAXNOOFTABLES * DDS_STRAINS)
+
+
+def calc_all_tables_pbn(pbn_deals, trump_filter=None, vulnerable=None):
+    """Solve the DD tables of many PBN deals with CalcAllTablesPBN.
+
+    pbn_deals is a sequence of PBN deal strings ("N:AKQ.... ...") or
+    bytes. The deals are packed into ddTableDealsPBN chunks of at most
+    tables_per_call(trump_filter) tables, so DDS can spread every chunk
+    over all of its threads.
+
+    trump_filter follows the DDS convention: five ints in strain order
+    (S, H, D, C, NT), where a non-zero entry means "do not solve".
+
+    Returns an int array of shape (len(pbn_deals), DDS_STRAINS, DDS_HANDS)
+    laid out like ddTableResults.resTable. Filtered strains are left at 0.
+
+    When vulnerable (VUL_NONE .. VUL_EW) is given, DDS also computes par in
+    the same calls (its allParResults output) and (tricks, par) is
+    returned; see par_scores() for the par layout. Par needs every
+    strain, so trump_filter must then be None.
+    """
+    table_deals = ddTableDealsPBN()
+
+    def fill(start, stop):
+        for i, pbn in enumerate(pbn_deals[start:stop]):
+            table_deals.deals[i].cards = (
+                pbn if isinstance(pbn, bytes) else pbn.encode("utf-8")
+            )
+
+    return _calc_all_tables(
+        CalcAllTablesPBN, table_deals, fill, len(pbn_deals), trump_filter, vulnerable
+    )
+
+
+def calc_all_tables(holdings, trump_filter=None, vulnerable=None):
+    """Binary counterpart of calc_all_tables_pbn().
+
+    holdings is a uint32 array of shape (n, DDS_HANDS, DDS_SUITS) in the
+    ddTableDeal.cards layout (see pbn_to_holdings). Each chunk is copied
+    into ddTableDeals with one memmove, so no PBN text is built in Python
+    or parsed again inside DDS.
+    """
+    holdings = np.ascontiguousarray(holdings, dtype=np.uint32)
+    table_deals = ddTableDeals()
+
+    def fill(start, stop):
+        chunk = holdings[start:stop]
+        memmove(table_deals.deals, chunk.ctypes.data, chunk.nbytes)
+
+    return _calc_all_tables(
+        CalcAllTables, table_deals, fill, len(holdings), trump_filter, vulnerable
+    )
+
+
+def _calc_all_tables(function, table_deals, fill, num_deals, trump_filter, vulnerable=None):
+    if vulnerable is not None and trump_filter is not None and any(trump_filter):
+        raise ValueError("par needs every strain; drop the trump filter")
+    tricks = np.zeros((num_deals, DDS_STRAINS, DDS_HANDS), dtype=np.intc)
+    par = np.zeros((num_deals, 2), dtype=np.intc)
+    if num_deals == 0:
+        return tricks if vulnerable is None else (tricks, par)
+
+    chunk_size = tables_per_call(trump_filter)
+    filter_arg = (c_int * DDS_STRAINS)(*(trump_filter or (0,) * DDS_STRAINS))
+    results = ddTablesRes()
+    par_results = allParResults()
+    for start in range(0, num_deals, chunk_size):
+        stop = min(start + chunk_size, num_deals)
+        table_deals.noOfTables = stop - start
+        fill(start, stop)
+        ret = function(
+            byref(table_deals),
+            -1 if vulnerable is None else vulnerable,
+            filter_arg,
+            byref(results),
+            byref(par_results),
+        )
+        if ret != RETURN_NO_FAULT:
+            raise DDSError(function.__name__, ret)
+        tricks[start:stop] = np.frombuffer(
+            results.results,
+            dtype=np.intc,
+            count=(stop - start) * DDS_STRAINS * DDS_HANDS,
+        ).reshape(stop - start, DDS_STRAINS, DDS_HANDS)
+        if vulnerable is not None:
+            for i in range(stop - start):
+                par[start + i] = par_scores(par_results.presults[i])
+    if vulnerable is None:
+        return tricks
+    return tricks, par
+
+
+def par_scores(par_result):
+    """NS-view par scores of a parResults: (NS bid first, EW bid first).
+
+    DDS reports each view as text from the side that starts the bidding,
+    e.g. parScore = ("NS -620", "EW 620").
+    """
+    ns_first = int(par_result.parScore[0].value.split()[1])
+    ew_first = int(par_result.parScore[1].value.split()[1])
+    return ns_first, -ew_first
+
+
+def par_from_tables(tables, vulnerable):
+    """par_scores() for tables that are already solved (e.g. cached).
+
+    This needs one Par call per table, so it is meant for the few tables
+    that did not go through calc_all_tables(..., vulnerable=...).
+    """
+    tables = np.ascontiguousarray(tables, dtype=np.intc)
+    par = np.zeros((len(tables), 2), dtype=np.intc)
+    table = ddTableResults()
+    result = parResults()
+    for i in range(len(tables)):
+        memmove(table.resTable, tables[i].ctypes.data, tables[i].nbytes)
+        ret = Par(byref(table), byref(result), vulnerable)
+        if ret != RETURN_NO_FAULT:
+            raise DDSError("Par", ret)
+        par[i] = par_scores(result)
+    return par
+
+
+def dealer_par(table, dealer, vulnerable):
+    """Par score (NS view) and contracts of one DD table for a dealer.
+
+    Returns (score, contracts) where contracts are DDS strings such as
+    "4S-NS" or "3D-EW+1".
+    """
+    tables = np.ascontiguousarray(table, dtype=np.intc).reshape(DDS_STRAINS, DDS_HANDS)
+    results = ddTableResults()
+    memmove(results.resTable, tables.ctypes.data, tables.nbytes)
+    par = parResultsDealer()
+    ret = DealerPar(byref(results), byref(par), dealer, vulnerable)
+    if ret != RETURN_NO_FAULT:
+        raise DDSError("DealerPar", ret)
+    contracts = [par.contracts[i].value.decode("ascii") for i in range(par.number)]
+    return par.score, contracts
+
+
+PBN_RANKS = "23456789TJQKA"
+PBN_SEATS = "NESW"
+
+
+def pbn_to_holdings(pbn_deals):
+    """Convert PBN deal strings into DDS rank bitmasks.
+
+    Returns a uint32 array of shape (n, DDS_HANDS, DDS_SUITS) where
+    holdings[i, hand, suit] has bit r set for every rank r (2 .. 14, ace
+    = 14) the hand holds, i.e. the layout of ddTableDeal.cards and
+    deal.remainCards. Hands are stored in DDS order (N, E, S, W) whatever
+    seat the PBN string starts with.
+    """
+    holdings = np.zeros((len(pbn_deals), DDS_HANDS, DDS_SUITS), dtype=np.uint32)
+    for i, pbn in enumerate(pbn_deals):
+        if isinstance(pbn, bytes):
+            pbn = pbn.decode("utf-8")
+        first = PBN_SEATS.index(pbn[0].upper())
+        for offset, hand in enumerate(pbn[2:].split()):
+            seat = (first + offset) % DDS_HANDS
+            for suit, cards in enumerate(hand.split(".")):
+                mask = 0
+                for rank in cards:
+                    if rank != "-":
+                        mask |= 1 << (PBN_RANKS.index(rank.upper()) + 2)
+                holdings[i, seat, suit] = mask
+    return holdings
+
+
+def holdings_to_pbn(holdings):
+    """Convert rank bitmasks from pbn_to_holdings() back to PBN strings."""
+    pbn_deals = []
+    for deal_holdings in np.asarray(holdings):
+        hands = []
+        for hand in deal_holdings:
+            suits = []
+            for mask in hand:
+                mask = int(mask)
+                suits.append(
+                    "".join(
+                        PBN_RANKS[rank - 2]
+                        for rank in range(14, 1, -1)
+                        if mask & (1 << rank)
+                    )
+                )
+            hands.append(".".join(suits))
+        pbn_deals.append("N:" + " ".join(hands))
+    return pbn_deals
+
+
+def make_deal(holdings, trump, first):
+    """Build a SolveBoard deal struct for a fresh board from rank bitmasks."""
+    dl = deal()
+    dl.trump = trump
+    dl.first = first
+    memmove(
+        dl.remainCards,
+        np.ascontiguousarray(holdings, dtype=np.uint32).ctypes.data,
+        sizeof(dl.remainCards),
+    )
+    return dl
+
+
+class DDSExecutor:
+    """Run SolveBoard-style DDS calls on a fixed pool of Python threads.
+
+    Every worker thread owns one DDS thread slot and passes it as the
+    threadIndex argument, so boards from concurrent requests are solved
+    in parallel (ctypes releases the GIL during the call) instead of
+    queueing behind one mutex.
+
+    Batch functions such as CalcAllTables* drive all DDS thread slots
+    themselves; run them inside exclusive(), which waits for the running
+    boards to finish and holds new ones back until the batch is done.
+
+    The pool size is what SetMaxThreads configures. max_threads (or the
+    DDS_MAX_THREADS environment variable) caps it per container; 0 lets
+    DDS pick from the cores and memory it finds.
+    """
+
+    def __init__(self, max_threads=None):
+        if max_threads is None:
+            max_threads = int(os.environ.get("DDS_MAX_THREADS", "0"))
+        self.max_threads = max_threads
+        self.num_threads = 0
+        self._jobs = queue.Queue()
+        self._workers = []
+        self._start_lock = threading.Lock()
+        self._gate = threading.Condition()
+        self._running = 0
+        self._exclusive = False
+        self._exclusive_waiting = 0
+
+    def start(self):
+        """Configure the DDS thread slots and start one worker per slot."""
+        with self._start_lock:
+            if self._workers:
+                return self
+            SetMaxThreads(self.max_threads)
+            info = DDSInfo()
+            GetDDSInfo(byref(info))
+            self.num_threads = max(1, info.noOfThreads)
+            for thread_index in range(self.num_threads):
+                worker = threading.Thread(
+                    target=self._work,
+                    args=(thread_index,),
+                    name=f"dds-{thread_index}",
+                    daemon=True,
+                )
+                worker.start()
+                self._workers.append(worker)
+        return self
+
+    def shutdown(self):
+        with self._start_lock:
+            for _ in self._workers:
+                self._jobs.put(None)
+            for worker in self._workers:
+                worker.join()
+            self._workers = []
+
+    def submit(self, function, *args):
+        """Queue function(thread_index, *args) and return a Future."""
+        self.start()
+        future = Future()
+        self._jobs.put((future, function, args))
+        return future
+
+    def solve_board(self, dl, target=-1, solutions=1, mode=1):
+        """SolveBoard on the next free thread slot; resolves to futureTricks."""
+        return self.submit(_solve_board, SolveBoard, dl, target, solutions, mode)
+
+    def solve_board_pbn(self, dl, target=-1, solutions=1, mode=1):
+        """SolveBoardPBN counterpart of solve_board()."""
+        return self.submit(
+            _solve_board, SolveBoardPBN, dl, target, solutions, mode
+        )
+
+    def calc_dd_table(self, holdings):
+        """DD table of one deal as DDS_STRAINS x DDS_HANDS nested lists.
+
+        The table is split into one SolveBoard per (strain, opening
+        leader), so the 20 boards spread over all thread slots and
+        interleave with other requests' boards.
+        """
+        futures = {
+            (strain, leader): self.solve_board(make_deal(holdings, strain, leader))
+            for strain in range(DDS_STRAINS)
+            for leader in range(DDS_HANDS)
+        }
+        table = [[0] * DDS_HANDS for _ in range(DDS_STRAINS)]
+        for (strain, leader), future in futures.items():
+            # score[0] is the leader's side; declarer sits on the leader's right.
+            declarer = (leader + DDS_HANDS - 1) % DDS_HANDS
+            table[strain][declarer] = 13 - future.result().score[0]
+        return table
+
+    @contextmanager
+    def exclusive(self):
+        """Hold every DDS thread slot, e.g. around CalcAllTables* calls."""
+        self.start()
+        with self._gate:
+            self._exclusive_waiting += 1
+            while self._exclusive or self._running:
+                self._gate.wait()
+            self._exclusive_waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._exclusive = False
+                self._gate.notify_all()
+
+    def _work(self, thread_index):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            future, function, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._gate:
+                while self._exclusive or self._exclusive_waiting:
+                    self._gate.wait()
+                self._running += 1
+            try:
+                future.set_result(function(thread_index, *args))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._gate:
+                    self._running -= 1
+                    self._gate.notify_all()
+
+
+def _solve_board(thread_index, function, dl, target, solutions, mode):
+    future_tricks = futureTricks()
+    ret = function(dl, target, solutions, mode, byref(future_tricks), thread_index)
+    if ret != RETURN_NO_FAULT:
+        raise DDSError(function.__name__, ret)
+    return future_tricks
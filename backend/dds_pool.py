@@ -0,0 +1,259 @@
+"""Optional multi-process DDS worker pool.
+
+Each worker process loads its own libdds through dds.py and solves DD
+tables with dds.calc_all_tables(). Deals, ddTableResults and par scores
+travel through per-worker multiprocessing.shared_memory buffers; the
+pipe to each worker only carries tiny control messages. A crash inside
+DDS kills one worker, which the pool replaces, not the API process.
+"""
+
+from __future__ import annotations
+
+import math
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+try:
+    from . import dds
+except ImportError:
+    import dds
+
+
+__all__ = [
+    "DDSProcessPool",
+    "DDSWorkerError",
+]
+
+DEALS_SHAPE = (dds.DDS_HANDS, dds.DDS_SUITS)
+RESULTS_SHAPE = (dds.DDS_STRAINS, dds.DDS_HANDS)
+PAR_SHAPE = (2,)
+
+
+class DDSWorkerError(RuntimeError):
+    """A worker process died or failed while solving a chunk."""
+
+
+class DDSProcessPool:
+    """Spread CalcAllTables work over several processes.
+
+    processes defaults to the DDS_WORKER_PROCESSES environment variable;
+    threads_per_process is passed to SetMaxThreads in every worker, and
+    capacity is the number of deals one worker solves per round trip.
+    """
+
+    def __init__(
+        self,
+        processes: int | None = None,
+        threads_per_process: int = 1,
+        capacity: int = 1000,
+    ) -> None:
+        if processes is None:
+            processes = int(os.environ.get("DDS_WORKER_PROCESSES", "0"))
+        if processes < 1:
+            raise ValueError("DDSProcessPool needs at least one process")
+        self.processes = processes
+        self.threads_per_process = threads_per_process
+        self.capacity = capacity
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: list[_Worker] = []
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> DDSProcessPool | None:
+        """Pool configured by DDS_WORKER_PROCESSES, or None when unset/0."""
+
+        processes = int(os.environ.get("DDS_WORKER_PROCESSES", "0"))
+        if processes < 1:
+            return None
+        return cls(
+            processes,
+            threads_per_process=int(os.environ.get("DDS_WORKER_THREADS", "1")),
+        )
+
+    def start(self) -> DDSProcessPool:
+        with self._lock:
+            if not self._workers:
+                for _ in range(self.processes):
+                    worker = self._spawn()
+                    self._workers.append(worker)
+                    self._idle.put(worker)
+        return self
+
+    def close(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+
+    def calc_all_tables(self, holdings, trump_filter=None, vulnerable=None):
+        """Process-parallel counterpart of dds.calc_all_tables()."""
+
+        self.start()
+        holdings = np.ascontiguousarray(holdings, dtype=np.uint32)
+        num_deals = len(holdings)
+        tricks = np.zeros((num_deals, *RESULTS_SHAPE), dtype=np.intc)
+        par = np.zeros((num_deals, *PAR_SHAPE), dtype=np.intc)
+        if num_deals == 0:
+            return tricks if vulnerable is None else (tricks, par)
+
+        chunk_size = min(self.capacity, math.ceil(num_deals / self.processes))
+        pending = deque(
+            (start, min(start + chunk_size, num_deals))
+            for start in range(0, num_deals, chunk_size)
+        )
+        in_flight: dict[object, tuple[_Worker, int, int]] = {}
+        errors: list[str] = []
+        while pending or in_flight:
+            while pending:
+                try:
+                    worker = self._idle.get(block=not in_flight)
+                except queue.Empty:
+                    break
+                start, stop = pending.popleft()
+                worker.deals[: stop - start] = holdings[start:stop]
+                try:
+                    worker.conn.send((stop - start, trump_filter, vulnerable))
+                except (BrokenPipeError, OSError):
+                    # Died while idle: nothing was lost, retry the chunk.
+                    pending.appendleft((start, stop))
+                    self._idle.put(self._replace(worker))
+                    continue
+                in_flight[worker.conn] = (worker, start, stop)
+
+            for conn in wait(list(in_flight)):
+                worker, start, stop = in_flight.pop(conn)
+                try:
+                    status, detail = conn.recv()
+                except (EOFError, OSError):
+                    errors.append(f"DDS worker {worker.process.pid} died")
+                    self._idle.put(self._replace(worker))
+                    continue
+                if status == "ok":
+                    tricks[start:stop] = worker.results[: stop - start]
+                    par[start:stop] = worker.par[: stop - start]
+                else:
+                    errors.append(detail)
+                self._idle.put(worker)
+
+        if errors:
+            raise DDSWorkerError("; ".join(errors))
+        if vulnerable is None:
+            return tricks
+        return tricks, par
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self.capacity, self.threads_per_process)
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.stop()
+        replacement = self._spawn()
+        with self._lock:
+            self._workers = [
+                replacement if current is worker else current
+                for current in self._workers
+            ]
+        return replacement
+
+
+class _Worker:
+    def __init__(self, context, capacity: int, threads: int) -> None:
+        self.deals_shm = shared_memory.SharedMemory(
+            create=True,
+            size=capacity * int(np.prod(DEALS_SHAPE)) * np.dtype(np.uint32).itemsize,
+        )
+        self.results_shm = shared_memory.SharedMemory(
+            create=True,
+            size=capacity * int(np.prod(RESULTS_SHAPE)) * np.dtype(np.intc).itemsize,
+        )
+        self.par_shm = shared_memory.SharedMemory(
+            create=True,
+            size=capacity * int(np.prod(PAR_SHAPE)) * np.dtype(np.intc).itemsize,
+        )
+        self.deals = np.ndarray(
+            (capacity, *DEALS_SHAPE), dtype=np.uint32, buffer=self.deals_shm.buf
+        )
+        self.results = np.ndarray(
+            (capacity, *RESULTS_SHAPE), dtype=np.intc, buffer=self.results_shm.buf
+        )
+        self.par = np.ndarray((capacity, *PAR_SHAPE), dtype=np.intc, buffer=self.par_shm.buf)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                self.deals_shm.name,
+                self.results_shm.name,
+                self.par_shm.name,
+                capacity,
+                threads,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        del self.deals, self.results, self.par
+        for shm in (self.deals_shm, self.results_shm, self.par_shm):
+            shm.close()
+            shm.unlink()
+
+
+def _worker_main(
+    conn,
+    deals_name: str,
+    results_name: str,
+    par_name: str,
+    capacity: int,
+    threads: int,
+) -> None:
+    dds.SetMaxThreads(threads)
+    deals_shm = shared_memory.SharedMemory(name=deals_name)
+    results_shm = shared_memory.SharedMemory(name=results_name)
+    par_shm = shared_memory.SharedMemory(name=par_name)
+    deals = np.ndarray((capacity, *DEALS_SHAPE), dtype=np.uint32, buffer=deals_shm.buf)
+    results = np.ndarray((capacity, *RESULTS_SHAPE), dtype=np.intc, buffer=results_shm.buf)
+    par = np.ndarray((capacity, *PAR_SHAPE), dtype=np.intc, buffer=par_shm.buf)
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            count, trump_filter, vulnerable = message
+            try:
+                if vulnerable is None:
+                    results[:count] = dds.calc_all_tables(deals[:count], trump_filter)
+                else:
+                    results[:count], par[:count] = dds.calc_all_tables(
+                        deals[:count], trump_filter, vulnerable
+                    )
+            except (dds.DDSError, ValueError) as e:
+                conn.send(("error", str(e)))
+            else:
+                conn.send(("ok", None))
+    finally:
+        del deals, results, par
+        deals_shm.close()
+        results_shm.close()
+        par_shm.close()
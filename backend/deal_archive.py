@@ -0,0 +1,521 @@
+"""Single-file, memory-mapped columnar archive of deals and DD tables.
+
+Every record has the same width. Rows are stored in chunks of chunk_rows
+records, and each chunk holds one contiguous block per column. Chunks
+have a fixed stride, so chunk k starts at data_offset + k * chunk_bytes,
+and the last chunk is allocated in full even when it is only partly
+filled. All integers are little-endian.
+
+    offset  size  field
+    0       8     magic b"DDSARCH1"
+    8       2     version (1)
+    10      2     number of columns
+    12      4     chunk_rows
+    16      8     rows committed
+    24      8     index offset (0 = no index)
+    32      4     metadata length in bytes
+    36      4     data_offset (64-byte aligned)
+    40      24    reserved (zero)
+    64      20*c  columns: name (16 bytes, NUL padded) and width (u4)
+    ...           metadata (UTF-8 JSON object)
+    data_offset   chunks
+
+The deal columns are
+
+    owners  13 bytes  bitboard.pack_owners(): 2-bit seat per card
+    tricks  20 bytes  DD tricks, DDS strain-major (strain * 4 + hand)
+
+and archives may add more fixed-width uint8 columns (deal_library.py
+stores hcp and suit lengths too).
+
+The optional index follows the last chunk:
+
+    8 bytes        magic b"DDSINDX1"
+    4 bytes        CRC-32 of the table below
+    4 bytes        number of chunks
+    chunks * 2 * record width bytes
+                   per chunk, the minimum and then the maximum of every
+                   byte of the record over the chunk's committed rows
+
+so a scan can skip chunks that cannot match (e.g. "at least 10 tricks
+in spades for South"). A missing or damaged index is ignored.
+
+DealArchive opens the data with np.memmap, so column views are zero
+copy and processes scanning the same file share the page cache.
+ArchiveWriter creates archives and appends to them. The header's row
+count is only updated after the rows are written, so readers never see
+a half-written append. compact() rewrites a subset of rows, dropping
+duplicate deals if asked, into a fresh archive.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import struct
+import time
+import zlib
+from typing import Iterator, Mapping
+
+import numpy as np
+
+try:
+    from . import dds
+except ImportError:
+    import dds
+
+
+__all__ = [
+    "ArchiveError",
+    "ArchiveWriter",
+    "DEAL_COLUMNS",
+    "DealArchive",
+    "compact",
+    "trick_counts",
+]
+
+MAGIC = b"DDSARCH1"
+INDEX_MAGIC = b"DDSINDX1"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIQQII24x")
+COLUMN = struct.Struct("<16sI")
+INDEX_HEADER = struct.Struct("<8sII")
+ALIGNMENT = 64
+DEFAULT_CHUNK_ROWS = 1 << 16
+DEAL_COLUMNS = {"owners": 13, "tricks": dds.DDS_STRAINS * dds.DDS_HANDS}
+# Most tricks one side can take, for trick histograms.
+MAX_TRICKS = 13
+
+
+class ArchiveError(ValueError):
+    """The file is not a readable archive."""
+
+
+class _Layout:
+    """Header fields and the offsets derived from them."""
+
+    def __init__(self, columns: Mapping[str, int], chunk_rows: int, meta: dict, rows: int = 0, index_offset: int = 0) -> None:
+        if not columns:
+            raise ValueError("an archive needs at least one column")
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be positive")
+        self.columns = {name: int(width) for name, width in columns.items()}
+        self.chunk_rows = int(chunk_rows)
+        self.meta = dict(meta)
+        self.rows = int(rows)
+        self.index_offset = int(index_offset)
+        self.meta_bytes = json.dumps(self.meta, sort_keys=True).encode()
+        header_end = HEADER.size + COLUMN.size * len(self.columns) + len(self.meta_bytes)
+        self.data_offset = -(-header_end // ALIGNMENT) * ALIGNMENT
+        self.width = sum(self.columns.values())
+        self.chunk_bytes = self.chunk_rows * self.width
+        self.lanes = {}
+        start = 0
+        for name, width in self.columns.items():
+            self.lanes[name] = (start, start + width)
+            start += width
+
+    def chunks_for(self, rows: int) -> int:
+        return -(-rows // self.chunk_rows)
+
+    def data_end(self, rows: int) -> int:
+        return self.data_offset + self.chunks_for(rows) * self.chunk_bytes
+
+    def pack(self) -> bytes:
+        header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            len(self.columns),
+            self.chunk_rows,
+            self.rows,
+            self.index_offset,
+            len(self.meta_bytes),
+            self.data_offset,
+        )
+        columns = b"".join(COLUMN.pack(name.encode(), width) for name, width in self.columns.items())
+        return header + columns + self.meta_bytes
+
+    @classmethod
+    def read(cls, f) -> _Layout:
+        raw = f.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            raise ArchiveError("file is too short for an archive header")
+        magic, version, ncolumns, chunk_rows, rows, index_offset, meta_length, data_offset = HEADER.unpack(raw)
+        if magic != MAGIC:
+            raise ArchiveError("not a deal archive")
+        if version != VERSION:
+            raise ArchiveError(f"unsupported archive version {version}")
+        columns = {}
+        for _ in range(ncolumns):
+            name, width = COLUMN.unpack(f.read(COLUMN.size))
+            columns[name.rstrip(b"\0").decode()] = width
+        meta = json.loads(f.read(meta_length) or b"{}")
+        layout = cls(columns, chunk_rows, meta, rows, index_offset)
+        if layout.data_offset != data_offset:
+            raise ArchiveError("archive header is inconsistent")
+        return layout
+
+
+def _read_index(f, layout: _Layout) -> np.ndarray | None:
+    nchunks = layout.chunks_for(layout.rows)
+    if not layout.index_offset or not nchunks:
+        return None
+    f.seek(layout.index_offset)
+    raw = f.read(INDEX_HEADER.size)
+    if len(raw) < INDEX_HEADER.size:
+        return None
+    magic, crc, count = INDEX_HEADER.unpack(raw)
+    # An append in progress may have overwritten the committed index.
+    if magic != INDEX_MAGIC or count != nchunks:
+        return None
+    table = f.read(count * 2 * layout.width)
+    if len(table) != count * 2 * layout.width or zlib.crc32(table) != crc:
+        return None
+    return np.frombuffer(table, dtype=np.uint8).reshape(count, 2, layout.width).copy()
+
+
+def _zone(records: np.ndarray) -> np.ndarray:
+    return np.stack([records.min(axis=0), records.max(axis=0)])
+
+
+class DealArchive:
+    """Read-only, memory-mapped view of an archive's committed rows."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            layout = _Layout.read(f)
+            self.index = _read_index(f, layout)
+        self._layout = layout
+        self.rows = layout.rows
+        self.columns = dict(layout.columns)
+        self.chunk_rows = layout.chunk_rows
+        self.meta = layout.meta
+        self.chunk_count = layout.chunks_for(self.rows)
+        if self.chunk_count:
+            self._data = np.memmap(
+                path,
+                dtype=np.uint8,
+                mode="r",
+                offset=layout.data_offset,
+                shape=(self.chunk_count, layout.chunk_bytes),
+            )
+        else:
+            self._data = np.zeros((0, layout.chunk_bytes), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def column(self, name: str) -> np.ndarray:
+        """(chunks, chunk_rows, width) view of a column, padding included."""
+
+        width = self.columns[name]
+        start, _ = self._layout.lanes[name]
+        block = self._data[:, start * self.chunk_rows : (start + width) * self.chunk_rows]
+        return block.reshape(self.chunk_count, self.chunk_rows, width)
+
+    def chunks(self, name: str) -> Iterator[tuple[int, np.ndarray]]:
+        """(first row, (n, width) view) for each chunk's committed rows."""
+
+        column = self.column(name)
+        for chunk in range(self.chunk_count):
+            start = chunk * self.chunk_rows
+            yield start, column[chunk, : min(self.chunk_rows, self.rows - start)]
+
+    def read(self, name: str, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """Copy of rows [start, stop) of a column as an (n, width) array."""
+
+        stop = self.rows if stop is None else min(stop, self.rows)
+        rows = np.arange(start, max(start, stop))
+        return self.take(name, rows)
+
+    def take(self, name: str, rows) -> np.ndarray:
+        """(n, width) copy of the given rows of a column."""
+
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size and (rows.min() < 0 or rows.max() >= self.rows):
+            raise IndexError("row out of range")
+        chunk, offset = np.divmod(rows, self.chunk_rows)
+        return np.asarray(self.column(name)[chunk, offset])
+
+    def zone_map(self, name: str) -> np.ndarray | None:
+        """(chunks, 2, width) per-chunk byte minima and maxima, or None."""
+
+        if self.index is None:
+            return None
+        start, stop = self._layout.lanes[name]
+        return self.index[:, :, start:stop]
+
+    def close(self) -> None:
+        # The mapping is released once views handed out are gone too.
+        self._data = None
+
+    def __enter__(self) -> DealArchive:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ArchiveWriter:
+    """Create an archive or append rows to one.
+
+    Use create() or open(); rows become visible to readers on flush() or
+    close(), which also rewrite the index.
+    """
+
+    def __init__(self, path: str, f, layout: _Layout, index: np.ndarray | None, with_index: bool) -> None:
+        self.path = path
+        self._file = f
+        self._layout = layout
+        self._with_index = with_index
+        self._index = index
+        self.rows = layout.rows
+        self.meta = layout.meta
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        columns: Mapping[str, int] = DEAL_COLUMNS,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        meta: Mapping | None = None,
+        index: bool = True,
+    ) -> ArchiveWriter:
+        layout = _Layout(columns, chunk_rows, dict(meta or {}))
+        f = open(path, "w+b")
+        f.write(layout.pack())
+        f.truncate(layout.data_offset)
+        writer = cls(path, f, layout, np.zeros((0, 2, layout.width), dtype=np.uint8), index)
+        writer.flush()
+        return writer
+
+    @classmethod
+    def open(cls, path: str, index: bool = True) -> ArchiveWriter:
+        """Append to an existing archive after its committed rows."""
+
+        f = open(path, "r+b")
+        try:
+            layout = _Layout.read(f)
+            table = _read_index(f, layout) if index else None
+        except Exception:
+            f.close()
+            raise
+        writer = cls(path, f, layout, table, index)
+        if index and table is None and layout.rows:
+            writer._index = writer._rebuild_index()
+        return writer
+
+    def append(self, columns: Mapping[str, np.ndarray]) -> None:
+        """Append rows given as {name: array}; each array is reshaped to (n, width)."""
+
+        layout = self._layout
+        if set(columns) != set(layout.columns):
+            raise ValueError(f"expected columns {sorted(layout.columns)}, got {sorted(columns)}")
+        blocks = {}
+        count = None
+        for name, width in layout.columns.items():
+            block = np.ascontiguousarray(columns[name], dtype=np.uint8)
+            block = block.reshape(len(block), width)
+            if count is not None and len(block) != count:
+                raise ValueError("columns have different numbers of rows")
+            count = len(block)
+            blocks[name] = block
+        if not count:
+            return
+
+        f = self._file
+        stop = self.rows + count
+        # Allocate whole chunks, so appends never move existing data.
+        if os.fstat(f.fileno()).st_size < layout.data_end(stop):
+            f.truncate(layout.data_end(stop))
+        row = self.rows
+        while row < stop:
+            chunk, offset = divmod(row, layout.chunk_rows)
+            take = min(layout.chunk_rows - offset, stop - row)
+            base = layout.data_offset + chunk * layout.chunk_bytes
+            parts = []
+            for name, width in layout.columns.items():
+                start, _ = layout.lanes[name]
+                part = blocks[name][row - self.rows : row - self.rows + take]
+                f.seek(base + start * layout.chunk_rows + offset * width)
+                f.write(part.tobytes())
+                parts.append(part)
+            if self._index is not None:
+                zone = _zone(np.concatenate(parts, axis=1))
+                if chunk < len(self._index):
+                    self._index[chunk, 0] = np.minimum(self._index[chunk, 0], zone[0])
+                    self._index[chunk, 1] = np.maximum(self._index[chunk, 1], zone[1])
+                else:
+                    self._index = np.concatenate([self._index, zone[None]])
+            row += take
+        self.rows = stop
+
+    def flush(self) -> None:
+        """Write the index, then commit the new row count to the header."""
+
+        layout = self._layout
+        f = self._file
+        end = layout.data_end(self.rows)
+        layout.index_offset = 0
+        if self._index is not None and self.rows:
+            table = np.ascontiguousarray(self._index).tobytes()
+            f.seek(end)
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, zlib.crc32(table), len(self._index)))
+            f.write(table)
+            f.truncate(f.tell())
+            layout.index_offset = end
+        else:
+            f.truncate(max(end, layout.data_offset))
+        f.flush()
+        layout.rows = self.rows
+        f.seek(0)
+        f.write(layout.pack())
+        f.flush()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+
+    def __enter__(self) -> ArchiveWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _rebuild_index(self) -> np.ndarray:
+        with DealArchive(self.path) as archive:
+            zones = []
+            for chunk in range(archive.chunk_count):
+                start = chunk * archive.chunk_rows
+                stop = min(start + archive.chunk_rows, archive.rows)
+                records = np.concatenate(
+                    [archive.column(name)[chunk, : stop - start] for name in archive.columns], axis=1
+                )
+                zones.append(_zone(records))
+            return np.stack(zones)
+
+
+def compact(
+    source: str,
+    destination: str,
+    rows=None,
+    unique: bool = False,
+    chunk_rows: int | None = None,
+    index: bool = True,
+) -> int:
+    """Copy rows of source into a new archive and return how many were kept.
+
+    rows selects rows (indices or a boolean mask; default all). With
+    unique=True only the first copy of each deal (equal "owners") is
+    kept. chunk_rows changes the chunk size; the index is rebuilt.
+    """
+
+    with DealArchive(source) as archive:
+        if rows is None:
+            selected = np.arange(archive.rows)
+        else:
+            selected = np.asarray(rows)
+            if selected.dtype == bool:
+                selected = np.flatnonzero(selected)
+        if unique:
+            owners = archive.take("owners", selected)
+            keys = owners.view(np.dtype((np.void, owners.shape[1]))).ravel()
+            _, first = np.unique(keys, return_index=True)
+            selected = selected[np.sort(first)]
+        step = chunk_rows or archive.chunk_rows
+        with ArchiveWriter.create(destination, archive.columns, step, archive.meta, index) as writer:
+            for start in range(0, len(selected), step):
+                part = selected[start : start + step]
+                writer.append({name: archive.take(name, part) for name in archive.columns})
+    return len(selected)
+
+
+def trick_counts(archive: DealArchive, rows=None) -> np.ndarray:
+    """(5, 4, 14) histogram of DD tricks by strain, hand and trick count.
+
+    Scans the tricks column chunk by chunk, or only the given rows.
+    """
+
+    lanes = dds.DDS_STRAINS * dds.DDS_HANDS
+    counts = np.zeros((lanes, MAX_TRICKS + 1), dtype=np.int64)
+    if rows is not None:
+        blocks = [archive.take("tricks", rows)]
+    else:
+        blocks = (block for _, block in archive.chunks("tricks"))
+    for block in blocks:
+        # bincount of a contiguous lane is about twice as fast as a strided one.
+        for lane, values in enumerate(np.ascontiguousarray(block.T)):
+            counts[lane] += np.bincount(values, minlength=MAX_TRICKS + 1)
+    return counts.reshape(dds.DDS_STRAINS, dds.DDS_HANDS, MAX_TRICKS + 1)
+
+
+def _bench(path: str, rows: int, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    step = 1 << 20
+    started = time.perf_counter()
+    with ArchiveWriter.create(path) as writer:
+        for start in range(0, rows, step):
+            count = min(step, rows - start)
+            writer.append(
+                {
+                    "owners": rng.integers(0, 256, (count, 13), dtype=np.uint8),
+                    "tricks": rng.integers(0, MAX_TRICKS + 1, (count, 20), dtype=np.uint8),
+                }
+            )
+    print(f"wrote {rows} synthetic rows in {time.perf_counter() - started:.2f}s")
+    for run in ("cold", "warm"):
+        started = time.perf_counter()
+        with DealArchive(path) as archive:
+            counts = trick_counts(archive)
+        print(f"{run} scan of {counts.sum() // 20} deals' DD tables: {time.perf_counter() - started:.3f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect, compact or benchmark deal archives.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info")
+    info.add_argument("path")
+    compact_parser = commands.add_parser("compact")
+    compact_parser.add_argument("source")
+    compact_parser.add_argument("destination")
+    compact_parser.add_argument("--unique", action="store_true", help="drop repeated deals")
+    compact_parser.add_argument("--chunk-rows", type=int)
+    compact_parser.add_argument("--no-index", action="store_true")
+    bench = commands.add_parser("bench")
+    bench.add_argument("path")
+    bench.add_argument("--rows", type=int, default=10_000_000)
+    bench.add_argument("--seed", type=int, default=2024)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        with DealArchive(args.path) as archive:
+            print(
+                json.dumps(
+                    {
+                        "rows": archive.rows,
+                        "chunk_rows": archive.chunk_rows,
+                        "chunks": archive.chunk_count,
+                        "columns": archive.columns,
+                        "indexed": archive.index is not None,
+                        "meta": archive.meta,
+                    },
+                    indent=2,
+                )
+            )
+    elif args.command == "compact":
+        kept = compact(
+            args.source, args.destination, unique=args.unique, chunk_rows=args.chunk_rows, index=not args.no_index
+        )
+        print(f"{kept} rows written to {args.destination}")
+    else:
+        _bench(args.path, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
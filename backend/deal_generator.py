@@ -0,0 +1,306 @@
+"""Generate constrained deals in-process with NumPy.
+
+Handles the constraint set the API exposes directly: known cards, and
+per-seat suit-length ranges, HCP ranges and shapePreset. Each round
+shuffles the unknown cards of a whole batch of candidate deals at once,
+computes suit lengths and points through the bitboard lookup tables and
+keeps the candidates every constraint accepts. That is the same
+rejection sampling deal does, so accepted deals are uniform among the
+deals that satisfy the constraints. Scripts with advanced_tcl still go
+through the external deal generator (deal_runner).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import math
+import time
+from typing import Callable, Iterator, Mapping
+
+import numpy as np
+
+try:
+    from . import bitboard, dds
+except ImportError:
+    import bitboard
+    import dds
+
+
+__all__ = [
+    "ConstrainedDealGenerator",
+    "GenerationError",
+    "GenerationReport",
+    "SEAT_NAMES",
+    "SeatConstraint",
+    "accepted_batches",
+    "format_pbn",
+    "hand_mask",
+    "parse_range",
+]
+
+SEAT_NAMES = {
+    "north": dds.HAND_NORTH,
+    "east": dds.HAND_EAST,
+    "south": dds.HAND_SOUTH,
+    "west": dds.HAND_WEST,
+}
+HAND_SIZE = 13
+MAX_HCP = 37
+# Candidates shuffled per round, at most.
+DEFAULT_BATCH_SIZE = 1 << 15
+# Give up once this many candidates were rejected without enough hits.
+DEFAULT_MAX_CANDIDATES = 20_000_000
+_MIN_ROUND = 256
+
+
+class GenerationError(RuntimeError):
+    """The constraints accept too few deals to generate the requested count."""
+
+
+def parse_range(text: str, low: int, high: int) -> tuple[int, int]:
+    """Parse "3-5", "3", "-5", "3-" or "" into an inclusive (min, max)."""
+
+    text = text.strip()
+    if not text:
+        return low, high
+    if "-" not in text:
+        return int(text), int(text)
+    start, stop, *_ = text.split("-")
+    return (int(start) if start.strip() else low), (int(stop) if stop.strip() else high)
+
+
+@dataclass(frozen=True, slots=True)
+class SeatConstraint:
+    """Suit-length ranges (DDS suit order), HCP range and shapePreset of a seat."""
+
+    suit_lengths: tuple[tuple[int, int], ...] = ((0, HAND_SIZE),) * dds.DDS_SUITS
+    hcp: tuple[int, int] = (0, MAX_HCP)
+    preset: str = "any"
+
+    @classmethod
+    def parse(cls, shape: str = "", hcp: str = "", preset: str = "any") -> SeatConstraint:
+        """From the request format: shapes "4-5,0-3,,", hcp "12-14", shapePreset."""
+
+        ranges = [parse_range(part, 0, HAND_SIZE) for part in shape.split(",")] if shape else []
+        ranges += [(0, HAND_SIZE)] * (dds.DDS_SUITS - len(ranges))
+        return cls(
+            suit_lengths=tuple(ranges[: dds.DDS_SUITS]),
+            hcp=parse_range(hcp, 0, MAX_HCP),
+            preset=preset if preset in bitboard.SHAPE_PRESETS else "any",
+        )
+
+    def accepts(self, lengths, points) -> np.ndarray:
+        """Which hands ((n, 4) suit lengths, (n,) HCP) satisfy the constraint."""
+
+        low = np.array([low for low, _ in self.suit_lengths])
+        high = np.array([high for _, high in self.suit_lengths])
+        ok = ((lengths >= low) & (lengths <= high)).all(axis=-1)
+        ok &= (points >= self.hcp[0]) & (points <= self.hcp[1])
+        if self.preset != "any":
+            ok &= bitboard.shape_mask(lengths, self.preset)
+        return ok
+
+
+@dataclass(slots=True)
+class GenerationReport:
+    """How many candidates a generator shuffled to accept its deals."""
+
+    seed: int
+    accepted: int = 0
+    candidates: int = 0
+    seconds: float = 0.0
+    generator: str = "numpy"
+
+    @property
+    def rejection_rate(self) -> float:
+        return 1.0 - self.accepted / self.candidates if self.candidates else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "generator": self.generator,
+            "seed": self.seed,
+            "accepted": self.accepted,
+            "candidates": self.candidates,
+            "rejection_rate": self.rejection_rate,
+            "seconds": self.seconds,
+        }
+
+
+def hand_mask(hand: str) -> int:
+    """Card mask of a PBN hand such as "AKQ.T98.-.432"; "-" alone is no cards."""
+
+    mask = 0
+    if "." not in hand:
+        return mask
+    for suit, cards in enumerate(hand.split(".")[: dds.DDS_SUITS]):
+        for rank in cards.strip().replace("-", ""):
+            mask |= 1 << (suit * bitboard.SUIT_BITS + bitboard.RANKS.index(rank.upper()))
+    return mask
+
+
+def format_pbn(masks) -> str:
+    """Deals as deal's format/pbn output, the input leadsolver reads."""
+
+    return "".join(f'[Deal "{pbn}"]\n\n' for pbn in bitboard.to_pbn(masks))
+
+
+class ConstrainedDealGenerator:
+    """Uniform random deals with known cards and per-seat constraints.
+
+    known maps DDS hands to card masks (hand_mask()); the rest of each
+    hand is dealt from the unknown cards. constraints maps DDS hands to
+    SeatConstraint. The seed, or the entropy drawn when it is None, is
+    kept in report so any run can be repeated.
+    """
+
+    def __init__(
+        self,
+        known: Mapping[int, int] | None = None,
+        constraints: Mapping[int, SeatConstraint] | None = None,
+        seed: int | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_candidates: int = DEFAULT_MAX_CANDIDATES,
+    ) -> None:
+        known = dict(known or {})
+        fixed = np.zeros(dds.DDS_HANDS, dtype=np.uint64)
+        taken = 0
+        for hand, mask in known.items():
+            mask = int(mask)
+            if mask & taken:
+                raise ValueError("The same card is given to more than one hand.")
+            if bin(mask).count("1") > HAND_SIZE:
+                raise ValueError(f"Hand {hand} has more than {HAND_SIZE} cards.")
+            fixed[hand] = mask
+            taken |= mask
+        self.known = fixed
+        self.constraints = {
+            hand: constraint
+            for hand, constraint in (constraints or {}).items()
+            if constraint != SeatConstraint()
+        }
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+
+        self.unknown_cards = np.array(
+            [card for card in range(bitboard.NUM_CARDS) if not taken >> card & 1], dtype=np.uint64
+        )
+        missing = HAND_SIZE - bitboard.popcount(fixed).astype(np.intp)
+        # Unknown cards each hand still needs.
+        self.vacancies = tuple(int(n) for n in missing)
+        # Shuffled position range of each hand's missing cards.
+        stops = np.cumsum(missing)
+        self._slices = [
+            (hand, int(stop - count), int(stop)) for hand, (count, stop) in enumerate(zip(missing, stops))
+        ]
+
+        sequence = np.random.SeedSequence(seed)
+        self.report = GenerationReport(seed=sequence.entropy)
+        self._rng = np.random.default_rng(sequence)
+
+    def candidates(self, size: int) -> np.ndarray:
+        """size unconstrained deals as (size, 4) masks."""
+
+        positions = np.arange(len(self.unknown_cards))
+        return self.deal(self._rng.permuted(np.broadcast_to(positions, (size, len(positions))), axis=1))
+
+    def deal(self, positions, cards=None) -> np.ndarray:
+        """Deals from (n, unknown) shuffled positions into cards.
+
+        cards lists the unknown cards in the order positions refer to,
+        unknown_cards (sorted) by default; paired.py passes its own order
+        to keep the layouts of several generators aligned.
+        """
+
+        cards = self.unknown_cards if cards is None else np.asarray(cards, dtype=np.uint64)
+        bits = np.uint64(1) << cards[positions]
+        size = len(bits)
+        masks = np.broadcast_to(self.known, (size, dds.DDS_HANDS)).copy()
+        for hand, start, stop in self._slices:
+            if stop > start:
+                masks[:, hand] |= np.bitwise_or.reduce(bits[:, start:stop], axis=1)
+        return masks
+
+    def accepts(self, masks) -> np.ndarray:
+        """Which deals satisfy every seat constraint."""
+
+        masks = np.asarray(masks, dtype=np.uint64)
+        ok = np.ones(len(masks), dtype=bool)
+        if not self.constraints:
+            return ok
+        hands = list(self.constraints)
+        lengths = bitboard.suit_lengths(masks[:, hands])
+        points = bitboard.hcp(masks[:, hands])
+        for column, hand in enumerate(hands):
+            ok &= self.constraints[hand].accepts(lengths[:, column], points[:, column])
+        return ok
+
+    def batches(self, count: int, batch_size: int) -> Iterator[np.ndarray]:
+        """Yield count accepted deals as (<= batch_size, 4) mask arrays.
+
+        Raises GenerationError once max_candidates were shuffled without
+        reaching count.
+        """
+
+        def draw(size: int) -> tuple[np.ndarray, np.ndarray]:
+            masks = self.candidates(size)
+            return masks, self.accepts(masks)
+
+        return accepted_batches(draw, count, batch_size, self.report, self.batch_size, self.max_candidates)
+
+    def generate(self, count: int) -> np.ndarray:
+        """count accepted deals as one (count, 4) mask array."""
+
+        batches = list(self.batches(count, max(count, 1)))
+        return np.concatenate(batches) if batches else np.empty((0, dds.DDS_HANDS), dtype=np.uint64)
+
+
+def accepted_batches(
+    draw: Callable[[int], tuple[np.ndarray, np.ndarray]],
+    count: int,
+    batch_size: int,
+    report: GenerationReport,
+    round_limit: int = DEFAULT_BATCH_SIZE,
+    max_candidates: int = DEFAULT_MAX_CANDIDATES,
+) -> Iterator[np.ndarray]:
+    """Yield count accepted candidates in batches of at most batch_size.
+
+    draw(size) returns size new candidates, stacked along the first axis,
+    and which of them are accepted. Rounds are sized from the acceptance
+    rate in report, which counts every candidate drawn. Raises
+    GenerationError once max_candidates were drawn without reaching count.
+    """
+
+    pending: list[np.ndarray] = []
+    held = 0
+    remaining = count
+    while remaining > 0:
+        while held < min(batch_size, remaining):
+            if report.candidates >= max_candidates:
+                raise GenerationError(
+                    f"Only {report.accepted} of {count} deals were accepted after"
+                    f" {report.candidates} candidates. The constraints might be"
+                    " too complex or impossible to satisfy."
+                )
+            size = _round_size(report, remaining - held, min(round_limit, max_candidates - report.candidates))
+            # Only drawing counts: time spent by the consumer between batches does not.
+            started = time.perf_counter()
+            rows, accepted = draw(size)
+            rows = rows[accepted]
+            report.seconds += time.perf_counter() - started
+            report.candidates += size
+            report.accepted += len(rows)
+            pending.append(rows)
+            held += len(rows)
+        rows = np.concatenate(pending)
+        take = min(batch_size, remaining)
+        pending = [rows[take:]]
+        held -= take
+        remaining -= take
+        yield rows[:take]
+
+
+def _round_size(report: GenerationReport, needed: int, limit: int) -> int:
+    # Aim for enough acceptances in one round, from the rate seen so far.
+    rate = (report.accepted + 1) / (report.candidates + 1)
+    size = math.ceil(needed / rate * 1.2)
+    return max(1, min(max(size, _MIN_ROUND), limit))
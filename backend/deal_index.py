@@ -0,0 +1,275 @@
+"""Bitmap index over the per-seat features of a deal archive.
+
+Every feature is a set of bitmaps with one bit per archive row, so a
+constraint set becomes a few ANDs of bitmaps instead of a scan:
+
+    cards    2 bit-planes per card (the owner's seat in binary)
+    hcp      hcp <= v for v = 0..36, per seat (range encoded)
+    lengths  length <= v for v = 0..12, per seat and suit (range encoded)
+    pattern  one bitmap per sorted pattern (39), per seat
+
+Range encoding answers lo <= x <= hi with one AND and one AND NOT. The
+index is a sidecar file (<archive>.idx by default) of fixed-size blocks
+of block_rows rows, laid out like the archive:
+
+    offset  size  field
+    0       8     magic b"DDSFIDX1"
+    8       2     version (1)
+    10      2     reserved
+    12      4     block_rows (a multiple of 8)
+    16      8     rows indexed
+    24      4     number of bitmaps
+    28      36    reserved (zero)
+    64            blocks, each (bitmaps, block_rows / 8) bytes, bits in
+                  little-endian order (row r is bit r % 8 of byte r // 8)
+
+update() indexes the rows appended to the archive since the last update,
+recomputing only the last, partly filled block. About 77 bytes per deal.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+from itertools import combinations_with_replacement
+from typing import Mapping
+
+import numpy as np
+
+try:
+    from . import bitboard, dds
+    from .deal_archive import DealArchive
+    from .deal_generator import HAND_SIZE, MAX_HCP, SeatConstraint
+except ImportError:
+    import bitboard
+    import dds
+    from deal_archive import DealArchive
+    from deal_generator import HAND_SIZE, MAX_HCP, SeatConstraint
+
+
+__all__ = [
+    "FeatureIndex",
+    "index_path",
+    "update",
+]
+
+MAGIC = b"DDSFIDX1"
+VERSION = 1
+HEADER = struct.Struct("<8sH2xIQI36x")
+DEFAULT_BLOCK_ROWS = 1 << 16
+
+# Sorted patterns, longest suit first: (4, 3, 3, 3), (4, 4, 3, 2), ...
+PATTERNS = sorted(
+    {
+        tuple(sorted(lengths, reverse=True))
+        for lengths in combinations_with_replacement(range(HAND_SIZE + 1), dds.DDS_SUITS)
+        if sum(lengths) == HAND_SIZE
+    }
+)
+PATTERN_CODES = np.array(PATTERNS) @ np.array([1000, 100, 10, 1])
+BALANCED = [PATTERNS.index(p) for p in ((4, 3, 3, 3), (4, 4, 3, 2), (5, 3, 3, 2))]
+
+# Bitmap numbers of each feature.
+CARDS = 0
+HCP_LE = CARDS + 2 * bitboard.NUM_CARDS
+LENGTH_LE = HCP_LE + dds.DDS_HANDS * MAX_HCP
+PATTERN = LENGTH_LE + dds.DDS_HANDS * dds.DDS_SUITS * HAND_SIZE
+BITMAPS = PATTERN + dds.DDS_HANDS * len(PATTERNS)
+# Blocks per step of a query with a limit; doubles while rows are missing.
+FIRST_WINDOW = 1
+
+
+def index_path(archive_path: str) -> str:
+    return archive_path + ".idx"
+
+
+def _features(owners: np.ndarray) -> np.ndarray:
+    """(BITMAPS, n) bool feature matrix of packed owners rows."""
+
+    seats = bitboard.unpack_owners(owners)
+    masks = bitboard.from_owners(seats)
+    hcp = bitboard.hcp(masks)
+    lengths = bitboard.suit_lengths(masks)
+    codes = bitboard.pattern_codes(lengths)
+    pattern = np.searchsorted(PATTERN_CODES, codes)
+    bits = np.empty((BITMAPS, len(owners)), dtype=bool)
+    planes = np.stack([seats & 1, seats >> 1], axis=-1).reshape(len(owners), -1)
+    bits[CARDS:HCP_LE] = planes.T
+    values = np.arange(MAX_HCP)
+    bits[HCP_LE:LENGTH_LE] = (hcp.T[:, None, :] <= values[None, :, None]).reshape(-1, len(owners))
+    values = np.arange(HAND_SIZE)
+    lengths = lengths.reshape(len(owners), -1)
+    bits[LENGTH_LE:PATTERN] = (lengths.T[:, None, :] <= values[None, :, None]).reshape(-1, len(owners))
+    bits[PATTERN:] = (pattern.T[:, None, :] == np.arange(len(PATTERNS))[None, :, None]).reshape(-1, len(owners))
+    return bits
+
+
+def update(archive_path: str, path: str | None = None, block_rows: int = DEFAULT_BLOCK_ROWS) -> int:
+    """Index the archive's rows that the index does not cover yet.
+
+    Creates the index when it is missing. Returns the rows indexed.
+    """
+
+    path = path or index_path(archive_path)
+    if block_rows % 8:
+        raise ValueError("block_rows must be a multiple of 8")
+    with DealArchive(archive_path) as archive:
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        with open(path, mode) as f:
+            if mode == "r+b":
+                rows, block_rows = _read_header(f)
+            else:
+                rows = 0
+                f.write(HEADER.pack(MAGIC, VERSION, block_rows, 0, BITMAPS))
+            block_bytes = block_rows // 8
+            start = rows - rows % block_rows
+            for block_start in range(start, archive.rows, block_rows):
+                stop = min(block_start + block_rows, archive.rows)
+                bits = np.zeros((BITMAPS, block_rows), dtype=bool)
+                bits[:, : stop - block_start] = _features(archive.read("owners", block_start, stop))
+                f.seek(HEADER.size + block_start // block_rows * BITMAPS * block_bytes)
+                f.write(np.packbits(bits, axis=1, bitorder="little").tobytes())
+            f.flush()
+            # Commit the row count only after the blocks are written.
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, block_rows, archive.rows, BITMAPS))
+            return archive.rows
+
+
+def _read_header(f) -> tuple[int, int]:
+    f.seek(0)
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError("file is too short for a feature index header")
+    magic, version, block_rows, rows, bitmaps = HEADER.unpack(raw)
+    if magic != MAGIC or version != VERSION or bitmaps != BITMAPS:
+        raise ValueError("not a feature index of this version")
+    return rows, block_rows
+
+
+def _range(base: int, low: int, high: int, top: int) -> list:
+    # Bitmap base + v holds "x <= v" for v < top; x <= top always holds.
+    terms = []
+    if high < top:
+        terms.append(("any", [base + high] if high >= 0 else [], [], True))
+    if low > top:
+        terms.append(("any", [], [], True))
+    elif low > 0:
+        terms.append(("any", [base + low - 1], [], False))
+    return terms
+
+
+class FeatureIndex:
+    """Memory-mapped feature index; select() turns constraints into rows."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self.rows, self.block_rows = _read_header(f)
+        self.blocks = -(-self.rows // self.block_rows)
+        block_bytes = self.block_rows // 8
+        if self.blocks:
+            self._data = np.memmap(
+                path, dtype=np.uint8, mode="r", offset=HEADER.size, shape=(self.blocks, BITMAPS, block_bytes)
+            )
+        else:
+            self._data = np.zeros((0, BITMAPS, block_bytes), dtype=np.uint8)
+
+    @classmethod
+    def for_archive(cls, archive_path: str) -> FeatureIndex | None:
+        """The archive's sidecar index, or None when it has not been built."""
+
+        path = index_path(archive_path)
+        return cls(path) if os.path.exists(path) else None
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def select(
+        self,
+        known: Mapping[int, int] | None = None,
+        constraints: Mapping[int, SeatConstraint] | None = None,
+        excluded: Mapping[int, int] | None = None,
+        limit: int | None = None,
+    ) -> np.ndarray:
+        """Indexed rows where every hand holds its known cards, none of its
+        excluded cards, and meets its constraint; the first limit of them."""
+
+        terms = self._terms(known or {}, constraints or {}, excluded or {})
+        found = []
+        count = 0
+        block = 0
+        window = FIRST_WINDOW if limit is not None else self.blocks
+        while block < self.blocks and (limit is None or count < limit):
+            stop = min(block + window, self.blocks)
+            bits = self._evaluate(terms, block, stop).reshape(-1)
+            # Unpack only the bytes with a match; most are zero for a selective query.
+            nonzero = np.flatnonzero(bits)
+            hits = np.unpackbits(bits[nonzero, None], axis=1, bitorder="little")
+            rows = (nonzero[:, None] * 8 + np.arange(8))[hits.astype(bool)]
+            rows = rows[rows < self.rows - block * self.block_rows] + block * self.block_rows
+            found.append(rows)
+            count += len(rows)
+            block = stop
+            window *= 2
+        rows = np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+        return rows[:limit] if limit is not None else rows
+
+    def _terms(self, known, constraints, excluded) -> list:
+        """The query as clauses to AND together.
+
+        A clause is (kind, bitmaps, complements, wanted): kind "all" is the
+        AND of bitmaps and of the complements' negations, "any" the OR of
+        bitmaps; wanted=False negates the clause.
+        """
+
+        terms = []
+        for cards, wanted in ((known, True), (excluded, False)):
+            for hand, mask in cards.items():
+                for card in range(bitboard.NUM_CARDS):
+                    if int(mask) >> card & 1:
+                        planes = ((CARDS + 2 * card, hand & 1), (CARDS + 2 * card + 1, hand >> 1))
+                        terms.append(
+                            (
+                                "all",
+                                [plane for plane, bit in planes if bit],
+                                [plane for plane, bit in planes if not bit],
+                                wanted,
+                            )
+                        )
+        for hand, constraint in constraints.items():
+            terms += _range(HCP_LE + hand * MAX_HCP, *constraint.hcp, MAX_HCP)
+            lengths = list(constraint.suit_lengths)
+            if constraint.preset == "semiBalanced":
+                for suit, high in ((dds.SUIT_SPADE, 5), (dds.SUIT_HEART, 5), (dds.SUIT_DIAMOND, 6), (dds.SUIT_CLUB, 6)):
+                    low, top = lengths[suit]
+                    lengths[suit] = (max(low, 2), min(top, high))
+            elif constraint.preset == "balanced-without-major":
+                for suit in (dds.SUIT_SPADE, dds.SUIT_HEART):
+                    lengths[suit] = (lengths[suit][0], min(lengths[suit][1], 4))
+            for suit, (low, high) in enumerate(lengths):
+                terms += _range(LENGTH_LE + (hand * dds.DDS_SUITS + suit) * HAND_SIZE, low, high, HAND_SIZE)
+            if constraint.preset in ("balanced", "unbalanced", "balanced-without-major"):
+                balanced = [PATTERN + hand * len(PATTERNS) + p for p in BALANCED]
+                terms.append(("any", balanced, [], constraint.preset != "unbalanced"))
+        return terms
+
+    def _evaluate(self, terms, start: int, stop: int) -> np.ndarray:
+        data = self._data[start:stop]
+        result = np.full((stop - start, data.shape[2]), 0xFF, dtype=np.uint8)
+        for kind, bitmaps, complements, wanted in terms:
+            if kind == "all":
+                bits = np.full_like(result, 0xFF)
+                for bitmap in bitmaps:
+                    bits &= data[:, bitmap]
+                for bitmap in complements:
+                    bits &= ~data[:, bitmap]
+            else:
+                bits = np.zeros_like(result)
+                for bitmap in bitmaps:
+                    bits |= data[:, bitmap]
+            if wanted:
+                result &= bits
+            else:
+                result &= ~bits
+        return result
@@ -0,0 +1,236 @@
+"""A library of random deals with their DD tables, queried by filtering.
+
+A library is a deal_archive.py archive with the deal columns (owners,
+tricks) plus
+
+    hcp      4 bytes   points per hand
+    lengths  16 bytes  suit lengths, hand-major (hand * 4 + suit)
+
+so constraints are checked without unpacking deals. build() keeps the
+deal_index.py feature index next to the archive up to date, so a query
+is an intersection of bitmaps; rows the index does not cover yet are
+scanned, skipping chunks whose HCP or lengths cannot match. The
+metadata records the planned size and the seed. Deals are uniformly
+random, so the deals matching a query are a uniform sample of the deals
+satisfying it. Build one offline with
+
+    python deal_library.py build FILE --deals N [--seed S] [--processes P]
+
+which can be stopped and rerun to continue where it left off.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from typing import Mapping
+
+import numpy as np
+
+try:
+    from . import bitboard, dds, dds_pool, deal_index
+    from .deal_archive import DEAL_COLUMNS, ArchiveWriter, DealArchive
+    from .deal_generator import SeatConstraint
+except ImportError:
+    import bitboard
+    import dds
+    import dds_pool
+    import deal_index
+    from deal_archive import DEAL_COLUMNS, ArchiveWriter, DealArchive
+    from deal_generator import SeatConstraint
+
+
+__all__ = [
+    "COLUMNS",
+    "DealLibrary",
+    "build",
+]
+
+COLUMNS = {
+    **DEAL_COLUMNS,
+    "hcp": dds.DDS_HANDS,
+    "lengths": dds.DDS_HANDS * dds.DDS_SUITS,
+}
+# Deals generated and solved between commits to the archive.
+BUILD_BATCH = 1000
+
+
+def _random_owners(rng: np.random.Generator, count: int) -> np.ndarray:
+    seats = np.repeat(np.arange(dds.DDS_HANDS, dtype=np.uint8), 13)
+    return rng.permuted(np.tile(seats, (count, 1)), axis=1)
+
+
+def build(path: str, count: int, seed: int = 0, processes: int = 0, progress=None) -> dict:
+    """Create (or continue) a library of count deals at path.
+
+    Batch i of BUILD_BATCH deals is drawn from default_rng([seed, i]), so
+    a resumed build yields the same library as an uninterrupted one.
+    processes > 0 solves on a DDSProcessPool. Returns the metadata.
+    """
+
+    meta = {"size": count, "seed": seed}
+    if os.path.exists(path):
+        writer = ArchiveWriter.open(path)
+        if writer.meta != meta:
+            writer.close()
+            raise ValueError(f"{path} holds a library of {writer.meta.get('size')} deals with seed {writer.meta.get('seed')}.")
+    else:
+        writer = ArchiveWriter.create(path, COLUMNS, meta=meta)
+
+    pool = dds_pool.DDSProcessPool(processes).start() if processes > 0 else None
+    solve = pool.calc_all_tables if pool is not None else dds.calc_all_tables
+    try:
+        while writer.rows < count:
+            start = writer.rows
+            stop = min(start + BUILD_BATCH, count)
+            rng = np.random.default_rng([seed, start // BUILD_BATCH])
+            owners = _random_owners(rng, BUILD_BATCH)[: stop - start]
+            masks = bitboard.from_owners(owners)
+            started = time.perf_counter()
+            writer.append(
+                {
+                    "owners": bitboard.pack_owners(owners),
+                    "tricks": solve(bitboard.to_holdings(masks)),
+                    "hcp": bitboard.hcp(masks),
+                    "lengths": bitboard.suit_lengths(masks),
+                }
+            )
+            writer.flush()
+            deal_index.update(path)
+            if progress is not None:
+                progress(stop, count, time.perf_counter() - started)
+    finally:
+        if pool is not None:
+            pool.close()
+        writer.close()
+    return dict(meta, solved=writer.rows)
+
+
+class DealLibrary:
+    """Read-only view of a library built by build()."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.archive = DealArchive(path)
+        self.meta = self.archive.meta
+        self.size = len(self.archive)
+        self.index = deal_index.FeatureIndex.for_archive(path)
+
+    @classmethod
+    def from_env(cls) -> DealLibrary | None:
+        """Library at DEAL_LIBRARY_PATH, or None when unset."""
+
+        path = os.environ.get("DEAL_LIBRARY_PATH")
+        return cls(path) if path else None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def match(
+        self,
+        known: Mapping[int, int] | None = None,
+        constraints: Mapping[int, SeatConstraint] | None = None,
+        limit: int | None = None,
+        excluded: Mapping[int, int] | None = None,
+    ) -> np.ndarray:
+        """Rows where each hand holds its known cards, none of its excluded
+        cards, and meets its constraint.
+
+        Indexed rows come from the feature index; rows appended since the
+        index was last updated are scanned. Stops once limit rows matched.
+        """
+
+        rows = np.empty(0, dtype=np.intp)
+        indexed = 0
+        if self.index is not None:
+            rows = self.index.select(known, constraints, excluded, limit)
+            indexed = min(len(self.index), self.size)
+            rows = rows[rows < indexed]
+        if limit is not None and len(rows) >= limit:
+            return rows[:limit]
+        rest = self._scan(known, constraints, excluded, indexed, None if limit is None else limit - len(rows))
+        return np.concatenate([rows, rest])
+
+    def _scan(self, known, constraints, excluded, first: int, limit: int | None) -> np.ndarray:
+        archive = self.archive
+        cards = [
+            (hand, card, holds)
+            for cards, holds in ((known or {}, True), (excluded or {}, False))
+            for hand, mask in cards.items()
+            for card in range(bitboard.NUM_CARDS)
+            if int(mask) >> card & 1
+        ]
+        constraints = dict(constraints or {})
+        hcp = archive.column("hcp")
+        lengths = archive.column("lengths")
+        matches = []
+        found = 0
+        for chunk in range(first // archive.chunk_rows, archive.chunk_count):
+            if not self._chunk_may_match(chunk, constraints):
+                continue
+            start = chunk * archive.chunk_rows
+            owners = archive.column("owners")[chunk, : min(archive.chunk_rows, self.size - start)]
+            ok = np.arange(len(owners)) >= first - start
+            for hand, card, holds in cards:
+                byte, shift = divmod(card, 4)
+                ok &= ((owners[:, byte] >> (2 * shift)) & 3 == hand) == holds
+            for hand, constraint in constraints.items():
+                rows = np.flatnonzero(ok)
+                ok[rows] = constraint.accepts(
+                    lengths[chunk, rows].reshape(-1, dds.DDS_HANDS, dds.DDS_SUITS)[:, hand],
+                    hcp[chunk, rows, hand],
+                )
+            rows = np.flatnonzero(ok) + start
+            matches.append(rows)
+            found += len(rows)
+            if limit is not None and found >= limit:
+                break
+        rows = np.concatenate(matches) if matches else np.empty(0, dtype=np.intp)
+        return rows[:limit] if limit is not None else rows
+
+    def _chunk_may_match(self, chunk: int, constraints: Mapping[int, SeatConstraint]) -> bool:
+        hcp = self.archive.zone_map("hcp")
+        lengths = self.archive.zone_map("lengths")
+        if hcp is None or lengths is None:
+            return True
+        for hand, constraint in constraints.items():
+            low, high = constraint.hcp
+            if hcp[chunk, 1, hand] < low or hcp[chunk, 0, hand] > high:
+                return False
+            for suit, (low, high) in enumerate(constraint.suit_lengths):
+                lane = hand * dds.DDS_SUITS + suit
+                if lengths[chunk, 1, lane] < low or lengths[chunk, 0, lane] > high:
+                    return False
+        return True
+
+    def tables(self, rows) -> np.ndarray:
+        """(n, 5, 4) DD tables of the given rows."""
+
+        tricks = self.archive.take("tricks", rows)
+        return tricks.reshape(-1, dds.DDS_STRAINS, dds.DDS_HANDS).astype(np.intc)
+
+    def masks(self, rows) -> np.ndarray:
+        """(n, 4) bitboard masks of the given rows."""
+
+        return bitboard.from_owners(bitboard.unpack_owners(self.archive.take("owners", rows)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a deal library of DD-solved random deals.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build")
+    build_parser.add_argument("path")
+    build_parser.add_argument("--deals", type=int, required=True)
+    build_parser.add_argument("--seed", type=int, default=0)
+    build_parser.add_argument("--processes", type=int, default=0, help="DDS worker processes (0 = in-process)")
+    args = parser.parse_args()
+
+    def progress(done: int, total: int, seconds: float) -> None:
+        print(f"{done}/{total} deals solved ({BUILD_BATCH / seconds:.1f} deals/s)", flush=True)
+
+    build(args.path, args.deals, seed=args.seed, processes=args.processes, progress=progress)
+
+
+if __name__ == "__main__":
+    main()
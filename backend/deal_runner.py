@@ -0,0 +1,580 @@
+"""Run the external deal generator without a shared script file.
+
+Each call pipes its Tcl script to its own deal process on stdin (deal
+sources /dev/stdin like any other -i file), so concurrent requests never
+see each other's constraints. DEAL_COMMAND and DEAL_DIR (the directory
+holding deal.tcl, lib/ and format/, by default the working directory)
+locate the generator.
+
+stream_batches() and pipe_deals() consume deal's output while it is
+still generating, so solving overlaps generation and only a couple of
+batches are ever held in memory.
+
+With DEAL_PARALLEL = K > 1 the deals come from K generators at once,
+each seeded from its own SeedSequence child, and are merged round-robin
+in worker order, so a (script, seed, count, K) run always yields the
+same deals in the same order.
+
+A DealWorkerPool (DEAL_WORKERS > 0) keeps deal interpreters running
+deal_worker.tcl, so a request pays for a pipe round-trip instead of
+starting Tcl and sourcing deal's libraries. Workers are pinged before
+every job and replaced after DEAL_WORKER_MAX_JOBS jobs, after a
+timeout, or when a job is abandoned half-way.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import secrets
+import subprocess
+import threading
+from typing import Iterator, Sequence
+
+import numpy as np
+
+__all__ = [
+    "DEAL_COMMAND",
+    "DEAL_DIR",
+    "DealError",
+    "DealWorker",
+    "DealWorkerPool",
+    "derive_seeds",
+    "pipe_deals",
+    "run_deal",
+    "stream_batches",
+    "stream_deals",
+    "stream_parallel_deals",
+]
+
+DEAL_COMMAND = os.environ.get("DEAL_COMMAND", "deal")
+DEAL_DIR = os.environ.get("DEAL_DIR") or None
+DEAL_PARALLEL = max(1, int(os.environ.get("DEAL_PARALLEL", "1")))
+PBN_DEAL_PREFIX = '[Deal "'
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "deal_worker.tcl")
+# deal seeds srandom() with a C int.
+SEED_RANGE = 1 << 31
+
+
+class DealError(RuntimeError):
+    """The deal process exited with an error."""
+
+
+class _Cancel:
+    """Kills the running deal processes of a stream from another thread.
+
+    A reader thread blocked on deal's output only notices a stop flag at
+    the next deal, which with hard constraints can take until the
+    timeout; killing the process ends the read at once.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._kills: list = []
+        self.cancelled = False
+
+    def register(self, kill) -> None:
+        with self._lock:
+            if not self.cancelled:
+                self._kills.append(kill)
+                return
+        kill()
+
+    def unregister(self, kill) -> None:
+        with self._lock:
+            if kill in self._kills:
+                self._kills.remove(kill)
+
+    def __call__(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            kills, self._kills = self._kills, []
+        for kill in kills:
+            kill()
+
+
+def deal_command(count: int, output_format: str = "format/pbn", seed: int | None = None) -> list[str]:
+    seed_args = [] if seed is None else ["-s", str(seed % SEED_RANGE)]
+    return [DEAL_COMMAND, *seed_args, "-i", "/dev/stdin", "-i", output_format, str(count)]
+
+
+def _pbn(line: str) -> str | None:
+    if line.startswith(PBN_DEAL_PREFIX):
+        return line[len(PBN_DEAL_PREFIX) :].split('"', 1)[0]
+    return None
+
+
+def run_deal(script: str, count: int, timeout: float = 800) -> str:
+    """Generate count deals satisfying script and return deal's PBN output.
+
+    Raises FileNotFoundError when deal is not installed,
+    subprocess.TimeoutExpired when it does not finish in time and
+    DealError when it fails.
+    """
+
+    process = subprocess.run(
+        deal_command(count),
+        input=script,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        cwd=DEAL_DIR,
+    )
+    if process.returncode != 0:
+        raise DealError(f"Deal command failed: {process.stderr}")
+    return process.stdout
+
+
+def stream_deals(
+    script: str, count: int, timeout: float = 800, seed: int | None = None, cancel: _Cancel | None = None
+) -> Iterator[str]:
+    """Yield PBN deal strings ("N:...") as deal prints them.
+
+    Raises like run_deal(); closing the iterator early kills deal, and so
+    does cancel() from another thread.
+    """
+
+    process = subprocess.Popen(
+        deal_command(count, seed=seed),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        cwd=DEAL_DIR,
+    )
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    if cancel is not None:
+        cancel.register(process.kill)
+    try:
+        process.stdin.write(script)
+        process.stdin.close()
+        for line in process.stdout:
+            pbn = _pbn(line)
+            if pbn is not None:
+                yield pbn
+        stderr = process.stderr.read()
+        process.wait()
+    finally:
+        timer.cancel()
+        if cancel is not None:
+            cancel.unregister(process.kill)
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(process.args, timeout)
+    if process.returncode != 0:
+        raise DealError(f"Deal command failed: {stderr}")
+
+
+class DealWorker:
+    """One deal interpreter running deal_worker.tcl."""
+
+    def __init__(self) -> None:
+        self.process = subprocess.Popen(
+            [DEAL_COMMAND, "-x", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            cwd=DEAL_DIR,
+        )
+        self.jobs = 0
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def ping(self, timeout: float = 5) -> bool:
+        """True if the interpreter answers within timeout."""
+
+        timer = threading.Timer(timeout, self.process.kill)
+        timer.start()
+        try:
+            self.process.stdin.write("ping\n")
+            self.process.stdin.flush()
+            return self.process.stdout.readline().strip() == "%%pong"
+        except OSError:
+            return False
+        finally:
+            timer.cancel()
+
+    def run(
+        self, script: str, count: int, seed: int, timeout: float = 800, cancel: _Cancel | None = None
+    ) -> Iterator[str]:
+        """Yield the job's PBN deal strings.
+
+        Raises DealError for script errors (the worker stays usable) and
+        subprocess.TimeoutExpired after killing a worker that ran out of
+        time. Closing the iterator before the end, or cancel() from
+        another thread, kills the worker.
+        """
+
+        self.jobs += 1
+        timed_out = threading.Event()
+
+        def kill() -> None:
+            timed_out.set()
+            self.process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        if cancel is not None:
+            cancel.register(self.process.kill)
+        finished = False
+        try:
+            self.process.stdin.write(f"job {seed % SEED_RANGE} {count} {len(script)}\n{script}")
+            self.process.stdin.flush()
+            for line in self.process.stdout:
+                if line.startswith("%%done"):
+                    finished = True
+                    return
+                if line.startswith("%%error"):
+                    finished = True
+                    raise DealError(f"Deal command failed: {line[len('%%error') :].strip()}")
+                pbn = _pbn(line)
+                if pbn is not None:
+                    yield pbn
+        except OSError:
+            pass
+        finally:
+            timer.cancel()
+            if cancel is not None:
+                cancel.unregister(self.process.kill)
+            if not finished:
+                self.close()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(self.process.args, timeout)
+        raise DealError("Deal worker exited unexpectedly.")
+
+    def close(self) -> None:
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class DealWorkerPool:
+    """Persistent deal interpreters shared by concurrent requests."""
+
+    def __init__(self, workers: int, max_jobs: int = 100) -> None:
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self._idle: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    @classmethod
+    def from_env(cls) -> DealWorkerPool | None:
+        """Pool configured by DEAL_WORKERS, or None when unset/0."""
+
+        workers = int(os.environ.get("DEAL_WORKERS", "0"))
+        if workers < 1:
+            return None
+        return cls(workers, max_jobs=int(os.environ.get("DEAL_WORKER_MAX_JOBS", "100")))
+
+    def start(self) -> DealWorkerPool:
+        with self._lock:
+            if not self._started:
+                for _ in range(self.workers):
+                    self._idle.put(DealWorker())
+                self._started = True
+        return self
+
+    def close(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._started = False
+
+    def _acquire(self) -> DealWorker:
+        worker = self._idle.get()
+        if worker.alive() and worker.jobs < self.max_jobs and worker.ping():
+            return worker
+        worker.close()
+        return DealWorker()
+
+    def _release(self, worker: DealWorker) -> None:
+        self._idle.put(worker if worker.alive() else DealWorker())
+
+    def stream_deals(
+        self,
+        script: str,
+        count: int,
+        timeout: float = 800,
+        seed: int | None = None,
+        cancel: _Cancel | None = None,
+    ) -> Iterator[str]:
+        """Pool counterpart of stream_deals()."""
+
+        self.start()
+        worker = self._acquire()
+        try:
+            seed = secrets.randbelow(SEED_RANGE) if seed is None else seed
+            yield from worker.run(script, count, seed, timeout, cancel)
+        finally:
+            self._release(worker)
+
+
+def derive_seeds(seed: int | None, workers: int) -> list[int]:
+    """One independent deal seed per worker, reproducible from seed."""
+
+    children = np.random.SeedSequence(seed).spawn(workers)
+    return [int(child.generate_state(1)[0]) % SEED_RANGE for child in children]
+
+
+def stream_parallel_deals(
+    script: str,
+    count: int,
+    workers: int,
+    timeout: float = 800,
+    seed: int | None = None,
+    pool: DealWorkerPool | None = None,
+    cancel: _Cancel | None = None,
+) -> Iterator[str]:
+    """stream_deals() split over workers generators running at once.
+
+    Worker i makes count // workers deals (one more for the first
+    count % workers) with seed derive_seeds(seed, workers)[i]; the
+    output takes one deal from each worker in turn.
+    """
+
+    counts = [count // workers + (i < count % workers) for i in range(workers)]
+    seeds = derive_seeds(seed, workers)
+    source = pool.stream_deals if pool is not None else stream_deals
+    outputs = [queue.Queue() for _ in range(workers)]
+    stop = threading.Event()
+    kill = _Cancel()
+    if cancel is not None:
+        cancel.register(kill)
+    done = object()
+
+    def read(index: int) -> None:
+        deals = source(script, counts[index], timeout, seeds[index], kill)
+        try:
+            for pbn in deals:
+                if stop.is_set():
+                    return
+                outputs[index].put(pbn)
+            outputs[index].put(done)
+        except BaseException as e:  # handed to the consumer
+            outputs[index].put(e)
+        finally:
+            deals.close()
+
+    readers = [
+        threading.Thread(target=read, args=(index,), daemon=True)
+        for index in range(workers)
+        if counts[index]
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        active = [index for index in range(workers) if counts[index]]
+        while active:
+            for index in list(active):
+                item = outputs[index].get()
+                if item is done:
+                    active.remove(index)
+                    continue
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+    finally:
+        stop.set()
+        # Readers may be blocked waiting for deal's next line.
+        kill()
+        for reader in readers:
+            reader.join()
+        if cancel is not None:
+            cancel.unregister(kill)
+
+
+def stream_batches(
+    script: str,
+    count: int,
+    batch_size: int,
+    timeout: float = 800,
+    depth: int = 2,
+    seed: int | None = None,
+    pool: DealWorkerPool | None = None,
+    parallel: int | None = None,
+) -> Iterator[list[str]]:
+    """stream_deals() grouped into batches by a background reader thread.
+
+    While the caller works on one batch, the reader keeps pulling deals
+    and queues at most depth further batches. With a pool the deals come
+    from its workers instead of new deal processes; parallel (default
+    DEAL_PARALLEL) generators run at once.
+    """
+
+    batches: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    kill = _Cancel()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read() -> None:
+        deals = _deal_stream(script, count, timeout, seed, pool, parallel, kill)
+        try:
+            batch = []
+            for pbn in deals:
+                batch.append(pbn)
+                if len(batch) == batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch:
+                put(batch)
+            put(done)
+        except BaseException as e:  # handed to the consumer
+            put(e)
+        finally:
+            deals.close()
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = batches.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # The reader may be blocked waiting for deal's next line.
+        kill()
+        reader.join()
+
+
+def pipe_deals(
+    script: str,
+    count: int,
+    command: Sequence[str],
+    timeout: float = 2000,
+    seed: int | None = None,
+    pool: DealWorkerPool | None = None,
+    parallel: int | None = None,
+) -> subprocess.CompletedProcess:
+    """Run deal | command, e.g. leadsolver reading /dev/stdin.
+
+    The consumer starts on the first deals while the rest are generated.
+    Returns the consumer's CompletedProcess; raises DealError if deal
+    itself fails.
+    """
+
+    if pool is not None or (parallel or DEAL_PARALLEL) > 1:
+        return _pipe_stream(_deal_stream(script, count, timeout, seed, pool, parallel), command, timeout)
+    generator = subprocess.Popen(
+        deal_command(count, seed=seed),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        cwd=DEAL_DIR,
+    )
+    consumer = None
+    try:
+        generator.stdin.write(script)
+        generator.stdin.close()
+        consumer = subprocess.Popen(
+            list(command),
+            stdin=generator.stdout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        # Only the consumer reads deal's output from here on.
+        generator.stdout.close()
+        stdout, stderr = consumer.communicate(timeout=timeout)
+        generator.wait(timeout=timeout)
+        deal_stderr = generator.stderr.read()
+    finally:
+        for process in (generator, consumer):
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+        generator.stderr.close()
+    if generator.returncode != 0:
+        raise DealError(f"Deal command failed: {deal_stderr}")
+    return subprocess.CompletedProcess(consumer.args, consumer.returncode, stdout, stderr)
+
+
+def _deal_stream(script, count, timeout, seed, pool, parallel, cancel=None) -> Iterator[str]:
+    parallel = parallel or DEAL_PARALLEL
+    if parallel > 1:
+        return stream_parallel_deals(script, count, parallel, timeout, seed, pool, cancel)
+    if pool is not None:
+        return pool.stream_deals(script, count, timeout, seed, cancel)
+    return stream_deals(script, count, timeout, seed, cancel)
+
+
+def _pipe_stream(deals: Iterator[str], command, timeout) -> subprocess.CompletedProcess:
+    # Pool workers' stdout is shared with later jobs and parallel output
+    # is merged, so a thread copies the deals into the consumer's own pipe.
+    read_fd, write_fd = os.pipe()
+    try:
+        consumer = subprocess.Popen(
+            list(command),
+            stdin=read_fd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    except BaseException:
+        os.close(write_fd)
+        raise
+    finally:
+        os.close(read_fd)
+    errors: list[BaseException] = []
+
+    def write() -> None:
+        try:
+            with open(write_fd, "w") as sink:
+                for pbn in deals:
+                    sink.write(f'{PBN_DEAL_PREFIX}{pbn}"]\n\n')
+        except BrokenPipeError:
+            pass
+        except BaseException as e:  # re-raised by the caller
+            errors.append(e)
+        finally:
+            deals.close()
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    try:
+        stdout, stderr = consumer.communicate(timeout=timeout)
+    finally:
+        if consumer.poll() is None:
+            consumer.kill()
+            consumer.wait()
+        writer.join()
+    if errors:
+        raise errors[0]
+    return subprocess.CompletedProcess(consumer.args, consumer.returncode, stdout, stderr)
@@ -0,0 +1,583 @@
+"""Exact uniform sampling of constrained deals, without rejection.
+
+The counting follows event_probability.py: a suit at a time, honours
+are placed card by card and the indistinguishable-for-HCP spot cards
+by multinomial weights. The DP counts, for every partial state after a
+suit (cards, HCP and shape so far of each constrained seat), how many
+ways the remaining suits can complete a deal that meets every
+constraint. Sampling then walks the suits drawing each suit's outcome
+in proportion to its weight times the completions it leaves, then the
+honours and spots behind it, so every accepted deal has the same
+probability and none is rejected.
+
+Unconstrained seats share one pool: their cards are chosen as a block
+and split between them uniformly afterwards, which keeps the state to
+the constrained seats. shapePreset becomes per-suit length ranges plus,
+for balanced and unbalanced, a five-state automaton over the number of
+doubletons and five-card suits.
+
+make_generator() picks this sampler when a pilot batch shows rejection
+sampling (deal_generator) would need too many candidates.
+
+The same counts rank the deals: unrank() turns every index below count
+into a different deal by walking the DP like sampling does, with the
+index split over the choices in mixed radix instead of random draws.
+DealEnumerator uses it to list every deal once when there are few.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import product
+from math import comb, factorial, prod
+import time
+from typing import Iterator, Mapping
+
+import numpy as np
+
+try:
+    from . import bitboard, dds
+    from .deal_generator import (
+        HAND_SIZE,
+        MAX_HCP,
+        ConstrainedDealGenerator,
+        GenerationError,
+        GenerationReport,
+        SeatConstraint,
+    )
+    from .event_probability import HCP_VALUES
+except ImportError:
+    import bitboard
+    import dds
+    from deal_generator import (
+        HAND_SIZE,
+        MAX_HCP,
+        ConstrainedDealGenerator,
+        GenerationError,
+        GenerationReport,
+        SeatConstraint,
+    )
+    from event_probability import HCP_VALUES
+
+
+__all__ = [
+    "DealEnumerator",
+    "ExactDealSampler",
+    "StateLimitExceeded",
+    "layout_bound",
+    "make_generator",
+]
+
+# Give up on the DP beyond this many state transitions (a few
+# seconds); several constrained seats with 3 unknown hands can need far
+# more, and are then left to rejection sampling.
+DEFAULT_MAX_STEPS = 1_000_000
+# make_generator(): candidates in the pilot batch, the most candidates
+# rejection sampling may expect to need, and the step limit of its DP
+# attempt (a few tenths of a second, wasted when the DP is too large).
+PILOT_SIZE = 1 << 14
+REJECTION_BUDGET = 2_000_000
+PROBE_MAX_STEPS = 100_000
+
+# Rank of each card within its suit, 2 .. 14, and its HCP.
+_RANK_HCP = {bitboard.RANKS.index(rank): points for rank, points in HCP_VALUES.items()}
+
+# Balanced automaton: (doubletons, five-card suits) as 2 * d + f while both
+# are at most one and every suit has 2-5 cards; _BROKEN otherwise. With 13
+# cards, not broken means 4333, 4432 or 5332.
+_BROKEN = 4
+_AUTOMATON_PRESETS = {"balanced", "unbalanced", "balanced-without-major"}
+# Per-suit length ranges (S, H, D, C) implied by each shapePreset.
+_PRESET_RANGES = {
+    "balanced": ((2, 5),) * 4,
+    "balanced-without-major": ((2, 4), (2, 4), (2, 5), (2, 5)),
+    "semiBalanced": ((2, 5), (2, 5), (2, 6), (2, 6)),
+}
+
+
+class StateLimitExceeded(RuntimeError):
+    """The constraints need a larger DP than the sampler allows."""
+
+
+def _suit_ranges(constraint: SeatConstraint) -> tuple[tuple[int, int], ...]:
+    # Suit-length ranges narrowed by the preset's, where it has them.
+    ranges = constraint.suit_lengths
+    if constraint.preset in _PRESET_RANGES:
+        ranges = tuple(
+            (max(low, preset_low), min(high, preset_high))
+            for (low, high), (preset_low, preset_high) in zip(ranges, _PRESET_RANGES[constraint.preset])
+        )
+    return ranges
+
+
+def _shape_step(state: int, length: int) -> int:
+    if state == _BROKEN or length < 2 or length > 5:
+        return _BROKEN
+    doubletons, fives = divmod(state, 2)
+    doubletons += length == 2
+    fives += length == 5
+    if doubletons > 1 or fives > 1:
+        return _BROKEN
+    return 2 * doubletons + fives
+
+
+def _unrank_combination(index: int, n: int, k: int) -> list[int]:
+    """The index-th k-subset of range(n) in lexicographic order."""
+
+    chosen = []
+    for position in range(n):
+        if k == 0:
+            break
+        with_position = comb(n - position - 1, k - 1)
+        if index < with_position:
+            chosen.append(position)
+            k -= 1
+        else:
+            index -= with_position
+    return chosen
+
+
+def _unrank_split(index: int, cards: list[int], sizes) -> list[list[int]]:
+    """The index-th way to deal cards into parts of the given sizes."""
+
+    rest = list(cards)
+    parts = []
+    for size in sizes:
+        index, within = divmod(index, comb(len(rest), size))
+        positions = set(_unrank_combination(within, len(rest), size))
+        parts.append([card for i, card in enumerate(rest) if i in positions])
+        rest = [card for i, card in enumerate(rest) if i not in positions]
+    return parts
+
+
+def _compositions(total: int, parts: int):
+    if parts == 1:
+        yield (total,)
+        return
+    for first in range(total + 1):
+        for rest in _compositions(total - first, parts - 1):
+            yield (first,) + rest
+
+
+@dataclass(slots=True)
+class _Group:
+    """A constrained seat, or the pool of unconstrained seats."""
+
+    seats: tuple[int, ...]
+    vacancy: int
+    known_lengths: tuple[int, ...]
+    known_hcp: int
+    suit_ranges: tuple[tuple[int, int], ...] = ((0, HAND_SIZE),) * dds.DDS_SUITS
+    hcp: tuple[int, int] | None = None
+    preset: str | None = None
+
+
+class ExactDealSampler:
+    """Uniform random deals with known cards and per-seat constraints.
+
+    Same arguments, batches() and generate() as ConstrainedDealGenerator.
+    count is the exact number of deals that satisfy the constraints and
+    probability their share of all deals with the known cards. Seats in
+    separate get a DP group of their own even without a constraint, so
+    pattern_counts() can split the count by their shape. Raises
+    StateLimitExceeded when the DP would need more than max_steps state
+    transitions.
+    """
+
+    def __init__(
+        self,
+        known: Mapping[int, int] | None = None,
+        constraints: Mapping[int, SeatConstraint] | None = None,
+        seed: int | None = None,
+        max_steps: int = DEFAULT_MAX_STEPS,
+        separate: tuple[int, ...] = (),
+    ) -> None:
+        # Validates the known cards and drops trivial constraints.
+        base = ConstrainedDealGenerator(known, constraints)
+        self.known = base.known
+        self.constraints = base.constraints
+        self.max_steps = max_steps
+        self._steps = 0
+
+        known_lengths = bitboard.suit_lengths(self.known[None])[0]
+        known_hcp = bitboard.hcp(self.known[None])[0]
+        vacancy = HAND_SIZE - bitboard.popcount(self.known).astype(int)
+        seats = {hand: SeatConstraint() for hand in separate if vacancy[hand]}
+        seats.update(self.constraints)
+        self._groups = []
+        for hand, constraint in sorted(seats.items()):
+            ranges = _suit_ranges(constraint)
+            self._groups.append(
+                _Group(
+                    seats=(hand,),
+                    vacancy=int(vacancy[hand]),
+                    known_lengths=tuple(int(n) for n in known_lengths[hand]),
+                    known_hcp=int(known_hcp[hand]),
+                    suit_ranges=ranges,
+                    hcp=None if constraint.hcp[0] <= 0 and constraint.hcp[1] >= MAX_HCP else constraint.hcp,
+                    preset=constraint.preset if constraint.preset in _AUTOMATON_PRESETS else None,
+                )
+            )
+        pool = tuple(hand for hand in range(dds.DDS_HANDS) if hand not in seats and vacancy[hand])
+        if pool:
+            self._groups.append(
+                _Group(
+                    seats=pool,
+                    vacancy=int(sum(vacancy[hand] for hand in pool)),
+                    known_lengths=(0,) * dds.DDS_SUITS,
+                    known_hcp=0,
+                )
+            )
+        self._pool_vacancies = [int(vacancy[hand]) for hand in pool]
+
+        taken = int(np.bitwise_or.reduce(self.known))
+        self._unknown = [
+            [suit * bitboard.SUIT_BITS + rank for rank in range(bitboard.SUIT_BITS) if not taken >> (suit * bitboard.SUIT_BITS + rank) & 1]
+            for suit in range(dds.DDS_SUITS)
+        ]
+        self._prepare_state_layout()
+        self._outcomes = [self._suit_outcomes(suit) for suit in range(dds.DDS_SUITS)]
+        self._memo: list[dict] = [{} for _ in range(dds.DDS_SUITS + 1)]
+        self._transitions: list[dict] = [{} for _ in range(dds.DDS_SUITS)]
+        self._cumulative: dict = {}
+
+        ways = self._completions(0, self._initial_state) if self._groups else 1
+        self._pool_ways = _multinomial(self._pool_vacancies)
+        self.count = ways * self._pool_ways
+        self.probability = self.count / _multinomial(vacancy)
+
+        sequence = np.random.SeedSequence(seed)
+        self.report = GenerationReport(seed=sequence.entropy, generator="exact")
+        self._rng = np.random.default_rng(sequence)
+
+    def pattern_counts(self, hand: int) -> dict[tuple[int, ...], int]:
+        """Deals counted in count, by the suit lengths (S, H, D, C) of hand.
+
+        hand must be constrained, in separate, or have no unknown cards.
+        """
+
+        index = next((i for i, group in enumerate(self._groups) if group.seats == (hand,)), None)
+        if index is None:
+            if HAND_SIZE - int(bitboard.popcount(self.known[hand])) and self._groups:
+                raise ValueError(f"Hand {hand} shares its DP group with other seats.")
+            lengths = bitboard.suit_lengths(self.known[None])[0, hand]
+            return {tuple(int(n) for n in lengths): self.count} if self.count else {}
+        group = self._groups[index]
+        # Forward pass over the DP transitions, keeping hand's lengths so far.
+        forward = {(self._initial_state, ()): 1}
+        for suit in range(dds.DDS_SUITS):
+            following_ways: dict = {}
+            for (state, lengths), ways in forward.items():
+                for key, following, _ in self._transitions[suit].get(state, ()):
+                    node = (following, lengths + (group.known_lengths[suit] + key[0][index],))
+                    following_ways[node] = following_ways.get(node, 0) + ways * self._outcomes[suit][key][0]
+            forward = following_ways
+        counts: dict[tuple[int, ...], int] = {}
+        for (_, lengths), ways in forward.items():
+            counts[lengths] = counts.get(lengths, 0) + ways * self._pool_ways
+        return counts
+
+    def _prepare_state_layout(self) -> None:
+        # The last group is implied: its cards and HCP so far are what the
+        # others did not take. State = (cards of the other groups, HCP of
+        # the tracked groups, automaton state of the preset groups).
+        groups = self._groups
+        self._implied = len(groups) - 1
+        implied_hcp = bool(groups) and groups[-1].hcp is not None
+        self._tracked = [
+            index for index, group in enumerate(groups[:-1]) if group.hcp is not None or implied_hcp
+        ]
+        self._shaped = [index for index, group in enumerate(groups) if group.preset is not None]
+        self._initial_state = (0,) * (len(groups) - 1 + len(self._tracked)) + (0,) * len(self._shaped)
+        self._unknown_before = np.cumsum([0] + [len(cards) for cards in self._unknown]).tolist()
+        hcp_per_suit = [sum(_RANK_HCP.get(card % bitboard.SUIT_BITS, 0) for card in cards) for cards in self._unknown]
+        self._hcp_before = np.cumsum([0] + hcp_per_suit).tolist()
+
+    def _suit_outcomes(self, suit: int) -> dict:
+        """(cards per group, HCP per tracked group) -> (weight, [(honour owners, spot split, weight)])."""
+
+        groups = self._groups
+        if not groups:
+            return {}
+        cards = self._unknown[suit]
+        honours = [card for card in cards if card % bitboard.SUIT_BITS in _RANK_HCP]
+        spots = len(cards) - len(honours)
+        outcomes: dict = {}
+        for owners in product(range(len(groups)), repeat=len(honours)):
+            honour_counts = [0] * len(groups)
+            points = [0] * len(groups)
+            for card, owner in zip(honours, owners):
+                honour_counts[owner] += 1
+                points[owner] += _RANK_HCP[card % bitboard.SUIT_BITS]
+            for split in _compositions(spots, len(groups)):
+                taken = tuple(h + s for h, s in zip(honour_counts, split))
+                if any(
+                    n > group.vacancy or not group.suit_ranges[suit][0] <= group.known_lengths[suit] + n <= group.suit_ranges[suit][1]
+                    for n, group in zip(taken, groups)
+                ):
+                    continue
+                weight = factorial(spots) // prod(factorial(n) for n in split)
+                key = (taken, tuple(points[index] for index in self._tracked))
+                total, entries = outcomes.get(key, (0, []))
+                entries.append((owners, split, weight))
+                outcomes[key] = (total + weight, entries)
+        return outcomes
+
+    def _step(self, suit: int, state: tuple, key) -> tuple | None:
+        taken, points = key
+        groups = self._groups
+        others = len(groups) - 1
+        cards = [state[i] + taken[i] for i in range(others)]
+        if any(n > groups[i].vacancy for i, n in enumerate(cards)):
+            return None
+        if self._unknown_before[suit + 1] - sum(cards) > groups[-1].vacancy:
+            return None
+        hcps = [state[others + j] + points[j] for j in range(len(self._tracked))]
+        for j, index in enumerate(self._tracked):
+            limit = groups[index].hcp
+            if limit is not None and groups[index].known_hcp + hcps[j] > limit[1]:
+                return None
+        shapes = []
+        for j, index in enumerate(self._shaped):
+            shape = _shape_step(state[others + len(self._tracked) + j], groups[index].known_lengths[suit] + taken[index])
+            if shape == _BROKEN and groups[index].preset != "unbalanced":
+                return None
+            shapes.append(shape)
+        return tuple(cards) + tuple(hcps) + tuple(shapes)
+
+    def _accepts(self, state: tuple) -> bool:
+        groups = self._groups
+        others = len(groups) - 1
+        if any(state[i] != groups[i].vacancy for i in range(others)):
+            return False
+        hcps = state[others : others + len(self._tracked)]
+        for j, index in enumerate(self._tracked):
+            limit = groups[index].hcp
+            if limit is not None and not limit[0] <= groups[index].known_hcp + hcps[j] <= limit[1]:
+                return False
+        implied = groups[-1]
+        if implied.hcp is not None:
+            points = implied.known_hcp + self._hcp_before[-1] - sum(hcps)
+            if not implied.hcp[0] <= points <= implied.hcp[1]:
+                return False
+        for j, index in enumerate(self._shaped):
+            broken = state[others + len(self._tracked) + j] == _BROKEN
+            if broken != (groups[index].preset == "unbalanced"):
+                return False
+        return True
+
+    def _completions(self, suit: int, state: tuple) -> int:
+        memo = self._memo[suit]
+        if state in memo:
+            return memo[state]
+        if suit == dds.DDS_SUITS:
+            ways = int(self._accepts(state))
+        else:
+            ways = 0
+            transitions = []
+            self._steps += len(self._outcomes[suit])
+            if self._steps > self.max_steps:
+                raise StateLimitExceeded(f"More than {self.max_steps} DP transitions are needed.")
+            for key, (weight, _) in self._outcomes[suit].items():
+                following = self._step(suit, state, key)
+                if following is None:
+                    continue
+                count = weight * self._completions(suit + 1, following)
+                if count:
+                    transitions.append((key, following, count))
+                    ways += count
+            self._transitions[suit][state] = transitions
+        memo[state] = ways
+        return ways
+
+    def _choose(self, cache_key, weights) -> int:
+        cumulative = self._cumulative.get(cache_key)
+        if cumulative is None:
+            cumulative = np.cumsum([float(weight) for weight in weights])
+            self._cumulative[cache_key] = cumulative
+        index = int(np.searchsorted(cumulative, self._rng.random() * cumulative[-1], side="right"))
+        return min(index, len(cumulative) - 1)
+
+    def _sample(self) -> np.ndarray:
+        groups = self._groups
+        if not groups:
+            return self.known.copy()
+        held: list[list[int]] = [[] for _ in groups]
+        state = self._initial_state
+        for suit in range(dds.DDS_SUITS):
+            transitions = self._transitions[suit][state]
+            key, state, _ = transitions[self._choose((suit, state), [count for _, _, count in transitions])]
+            entries = self._outcomes[suit][key][1]
+            owners, split, _ = entries[self._choose((suit, key), [weight for _, _, weight in entries])]
+            cards = self._unknown[suit]
+            honours = [card for card in cards if card % bitboard.SUIT_BITS in _RANK_HCP]
+            for card, owner in zip(honours, owners):
+                held[owner].append(card)
+            spots = self._rng.permutation([card for card in cards if card % bitboard.SUIT_BITS not in _RANK_HCP])
+            start = 0
+            for owner, n in enumerate(split):
+                held[owner].extend(spots[start : start + n].tolist())
+                start += n
+
+        masks = self.known.copy()
+        for group, cards in zip(groups, held):
+            if len(group.seats) > 1 or group.seats[0] not in self.constraints:
+                cards = self._rng.permutation(cards).tolist()
+            start = 0
+            for hand in group.seats:
+                n = HAND_SIZE - int(bitboard.popcount(self.known[hand]))
+                for card in cards[start : start + n]:
+                    masks[hand] |= np.uint64(1 << card)
+                start += n
+        return masks
+
+    def unrank(self, rank: int) -> np.ndarray:
+        """Deal number rank (0 <= rank < count) as (4,) masks; each rank gives a different deal."""
+
+        if not 0 <= rank < self.count:
+            raise IndexError(f"rank {rank} is outside 0..{self.count - 1}")
+        groups = self._groups
+        rank, pool_rank = divmod(rank, self._pool_ways)
+        held: list[list[int]] = [[] for _ in groups]
+        state = self._initial_state
+        for suit in range(dds.DDS_SUITS):
+            for key, following, count in self._transitions[suit][state]:
+                if rank < count:
+                    break
+                rank -= count
+            local, rank = divmod(rank, self._memo[suit + 1][following])
+            for owners, split, weight in self._outcomes[suit][key][1]:
+                if local < weight:
+                    break
+                local -= weight
+            cards = self._unknown[suit]
+            honours = [card for card in cards if card % bitboard.SUIT_BITS in _RANK_HCP]
+            for card, owner in zip(honours, owners):
+                held[owner].append(card)
+            spots = [card for card in cards if card % bitboard.SUIT_BITS not in _RANK_HCP]
+            for owner, part in enumerate(_unrank_split(local, spots, split)):
+                held[owner].extend(part)
+            state = following
+
+        masks = self.known.copy()
+        for group, cards in zip(groups, held):
+            vacancies = [HAND_SIZE - int(bitboard.popcount(self.known[hand])) for hand in group.seats]
+            parts = _unrank_split(pool_rank, sorted(cards), vacancies) if len(group.seats) > 1 else [cards]
+            for hand, part in zip(group.seats, parts):
+                for card in part:
+                    masks[hand] |= np.uint64(1 << card)
+        return masks
+
+    def batches(self, count: int, batch_size: int) -> Iterator[np.ndarray]:
+        """Yield count deals as (<= batch_size, 4) mask arrays.
+
+        Raises GenerationError when no deal satisfies the constraints.
+        """
+
+        if self.count == 0:
+            raise GenerationError("No deal satisfies the constraints.")
+        for start in range(0, count, batch_size):
+            started = time.perf_counter()
+            batch = np.array([self._sample() for _ in range(min(batch_size, count - start))])
+            self.report.seconds += time.perf_counter() - started
+            self.report.accepted += len(batch)
+            self.report.candidates += len(batch)
+            yield batch
+
+    def generate(self, count: int) -> np.ndarray:
+        batches = list(self.batches(count, max(count, 1)))
+        return np.concatenate(batches) if batches else np.empty((0, dds.DDS_HANDS), dtype=np.uint64)
+
+
+class DealEnumerator:
+    """Every deal an ExactDealSampler counts, once each, in rank order.
+
+    batches() continues from start, so deals already solved are skipped.
+    """
+
+    def __init__(self, sampler: ExactDealSampler, start: int = 0) -> None:
+        self.sampler = sampler
+        self.count = sampler.count
+        self.position = start
+        self.report = GenerationReport(seed=None, generator="enumeration")
+
+    def batches(self, count: int, batch_size: int) -> Iterator[np.ndarray]:
+        """Yield the next count deals (at most those left) as (<= batch_size, 4) mask arrays."""
+
+        if self.count == 0:
+            raise GenerationError("No deal satisfies the constraints.")
+        stop = min(self.position + count, self.count)
+        while self.position < stop:
+            size = min(batch_size, stop - self.position)
+            started = time.perf_counter()
+            batch = np.array([self.sampler.unrank(rank) for rank in range(self.position, self.position + size)])
+            self.report.seconds += time.perf_counter() - started
+            self.position += size
+            self.report.accepted += size
+            self.report.candidates += size
+            yield batch
+
+    def generate(self, count: int) -> np.ndarray:
+        batches = list(self.batches(count, max(count, 1)))
+        return np.concatenate(batches) if batches else np.empty((0, dds.DDS_HANDS), dtype=np.uint64)
+
+
+def layout_bound(
+    known: Mapping[int, int] | None, constraints: Mapping[int, SeatConstraint] | None = None
+) -> int:
+    """Cheap upper bound on ExactDealSampler(known, constraints).count.
+
+    For each constrained seat, the hands that fit its suit-length ranges
+    (and its preset's) times the ways to deal the other seats; the
+    smallest of these and the unconstrained count. HCP ranges are
+    ignored. Raises ValueError like ConstrainedDealGenerator.
+    """
+
+    base = ConstrainedDealGenerator(known, constraints)
+    vacancy = HAND_SIZE - bitboard.popcount(base.known).astype(int)
+    known_lengths = bitboard.suit_lengths(base.known[None])[0].astype(int)
+    unknown = HAND_SIZE - known_lengths.sum(axis=0)
+    bound = _multinomial(vacancy)
+    for hand, constraint in base.constraints.items():
+        spans = [
+            range(max(low - have, 0), min(high - have, free) + 1)
+            for (low, high), have, free in zip(_suit_ranges(constraint), known_lengths[hand], unknown)
+        ]
+        hands = 0
+        for lengths in product(*spans[:-1]):
+            last = int(vacancy[hand]) - sum(lengths)
+            if last in spans[-1]:
+                hands += prod(comb(int(n), k) for n, k in zip(unknown, (*lengths, last)))
+        rest = [int(n) for seat, n in enumerate(vacancy) if seat != hand]
+        bound = min(bound, hands * _multinomial(rest))
+    return bound
+
+
+def _multinomial(parts) -> int:
+    parts = [int(n) for n in parts]
+    return factorial(sum(parts)) // prod(factorial(n) for n in parts)
+
+
+def make_generator(
+    known: Mapping[int, int] | None,
+    constraints: Mapping[int, SeatConstraint] | None,
+    count: int,
+    seed: int | None = None,
+):
+    """Rejection sampling when it is cheap enough, the exact sampler otherwise.
+
+    A pilot batch estimates the acceptance rate; if count deals would need
+    more than REJECTION_BUDGET candidates the exact sampler is used, unless
+    its DP needs more than PROBE_MAX_STEPS steps.
+    """
+
+    generator = ConstrainedDealGenerator(known, constraints, seed=seed)
+    if not generator.constraints:
+        return generator
+    accepted = int(generator.accepts(generator.candidates(PILOT_SIZE)).sum())
+    if (accepted + 1) / (PILOT_SIZE + 1) * REJECTION_BUDGET >= count:
+        return generator
+    try:
+        return ExactDealSampler(known, constraints, seed=seed, max_steps=PROBE_MAX_STEPS)
+    except StateLimitExceeded:
+        return generator
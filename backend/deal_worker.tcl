@@ -0,0 +1,72 @@
+# deal_worker.tcl - a long-lived deal interpreter for deal_runner.DealWorker
+#
+# Run as `deal -x deal_worker.tcl` from the deal directory. Reads jobs from
+# stdin and answers on stdout:
+#
+#   ping                            -> %%pong
+#   job <seed> <count> <length>\n<script of length characters>
+#                                   -> count [Deal "..."] lines, then %%done
+#                                      (or %%error <message>)
+#
+# Every job starts from a fresh deck and an accept-all main, and the
+# globals, procs and shape classes a job creates are deleted after it, so
+# nothing leaks into the next job.
+
+source format/pbn
+fconfigure stdin -translation lf -encoding utf-8
+fconfigure stdout -translation lf -encoding utf-8
+
+proc report_error {message} {
+    puts "%%error [string map {"\n" " "} $message]"
+}
+
+proc forget_job {globals commands} {
+    foreach name [info globals] {
+        if {[lsearch -exact $globals $name] < 0} {
+            uplevel #0 [list unset -nocomplain $name]
+        }
+    }
+    foreach name [info commands] {
+        if {[lsearch -exact $commands $name] < 0} {
+            rename ::$name {}
+        }
+    }
+}
+
+while {[gets stdin header] >= 0} {
+    set command [lindex $header 0]
+    if {$command eq "ping"} {
+        puts "%%pong"
+        flush stdout
+        continue
+    }
+    if {$command ne "job"} {
+        report_error "unknown command $command"
+        flush stdout
+        continue
+    }
+    lassign $header command seed count length
+    set script [read stdin $length]
+    reset_deck
+    main {accept}
+    seed_deal $seed
+    set globals [info globals]
+    set commands [info commands]
+    if {[catch {uplevel #0 $script} message]} {
+        report_error $message
+    } else {
+        set failed 0
+        for {set i 0} {$i < $count} {incr i} {
+            if {[catch {deal_loop write_deal} message]} {
+                report_error $message
+                set failed 1
+                break
+            }
+        }
+        if {!$failed} {
+            puts "%%done"
+        }
+    }
+    forget_job $globals $commands
+    flush stdout
+}
@@ -5,11 +5,12 @@ import os
 import random
 import re
 import subprocess
-import threading
 import time
 from contextlib import asynccontextmanager
 from ctypes import byref, c_int
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import numpy as np
 
 # Support both execution styles:
 # - uvicorn main:app (cwd=backend)
@@ -19,6 +20,33 @@ try:
 except ImportError:
     import dds
 
+try:
+    from . import dds_pool
+except ImportError:
+    import dds_pool
+
+try:
+    from . import dd_cache
+except ImportError:
+    import dd_cache
+
+try:
+    from . import deal_runner
+except ImportError:
+    import deal_runner
+
+try:
+    from . import bitboard, deal_generator, deal_library, deal_sampler, paired, sim_store, stopping, stratified
+except ImportError:
+    import bitboard
+    import deal_generator
+    import deal_library
+    import deal_sampler
+    import paired
+    import sim_store
+    import stopping
+    import stratified
+
 try:
     from conditional_probability import calculate_conditional_probability
 except ImportError:
@@ -34,8 +62,50 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, constr
 
-dds_lock = threading.Lock()
-app = FastAPI()
+dds_executor = dds.DDSExecutor()
+# シミュレーションは deal の出力をこの枚数ずつ DDS に流す
+SOLVE_BATCH_SIZE = dds.MAXNOOFBOARDS
+# DDS_WORKER_PROCESSES > 0 のときだけ、重いシミュレーションを別プロセスで解く
+dds_worker_pool = dds_pool.DDSProcessPool.from_env()
+# 同じディールは一度だけ解く（DD_CACHE_PATH を指定すると全ワーカーで sqlite を共有）
+dd_table_cache = dd_cache.DDTableCache.from_env()
+# DEAL_WORKERS > 0 のときは deal を常駐させ、リクエストごとの起動を省く
+deal_worker_pool = deal_runner.DealWorkerPool.from_env()
+# DEAL_LIBRARY_PATH を指定すると mode="library" のシングルダミーが使える
+deal_library_store = deal_library.DealLibrary.from_env()
+# 同じ条件のシングルダミーで解いたディールを覚えておき、追加分だけ解く
+simulation_store = sim_store.SimulationStore.from_env()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # アプリケーション起動時に実行される処理
+    # libdds.so は最初の DDS リクエストで読み込まれる（dds_executor.start() で
+    # SetMaxThreads を呼び、DDSのスレッド数に合わせてワーカースレッドを起動する）
+    if dds_worker_pool is not None:
+        dds_worker_pool.start()
+        print(f"DDS worker pool started with {dds_worker_pool.processes} processes.")
+    if deal_worker_pool is not None:
+        deal_worker_pool.start()
+        print(f"Deal worker pool started with {deal_worker_pool.workers} workers.")
+
+    yield  # ここでアプリケーションが実行される
+
+    # アプリケーション終了時に実行される処理
+    print("Application shutdown: Freeing DDS resources...")
+    if dds_worker_pool is not None:
+        dds_worker_pool.close()
+    if deal_worker_pool is not None:
+        deal_worker_pool.close()
+    dds_executor.shutdown()
+    dd_table_cache.close()
+    simulation_store.close()
+    if dds.is_loaded():
+        dds.FreeMemory()
+    print("DDS resources freed.")
+
+
+app = FastAPI(lifespan=lifespan)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("bridge_solver")
 logger.setLevel(logging.INFO)
@@ -67,8 +137,43 @@ app.add_middleware(
 )
 
 
+STRAIN_NAMES = {
+    "Spades": dds.SUIT_SPADE,
+    "Hearts": dds.SUIT_HEART,
+    "Diamonds": dds.SUIT_DIAMOND,
+    "Clubs": dds.SUIT_CLUB,
+    "No-Trump": dds.SUIT_NT,
+}
+
+HAND_NAMES = {
+    "North": dds.HAND_NORTH,
+    "East": dds.HAND_EAST,
+    "South": dds.HAND_SOUTH,
+    "West": dds.HAND_WEST,
+}
+
+VULNERABILITY_NAMES = {
+    "None": dds.VUL_NONE,
+    "Both": dds.VUL_BOTH,
+    "NS": dds.VUL_NS,
+    "EW": dds.VUL_EW,
+}
+
+DealerName = Literal["North", "East", "South", "West"]
+VulnerabilityName = Literal["None", "Both", "NS", "EW"]
+
+
 class DealPBN(BaseModel):
     pbn: constr(max_length=80)
+    dealer: DealerName = "North"
+    vulnerability: VulnerabilityName = "None"
+
+
+class PrecisionTarget(BaseModel):
+    # "4S" や "3NT" のメイク確率の標準誤差が standard_error 以下になったら止める
+    contract: str
+    declarer: Literal["North", "South"] = "North"
+    standard_error: float = Field(gt=0, le=0.5)
 
 
 class SingleDummyRequest(BaseModel):
@@ -78,6 +183,49 @@ class SingleDummyRequest(BaseModel):
     shapePreset: Dict[str, str]
     hcp: Dict[str, str]
     simulations: int = Field(default=1000, ge=1, le=5000)
+    strains: List[str] = Field(
+        default_factory=lambda: [
+            "No-Trump",
+            "Spades",
+            "Hearts",
+            "Diamonds",
+            "Clubs",
+        ],
+        min_length=1,
+    )
+    # par=True のときは全ストレインを解き、par スコア（NS視点）の分布も返す
+    par: bool = False
+    dealer: DealerName = "North"
+    vulnerability: VulnerabilityName = "None"
+    # advanced_tcl が空のときは NumPy で生成する（同じ seed なら同じディール）
+    seed: Optional[int] = None
+    # "library" は DEAL_LIBRARY_PATH の解済みディールから条件に合うものを使う
+    mode: Literal["generate", "library"] = "generate"
+    # 指定すると simulations を上限に、この精度に届いた時点で止める
+    target: Optional[PrecisionTarget] = None
+    # "stratified" は未知のハンドの形ごとに厳密な確率に比例してディールを割り振る
+    sampling: Literal["random", "stratified"] = "random"
+
+
+class ComparisonVariant(BaseModel):
+    # north / south を省略すると pbn のハンドを使う（コントラクトだけ変える比較）
+    name: Optional[str] = None
+    contract: str
+    declarer: Literal["North", "South"] = "North"
+    north: Optional[constr(max_length=20)] = None
+    south: Optional[constr(max_length=20)] = None
+
+
+class PairedComparisonRequest(BaseModel):
+    pbn: constr(max_length=80)
+    shapes: Dict[str, str]
+    shapePreset: Dict[str, str]
+    hcp: Dict[str, str]
+    # 先頭が基準。残りは同じディールで解いた基準との差を返す
+    variants: List[ComparisonVariant] = Field(min_length=2, max_length=8)
+    simulations: int = Field(default=500, ge=10, le=5000)
+    vulnerability: VulnerabilityName = "None"
+    seed: Optional[int] = None
 
 
 class LeadSolverRequest(BaseModel):
@@ -89,6 +237,7 @@ class LeadSolverRequest(BaseModel):
     leader: str
     simulations: int = Field(default=1000, ge=10, le=5000)
     advanced_tcl: Optional[str] = ""
+    seed: Optional[int] = None
 
 
 class RangeRequest(BaseModel):
@@ -163,25 +312,6 @@ async def add_process_time_header(request: Request, call_next):
         )
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # アプリケーション起動時に実行される処理
-    print("Application startup: Initializing DDS library...")
-    with dds_lock:
-        # この関数は、他のDDS関数を呼び出す前に一度だけ呼び出す必要がある
-        # ライブラリの内部スレッド管理を初期化する
-        dds.SetMaxThreads(0)
-    print("DDS library initialized.")
-
-    yield  # ここでアプリケーションが実行される
-
-    # アプリケーション終了時に実行される処理
-    print("Application shutdown: Freeing DDS resources...")
-    with dds_lock:
-        dds.FreeResources()
-    print("DDS resources freed.")
-
-
 # PBN文字列のリストを渡すと、各ディールの解決済みのトリックを返す
 # 例: ["N:...", "N:..."] -> [[...], [...]]
 def solve_multiple_deals_in_batch(pbn_deals):
@@ -240,6 +370,21 @@ def solve_multiple_deals_in_batch(pbn_deals):
     return results
 
 
+def solve_boards(holdings, trump_filter=None):
+    # 1ディールずつ SolveBoard で解く（/api/analyse 用）
+    return np.array(
+        [dds_executor.calc_dd_table(deal) for deal in holdings], dtype=np.intc
+    ).reshape(-1, dds.DDS_STRAINS, dds.DDS_HANDS)
+
+
+def solve_tables(holdings, trump_filter=None, vulnerable=None):
+    # キャッシュに無かったディールだけがここに来る
+    if dds_worker_pool is not None:
+        return dds_worker_pool.calc_all_tables(holdings, trump_filter, vulnerable)
+    with dds_executor.exclusive():
+        return dds.calc_all_tables(holdings, trump_filter, vulnerable)
+
+
 @app.get("/")
 def read_root():
     return {"message": "DDS and Lead Solver Server is running"}
@@ -247,13 +392,21 @@ def read_root():
 
 @app.post("/api/analyse")
 def analyse_deal(deal_pbn: DealPBN):
-    # (変更なし)
-    table_deal_pbn = dds.ddTableDealPBN()
-    table_deal_pbn.cards = deal_pbn.pbn.encode("utf-8")
-    results = dds.ddTableResults()
-    ret = dds.CalcDDtablePBN(table_deal_pbn, byref(results))
-    if ret != dds.RETURN_NO_FAULT:
-        return {"error": f"DDS library failed with return code: {ret}"}
+    try:
+        holdings = dds.pbn_to_holdings([deal_pbn.pbn])[0]
+    except (ValueError, IndexError):
+        return {"error": f"Invalid PBN deal: {deal_pbn.pbn}"}
+    try:
+        res_table = dd_cache.cached_calc_all_tables(
+            dd_table_cache, holdings[None], None, solve_boards
+        )[0].tolist()
+        par_score, par_contracts = dds.dealer_par(
+            res_table,
+            HAND_NAMES[deal_pbn.dealer],
+            VULNERABILITY_NAMES[deal_pbn.vulnerability],
+        )
+    except dds.DDSError as e:
+        return {"error": f"DDS library failed with return code: {e.code}"}
     display_suits = ["No-Trump", "Clubs", "Diamonds", "Hearts", "Spades"]
     suit_map = {
         "Spades": dds.SUIT_SPADE,
@@ -268,18 +421,26 @@ def analyse_deal(deal_pbn: DealPBN):
         "East": dds.HAND_EAST,
         "West": dds.HAND_WEST,
     }
-    response_data = {"tricks": {}}
+    response_data = {
+        "tricks": {},
+        "par": {"score": par_score, "contracts": par_contracts},
+    }
     for suit_name in display_suits:
         suit_idx = suit_map[suit_name]
         response_data["tricks"][suit_name] = {
-            "North": results.resTable[suit_idx][hand_map["North"]],
-            "East": results.resTable[suit_idx][hand_map["East"]],
-            "South": results.resTable[suit_idx][hand_map["South"]],
-            "West": results.resTable[suit_idx][hand_map["West"]],
+            "North": res_table[suit_idx][hand_map["North"]],
+            "East": res_table[suit_idx][hand_map["East"]],
+            "South": res_table[suit_idx][hand_map["South"]],
+            "West": res_table[suit_idx][hand_map["West"]],
         }
     return response_data
 
 
+@app.get("/api/cache_stats")
+def cache_stats():
+    return dd_table_cache.stats()
+
+
 @app.post("/api/conditional_probability")
 def conditional_probability(request: ConditionalProbabilityRequest):
     try:
@@ -304,44 +465,31 @@ def conditional_probability(request: ConditionalProbabilityRequest):
         }
 
 
-def runDeal(tcl_text, num):
-    # Write the script to a temporary file
-    script_filename = "_deal.tcl"
-    print(tcl_text, num)
-    with open(script_filename, "w") as f:
-        f.write(tcl_text)
-
-    # 2. Call the 'deal' command using the script file
-    try:
-        command = [
-            "deal",
-            "-i",
-            script_filename,
-            "-i",
-            "format/pbn",
-            str(num),
-        ]
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
-        stdout, stderr = process.communicate(timeout=800)
-
-        if process.returncode != 0:
-            return {"error": f"Deal command failed: {stderr}"}
-
-        print(stdout)
-        return stdout
-
-    except FileNotFoundError:
+def deal_error(e):
+    # deal_runner の例外を API のエラーレスポンスにする
+    if isinstance(e, (deal_runner.DealError, deal_generator.GenerationError)):
+        return {"error": str(e)}
+    if isinstance(e, FileNotFoundError):
         return {
             "error": "The 'deal' command is not found. Please ensure it is installed and in the system's PATH."
         }
-    except subprocess.TimeoutExpired:
+    if isinstance(e, subprocess.TimeoutExpired):
         return {
             "error": "Hand generation timed out. The constraints might be too complex or impossible to satisfy."
         }
-    except Exception as e:
-        return {"error": f"An error occurred during hand generation: {str(e)}"}
+    return {"error": f"An error occurred during hand generation: {str(e)}"}
+
+
+def seat_constraints(request, players):
+    # shapes / hcp / shapePreset を deal_generator の席ごとの制約にする
+    return {
+        deal_generator.SEAT_NAMES[p]: deal_generator.SeatConstraint.parse(
+            request.shapes.get(p, ""),
+            request.hcp.get(p, ""),
+            request.shapePreset.get(p, "any"),
+        )
+        for p in players
+    }
 
 
 @app.post("/api/analyse_single_dummy")
@@ -379,15 +527,28 @@ def analyse_single_dummy(request: SingleDummyRequest):
         #         "error": "Invalid number of cards for North and South. Must be 26 total."
         #     }
 
+        unknown_strains = [s for s in request.strains if s not in STRAIN_NAMES]
+        if unknown_strains:
+            return {"error": f"Unknown strains: {', '.join(unknown_strains)}"}
+        strain_indices = [STRAIN_NAMES[s] for s in dict.fromkeys(request.strains)]
+        # target があるときは simulations を上限に、目標の標準誤差に届いたら止める
+        rule = None
+        if request.target is not None:
+            try:
+                rule = stopping.PrecisionRule.parse(
+                    request.target.contract,
+                    dds.HAND_NORTH if request.target.declarer == "North" else dds.HAND_SOUTH,
+                    request.target.standard_error,
+                )
+            except ValueError as e:
+                return {"error": str(e)}
+
         trick_distribution = {
-            suit: {"North": [0] * 14, "South": [0] * 14}
-            for suit in [
-                dds.SUIT_NT,
-                dds.SUIT_SPADE,
-                dds.SUIT_HEART,
-                dds.SUIT_DIAMOND,
-                dds.SUIT_CLUB,
-            ]
+            suit: {
+                "North": np.zeros(14, dtype=np.int64),
+                "South": np.zeros(14, dtype=np.int64),
+            }
+            for suit in strain_indices
         }
 
         def splitRange(_range, min_range=0, max_range=40):
@@ -504,130 +665,359 @@ accept
         """
         print(tcl_text)
 
-        with dds_lock:
-            deal_pbn = runDeal(tcl_text, request.simulations)
-            print(deal_pbn)
-            deals = deal_pbn.splitlines()
-            deals = list(filter(lambda x: x != "", deals))
-
-            print(len(deals))
-
-            # batch_size = 10
-            # batch_num = math.ceil(len(deals) / batch_size)
-            # all_results = []
-            # for batch in range(batch_num):
-            #     table_deals_pbn = dds.ddTableDealsPBN()
-            #     table_deals_pbn.noOfTables = (
-            #         len(deals) - batch * batch_size
-            #         if len(deals) - batch * batch_size < batch_size
-            #         else batch_size
-            #     )
-            #     print(
-            #         len(deals) - batch * batch_size
-            #         if len(deals) - batch * batch_size < batch_size
-            #         else batch_size
-            #     )
-            #     print("aaaa")
-            #     enumerated = enumerate(
-            #         deals[batch * batch_size : (batch + 1) * batch_size]
-            #     )
-            #     print("cccc")
-            #     for i, pbn in enumerated:
-            #         # table_deal_pbn = dds.ddTableDealPBN()
-            #         print("bbbb")
-            #         hand = (
-            #             pbn.replace('[Deal "', "").replace('"]', "")
-            #             # .replace(". ", ".- ")
-            #             # .replace("..", ".-.")
-            #             # .replace(" .", " -.")
-            #         )
-            #         print(i, hand)
-            #         if hand != "":
-            #             table_deals_pbn.deals[i].cards = hand.encode("utf-8")
-            #             print(i)
-
-            #         # deals.append(table_deal_pbn)
-
-            #     print("set deals")
-            #     results = dds.ddTablesRes()
-            #     per_results = dds.allParResults()
-            #     print("run calc all tables")
-            #     ret = dds.CalcAllTablesPBN(
-            #         table_deals_pbn,
-            #         (c_int * 5)(0, 0, 0, 0, 0),
-            #         0,
-            #         byref(results),
-            #         byref(per_results),
-            #     )
-            #     print(ret)
-            #     print(results)
-            #     print(per_results)
-            #     if ret != dds.RETURN_NO_FAULT:
-            #         return {
-            #             "error": f"DDS library failed with return code: {ret}"
-            #         }
-
-            #     all_results.append(results)
-            valid_simulations = 0
-            for deal in deals:
-                table_deal_pbn = dds.ddTableDealPBN()
-                table_deal_pbn.cards = (
-                    deal.replace('[Deal "', "")
-                    .replace('"]', "")
-                    .encode("utf-8")
+        generator = None
+        library_rows = None
+        known = {
+            dds.HAND_NORTH: deal_generator.hand_mask(north_hand_str),
+            dds.HAND_SOUTH: deal_generator.hand_mask(south_hand_str),
+        }
+        constraints = seat_constraints(request, request.shapes)
+        advanced = bool((request.advanced_tcl or "").strip())
+        if request.mode == "library" and deal_library_store is not None and not advanced:
+            # 解済みライブラリから条件に合うディールを探し、足りなければ生成する
+            rows = deal_library_store.match(known, constraints, limit=request.simulations)
+            if len(rows) >= request.simulations:
+                library_rows = rows
+            else:
+                logger.info(
+                    "Deal library has %d of %d deals; generating instead.",
+                    len(rows),
+                    request.simulations,
                 )
-                results = dds.ddTableResults()
-                ret = dds.CalcDDtablePBN(table_deal_pbn, byref(results))
-
-                if ret == dds.RETURN_NO_FAULT:
-                    valid_simulations += 1
-                    for suit_idx in trick_distribution:
-                        north_tricks = results.resTable[suit_idx][
-                            dds.HAND_NORTH
-                        ]
-                        south_tricks = results.resTable[suit_idx][
-                            dds.HAND_SOUTH
-                        ]
-                        trick_distribution[suit_idx]["North"][
-                            north_tricks
-                        ] += 1
-                        trick_distribution[suit_idx]["South"][
-                            south_tricks
-                        ] += 1
-
-            suit_map_rev = {
-                dds.SUIT_SPADE: "Spades",
-                dds.SUIT_HEART: "Hearts",
-                dds.SUIT_DIAMOND: "Diamonds",
-                dds.SUIT_CLUB: "Clubs",
-                dds.SUIT_NT: "No-Trump",
-            }
 
-            response_dist = {}
-            for suit_idx, hands in trick_distribution.items():
-                suit_name = suit_map_rev[suit_idx]
-                response_dist[suit_name] = {
-                    "North": [
-                        (count / valid_simulations) * 100
-                        for count in hands["North"]
-                    ],
-                    "South": [
-                        (count / valid_simulations) * 100
-                        for count in hands["South"]
-                    ],
-                }
+        # 条件に合うレイアウトが simulations 以下なら、全部を一度ずつ解いて厳密な分布を返す。
+        # 長さの条件だけから求めた上限が simulations 以下のときだけ数えるので、
+        # DP は小さく、作ったら列挙にそのまま使う
+        layouts = None
+        if (
+            library_rows is None
+            and not advanced
+            and deal_sampler.layout_bound(known, constraints) <= request.simulations
+        ):
+            try:
+                layouts = deal_sampler.ExactDealSampler(known, constraints)
+            except deal_sampler.StateLimitExceeded:
+                logger.info("Counting the layouts needs too large a DP; sampling instead.")
+            if layouts is not None and layouts.count == 0:
+                return {"error": "No deal satisfies the constraints."}
+            if layouts is not None and rule is not None:
+                rule.exact = True
+        simulations = layouts.count if layouts is not None else request.simulations
+
+        # 層別サンプリングは NumPy で生成するときだけ使える（DP が大きすぎるときも通常の生成）
+        strata = None
+        if request.sampling == "stratified" and library_rows is None and not advanced and layouts is None:
+            try:
+                strata = stratified.ShapeStrata.build(known, constraints)
+            except deal_sampler.StateLimitExceeded:
+                logger.info("Shape strata need too large a DP; sampling at random instead.")
+            except deal_generator.GenerationError as e:
+                return deal_error(e)
+            if rule is not None and strata is not None:
+                rule.stratified = True
+        sampling = "enumeration" if layouts is not None else "stratified" if strata is not None else "random"
+
+        # 同じ条件で前に解いたディールは再利用し、足りない分だけ生成して解く
+        needed_strains = list(range(dds.DDS_STRAINS)) if request.par else strain_indices
+        if rule is not None and rule.strain not in needed_strains:
+            needed_strains = needed_strains + [rule.strain]
+        store_key = sim_store.simulation_key(known, constraints, request.advanced_tcl, request.seed, sampling)
+        stored = simulation_store.get(store_key) if library_rows is None else None
+        reused = min(len(stored[0]), simulations) if stored is not None else 0
+        remaining = simulations - reused if library_rows is None else 0
+        seed = sim_store.derive_seed(request.seed, reused)
+
+        # advanced_tcl があるときだけ deal を使い、出力を読みながら
+        # SOLVE_BATCH_SIZE ごとに解く（生成と DDS が並行する）。
+        # それ以外はプロセス内の NumPy ジェネレータで生成する
+        batches = iter(())
+        if remaining and advanced:
+            batches = (
+                dds.pbn_to_holdings(pbn_deals)
+                for pbn_deals in deal_runner.stream_batches(
+                    tcl_text,
+                    remaining,
+                    SOLVE_BATCH_SIZE,
+                    seed=seed,
+                    pool=deal_worker_pool,
+                )
+            )
+        elif remaining:
+            if layouts is not None:
+                generator = deal_sampler.DealEnumerator(layouts, start=reused)
+            elif strata is not None:
+                generator = stratified.StratifiedSampler(known, constraints, remaining, seed=seed, strata=strata)
+            else:
+                # 条件に合う確率が低いときは棄却なしの厳密サンプラーを使う
+                generator = deal_sampler.make_generator(
+                    known=known,
+                    constraints=constraints,
+                    count=remaining,
+                    seed=seed,
+                )
+            batches = (
+                bitboard.to_holdings(masks)
+                for masks in generator.batches(remaining, SOLVE_BATCH_SIZE)
+            )
 
-            return {
-                "trick_distribution": response_dist,
-                "simulations_run": valid_simulations,
+        vulnerable = VULNERABILITY_NAMES[request.vulnerability] if request.par else None
+        dealer_side = 0 if request.dealer in ("North", "South") else 1
+        par_counts = {}
+        valid_simulations = 0
+        new_owners, new_tables = [], []
+
+        def solve(holdings, strains):
+            if request.par:
+                # par は CalcAllTables の allParResults でまとめて計算する
+                return dd_cache.cached_calc_all_tables(
+                    dd_table_cache, holdings, None, solve_tables, vulnerable=vulnerable
+                )
+            tables = dd_cache.cached_calc_all_tables(
+                dd_table_cache,
+                holdings,
+                dds.make_trump_filter(strains),
+                solve_tables,
+            )
+            return tables, None
+
+        def solve_batch(holdings):
+            tables, par = solve(holdings, needed_strains)
+            stored_tables = tables.astype(np.int8)
+            stored_tables[:, [s not in needed_strains for s in range(dds.DDS_STRAINS)]] = dd_cache.UNSOLVED
+            new_owners.append(bitboard.pack_owners(bitboard.to_owners(bitboard.from_holdings(holdings))))
+            new_tables.append(stored_tables)
+            return tables, par
+
+        def reused_batch():
+            owners, tables = stored
+            stale = sim_store.missing_strains(tables[:reused], needed_strains)
+            if stale.any():
+                # 前回解かなかったストレインだけ解き直す
+                rows = np.flatnonzero(stale)
+                holdings = bitboard.to_holdings(bitboard.from_owners(bitboard.unpack_owners(owners[rows])))
+                fresh, _ = solve(holdings, needed_strains)
+                tables[rows[:, None], needed_strains] = fresh[:, needed_strains]
+                simulation_store.put(store_key, owners, tables)
+            tables = tables[:reused].astype(np.intc)
+            return tables, dds.par_from_tables(tables, vulnerable) if request.par else None
+
+        if library_rows is not None:
+            solved = (
+                (tables, dds.par_from_tables(tables, vulnerable) if request.par else None)
+                for tables in (
+                    deal_library_store.tables(library_rows[start : start + SOLVE_BATCH_SIZE])
+                    for start in range(0, len(library_rows), SOLVE_BATCH_SIZE)
+                )
+            )
+        else:
+
+            def stored_then_new():
+                if reused:
+                    yield reused_batch()
+                for holdings in batches:
+                    yield solve_batch(holdings)
+
+            solved = stored_then_new()
+        try:
+            for tables, par in solved:
+                if par is not None:
+                    for score in par[:, dealer_side].tolist():
+                        par_counts[score] = par_counts.get(score, 0) + 1
+                valid_simulations += len(tables)
+                for suit_idx in trick_distribution:
+                    for hand_name, hand in (
+                        ("North", dds.HAND_NORTH),
+                        ("South", dds.HAND_SOUTH),
+                    ):
+                        trick_distribution[suit_idx][hand_name] += np.bincount(
+                            tables[:, suit_idx, hand], minlength=14
+                        )
+                if rule is not None and rule.update(tables) and layouts is None:
+                    break
+        except (
+            deal_runner.DealError,
+            deal_generator.GenerationError,
+            FileNotFoundError,
+            subprocess.TimeoutExpired,
+        ) as e:
+            return deal_error(e)
+        print(valid_simulations)
+        # 目標に届いて途中で止めたときは、生成中の deal も止める
+        for stream in (solved, batches):
+            if hasattr(stream, "close"):
+                stream.close()
+        # 同じシードの並行リクエストが先に保存していたら、重複するので保存しない
+        if new_owners and not simulation_store.append(
+            store_key, np.concatenate(new_owners), np.concatenate(new_tables), reused
+        ):
+            logger.info("Simulation store: %s changed during the run; new deals not stored", store_key)
+        if generator is not None:
+            logger.info("Deal generation: %s", generator.report.as_dict())
+        if valid_simulations == 0:
+            return {"error": "No deals were generated."}
+
+        suit_map_rev = {
+            dds.SUIT_SPADE: "Spades",
+            dds.SUIT_HEART: "Hearts",
+            dds.SUIT_DIAMOND: "Diamonds",
+            dds.SUIT_CLUB: "Clubs",
+            dds.SUIT_NT: "No-Trump",
+        }
+
+        response_dist = {}
+        for suit_idx, hands in trick_distribution.items():
+            suit_name = suit_map_rev[suit_idx]
+            response_dist[suit_name] = {
+                "North": [
+                    (count / valid_simulations) * 100
+                    for count in hands["North"].tolist()
+                ],
+                "South": [
+                    (count / valid_simulations) * 100
+                    for count in hands["South"].tolist()
+                ],
             }
 
+        response = {
+            "trick_distribution": response_dist,
+            "simulations_run": valid_simulations,
+            "generation": (
+                generator.report.as_dict() if generator is not None else {"generator": "deal"}
+            ),
+        }
+        if library_rows is not None:
+            response["generation"] = {"generator": "library", "library_size": len(deal_library_store)}
+        elif not remaining:
+            response["generation"] = {"generator": "store"}
+        if library_rows is None:
+            response["generation"]["reused"] = reused
+        if layouts is not None:
+            response["generation"]["layouts"] = layouts.count
+            response["exact"] = True
+        if strata is not None:
+            response["generation"]["strata"] = len(strata)
+            if isinstance(generator, stratified.StratifiedSampler):
+                response["generation"]["drawn_exactly"] = generator.drawn_exactly
+        if request.par:
+            response["par_distribution"] = [
+                {"score": score, "percentage": (count / valid_simulations) * 100}
+                for score, count in sorted(par_counts.items())
+            ]
+        if rule is not None:
+            response["precision"] = {
+                "contract": request.target.contract,
+                "declarer": request.target.declarer,
+                **rule.report(),
+            }
+        return response
+
     except Exception as e:
         return {
             "error": f"An error occurred during single dummy analysis: {str(e)}"
         }
 
 
+@app.post("/api/compare_single_dummy")
+def compare_single_dummy(request: PairedComparisonRequest):
+    # 全ての候補を同じ相手のレイアウトで解き、ディールごとの差で比べる（共通乱数）
+    try:
+        pbn_parts = request.pbn[2:].split()
+        try:
+            contracts = [stopping.parse_contract(v.contract) for v in request.variants]
+        except ValueError as e:
+            return {"error": str(e)}
+
+        # 同じ南北のハンドの候補は 1 回だけ解く
+        hand_sets, groups = [], []
+        for variant in request.variants:
+            hands = (
+                deal_generator.hand_mask(variant.north or pbn_parts[0]),
+                deal_generator.hand_mask(variant.south or pbn_parts[2]),
+            )
+            if hands not in hand_sets:
+                hand_sets.append(hands)
+            groups.append(hand_sets.index(hands))
+        group_strains = [
+            sorted({strain for group, (_, strain) in zip(groups, contracts) if group == index})
+            for index in range(len(hand_sets))
+        ]
+
+        constraints = seat_constraints(request, request.shapes)
+        try:
+            generator = paired.PairedDealGenerator(
+                [{dds.HAND_NORTH: north, dds.HAND_SOUTH: south} for north, south in hand_sets],
+                constraints,
+                seed=request.seed,
+            )
+        except ValueError as e:
+            return {"error": str(e)}
+
+        vulnerable = request.vulnerability in ("NS", "Both")
+        tricks = [[] for _ in request.variants]
+        try:
+            for masks in generator.batches(request.simulations, SOLVE_BATCH_SIZE):
+                tables = [
+                    dd_cache.cached_calc_all_tables(
+                        dd_table_cache,
+                        bitboard.to_holdings(masks[index]),
+                        dds.make_trump_filter(strains),
+                        solve_tables,
+                    )
+                    for index, strains in enumerate(group_strains)
+                ]
+                for variant_tricks, variant, group, (_, strain) in zip(tricks, request.variants, groups, contracts):
+                    hand = dds.HAND_NORTH if variant.declarer == "North" else dds.HAND_SOUTH
+                    variant_tricks.append(tables[group][:, strain, hand])
+        except deal_generator.GenerationError as e:
+            return deal_error(e)
+        logger.info("Paired deal generation: %s", generator.report.as_dict())
+
+        tricks = [np.concatenate(t) for t in tricks]
+        deals = len(tricks[0])
+        makes = [t >= level + 6 for t, (level, _) in zip(tricks, contracts)]
+        scores = [
+            paired.contract_score(level, strain, t, vulnerable) for t, (level, strain) in zip(tricks, contracts)
+        ]
+
+        names = [variant.name or f"{variant.contract} {variant.declarer}" for variant in request.variants]
+        # 同じ名前が複数あると comparisons で区別できないので、番号を付ける
+        names = [f"{name} #{index + 1}" if names.count(name) > 1 else name for index, name in enumerate(names)]
+        variants = [
+            {
+                "name": name,
+                "contract": variant.contract,
+                "declarer": variant.declarer,
+                **stopping.make_interval(int(make.sum()), deals),
+                "mean_tricks": float(t.mean()),
+                "mean_score": float(score.mean()),
+            }
+            for variant, name, t, make, score in zip(request.variants, names, tricks, makes, scores)
+        ]
+        comparisons = [
+            {
+                "variant": variants[index]["name"],
+                "baseline": variants[0]["name"],
+                **paired.compare(makes[index], scores[index], makes[0], scores[0]),
+            }
+            for index in range(1, len(variants))
+        ]
+        return {
+            "variants": variants,
+            "comparisons": comparisons,
+            "simulations_run": deals,
+            "generation": {
+                **generator.report.as_dict(),
+                "hand_sets": len(hand_sets),
+                "acceptance": generator.acceptance,
+            },
+        }
+
+    except Exception as e:
+        return {
+            "error": f"An error occurred during paired single dummy analysis: {str(e)}"
+        }
+
+
 @app.post("/api/solve_lead")
 def solve_opening_lead(request: LeadSolverRequest):
     aggregated_results, valid_simulations = {}, 0
@@ -716,53 +1106,61 @@ accept
 {"}"}
 """
 
-    # 2. Call the 'deal' command using the script file
-    timestamp = time.time()
-    pbn_filename = f"deals{timestamp}.pbn"
-
-    try:
-        generated_pbns = runDeal(script_content, request.simulations)
-
-        with open(pbn_filename, "w") as f:
-            f.write(generated_pbns)
-
-    except FileNotFoundError:
-        return {
-            "error": "The 'deal' command is not found. Please ensure it is installed and in the system's PATH."
-        }
-    except subprocess.TimeoutExpired:
-        return {
-            "error": "Hand generation timed out. The constraints might be too complex or impossible to satisfy."
-        }
-    except Exception as e:
-        return {"error": f"An error occurred during hand generation: {str(e)}"}
-
-    # 3. Process each generated PBN with 'leadsolver'
-    with open(pbn_filename) as f:
-        data = f.read()
-        print("--------")
-        print(data)
-        print("--------")
-
+    # 2. deal の出力をそのまま leadsolver の標準入力に流す
+    #    (leadsolver はバッチごとに解くので、生成と解析が並行する)
     final_leads = []
+    generator = None
     try:
         print(f"{request.leader} {request.contract}")
+        # -p: deal 以外の行 (advanced_tcl の puts など) は読み飛ばす
         command = [
             "leadsolver",
+            "-p",
             "-l",
             request.leader,
             request.contract.replace("NT", "N").replace("nt", "n"),
-            pbn_filename,
+            "/dev/stdin",
         ]
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-        stdout, stderr = process.communicate(timeout=2000)
-        os.remove(pbn_filename)
+        try:
+            if (request.advanced_tcl or "").strip():
+                process = deal_runner.pipe_deals(
+                    script_content,
+                    request.simulations,
+                    command,
+                    timeout=2000,
+                    seed=request.seed,
+                    pool=deal_worker_pool,
+                )
+            else:
+                # 標準の制約だけなら NumPy で生成して leadsolver に渡す
+                generator = deal_sampler.make_generator(
+                    known={
+                        deal_generator.SEAT_NAMES[map[request.leader]]: deal_generator.hand_mask(
+                            request.leader_hand_pbn
+                        )
+                    },
+                    constraints=seat_constraints(request, other_players),
+                    count=request.simulations,
+                    seed=request.seed,
+                )
+                deals = deal_generator.format_pbn(generator.generate(request.simulations))
+                logger.info("Deal generation: %s", generator.report.as_dict())
+                process = subprocess.run(
+                    command, input=deals, capture_output=True, text=True, timeout=2000
+                )
+        except (
+            deal_runner.DealError,
+            deal_generator.GenerationError,
+            subprocess.TimeoutExpired,
+        ) as e:
+            return deal_error(e)
+        except FileNotFoundError:
+            return {
+                "error": "The 'deal' or 'leadsolver' command is not found. Please ensure they are installed and in the system's PATH."
+            }
+        stdout, stderr = process.stdout, process.stderr
 
+        # 3. leadsolver の結果を解析する
         if process.returncode == 0:
             print(stdout)
             # テキストテーブルの解析
@@ -818,4 +1216,10 @@ accept
 
     final_leads.sort(key=lambda x: x["tricks"])
     print(final_leads)
-    return {"leads": final_leads, "simulations_run": len(generated_pbns)}
+    return {
+        "leads": final_leads,
+        "simulations_run": request.simulations,
+        "generation": (
+            generator.report.as_dict() if generator is not None else {"generator": "deal"}
+        ),
+    }
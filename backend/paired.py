@@ -0,0 +1,203 @@
+"""Paired single-dummy comparisons on common random numbers.
+
+Variants (another North or South hand, another contract or declarer)
+are solved on the same opponent layouts, and each deal gives one
+difference per variant against the first (the baseline). Luck in the
+layout then cancels out of the differences, so their standard error is
+far smaller than that of two independent runs and the same decision
+needs a fraction of the deals; simulation_ratio in each comparison is
+that fraction's inverse, estimated from the run itself.
+
+Variants with other known cards must leave the same number of unknown
+cards in each hand. Every variant deals the same shuffled positions
+into the baseline's order of the unknown cards, with each card only
+the variant deals in the slot of a card it holds instead; a swapped
+card therefore lands where the card it replaces would have gone and
+the rest of the layout is the same. A layout is kept only when every
+variant accepts it; when the constraints depend on the swapped cards
+this conditions each variant a little, and acceptance reports how
+often each one alone accepted.
+
+Scores are undoubled duplicate scores; imps() converts differences with
+the standard IMP table.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Iterator, Mapping, Sequence
+
+import numpy as np
+
+try:
+    from . import dds
+    from .deal_generator import (
+        DEFAULT_BATCH_SIZE,
+        DEFAULT_MAX_CANDIDATES,
+        ConstrainedDealGenerator,
+        GenerationReport,
+        SeatConstraint,
+        accepted_batches,
+    )
+    from .stopping import Z_95
+except ImportError:
+    import dds
+    from deal_generator import (
+        DEFAULT_BATCH_SIZE,
+        DEFAULT_MAX_CANDIDATES,
+        ConstrainedDealGenerator,
+        GenerationReport,
+        SeatConstraint,
+        accepted_batches,
+    )
+    from stopping import Z_95
+
+
+__all__ = [
+    "PairedDealGenerator",
+    "compare",
+    "contract_score",
+    "imps",
+    "paired_difference",
+]
+
+# Upper bounds of the score differences worth 0, 1, 2, ... IMPs.
+IMP_TABLE = np.array(
+    [10, 40, 80, 120, 160, 210, 260, 310, 360, 420, 490, 590, 740, 890,
+     1090, 1290, 1490, 1740, 1990, 2240, 2490, 2990, 3490, 3990]
+)
+
+
+def contract_score(level: int, strain: int, tricks, vulnerable: bool) -> np.ndarray:
+    """Undoubled score of level-strain for each declarer trick count."""
+
+    tricks = np.asarray(tricks, dtype=np.int64)
+    per_trick = 20 if strain in (dds.SUIT_DIAMOND, dds.SUIT_CLUB) else 30
+    contract_points = per_trick * level + (10 if strain == dds.SUIT_NT else 0)
+    bonus = (500 if vulnerable else 300) if contract_points >= 100 else 50
+    if level == 6:
+        bonus += 750 if vulnerable else 500
+    elif level == 7:
+        bonus += 1500 if vulnerable else 1000
+    overtricks = tricks - level - 6
+    made = contract_points + bonus + per_trick * np.maximum(overtricks, 0)
+    down = -(100 if vulnerable else 50) * np.maximum(-overtricks, 0)
+    return np.where(overtricks >= 0, made, down)
+
+
+def imps(difference) -> np.ndarray:
+    """IMPs of score differences, with their sign."""
+
+    difference = np.asarray(difference)
+    return np.sign(difference) * np.searchsorted(IMP_TABLE, np.abs(difference), side="left")
+
+
+def paired_difference(values, baseline, z: float = Z_95) -> dict[str, float]:
+    """Mean of values - baseline per deal, its standard error and interval.
+
+    independent_standard_error is what two independent runs of as many
+    deals would give; simulation_ratio is the squared ratio of the two,
+    i.e. how many times more deals those runs would need.
+    """
+
+    values = np.asarray(values, dtype=float)
+    baseline = np.asarray(baseline, dtype=float)
+    deals = len(values)
+    differences = values - baseline
+    mean = float(differences.mean()) if deals else 0.0
+    standard_error = float(differences.std(ddof=1) / math.sqrt(deals)) if deals > 1 else 0.0
+    independent = (
+        math.sqrt((values.var(ddof=1) + baseline.var(ddof=1)) / deals) if deals > 1 else 0.0
+    )
+    return {
+        "mean_difference": mean,
+        "standard_error": standard_error,
+        "interval": [mean - z * standard_error, mean + z * standard_error],
+        "independent_standard_error": independent,
+        "simulation_ratio": (independent / standard_error) ** 2 if standard_error else None,
+    }
+
+
+def compare(makes, scores, baseline_makes, baseline_scores, z: float = Z_95) -> dict:
+    """Paired make, score and IMP differences of one variant against the baseline."""
+
+    gained = imps(np.asarray(scores) - np.asarray(baseline_scores))
+    imp_summary = paired_difference(gained, np.zeros(len(gained)), z)
+    values, counts = np.unique(gained, return_counts=True)
+    return {
+        "make": paired_difference(makes, baseline_makes, z),
+        "score": paired_difference(scores, baseline_scores, z),
+        "imps": {key: imp_summary[key] for key in ("mean_difference", "standard_error", "interval")},
+        "imp_distribution": [
+            {"imps": int(value), "percentage": count / len(gained) * 100}
+            for value, count in zip(values.tolist(), counts.tolist())
+        ],
+    }
+
+
+class PairedDealGenerator:
+    """Layouts shared by several sets of known cards under one set of constraints.
+
+    batches() yields (variants, n, 4) masks: row i of every variant is the
+    same layout of the unknown cards. Raises ValueError when the variants
+    leave different numbers of unknown cards in some hand.
+    """
+
+    def __init__(
+        self,
+        variants: Sequence[Mapping[int, int]],
+        constraints: Mapping[int, SeatConstraint] | None = None,
+        seed: int | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_candidates: int = DEFAULT_MAX_CANDIDATES,
+    ) -> None:
+        self.generators = [ConstrainedDealGenerator(known, constraints) for known in variants]
+        if not self.generators:
+            raise ValueError("At least one variant is needed.")
+        vacancies = self.generators[0].vacancies
+        if any(generator.vacancies != vacancies for generator in self.generators[1:]):
+            raise ValueError("Every variant must leave the same number of unknown cards in each hand.")
+        base = self.generators[0].unknown_cards
+        self.unknown = len(base)
+        self._cards = [_aligned(base, generator.unknown_cards) for generator in self.generators]
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+        self.variant_accepted = np.zeros(len(self.generators), dtype=np.int64)
+
+        sequence = np.random.SeedSequence(seed)
+        self.report = GenerationReport(seed=sequence.entropy, generator="paired")
+        self._rng = np.random.default_rng(sequence)
+
+    @property
+    def acceptance(self) -> list[float]:
+        """Share of the candidates each variant accepted on its own."""
+
+        return (self.variant_accepted / max(self.report.candidates, 1)).tolist()
+
+    def batches(self, count: int, batch_size: int) -> Iterator[np.ndarray]:
+        """Yield count shared layouts as (variants, <= batch_size, 4) mask arrays."""
+
+        def draw(size: int) -> tuple[np.ndarray, np.ndarray]:
+            positions = self._rng.permuted(np.broadcast_to(np.arange(self.unknown), (size, self.unknown)), axis=1)
+            masks = np.stack(
+                [generator.deal(positions, cards) for generator, cards in zip(self.generators, self._cards)],
+                axis=1,
+            )
+            accepted = np.stack(
+                [generator.accepts(masks[:, index]) for index, generator in enumerate(self.generators)], axis=1
+            )
+            self.variant_accepted += accepted.sum(axis=0)
+            return masks, accepted.all(axis=1)
+
+        for layouts in accepted_batches(
+            draw, count, batch_size, self.report, self.batch_size, self.max_candidates
+        ):
+            yield layouts.swapaxes(0, 1)
+
+
+def _aligned(base: np.ndarray, cards: np.ndarray) -> np.ndarray:
+    # cards in base's order: shared cards keep their slots, and the cards
+    # base lacks fill the slots of the cards this variant lacks.
+    own = set(cards.tolist())
+    added = iter(sorted(own - set(base.tolist())))
+    return np.array([card if card in own else next(added) for card in base.tolist()], dtype=np.uint64)
@@ -0,0 +1,235 @@
+"""Deals and DD tables of earlier single-dummy runs, per constraint set.
+
+An entry is keyed by simulation_key(): a hash of the known North/South
+cards, the normalised seat constraints, the advanced Tcl and the seed,
+so requests that ask for the same distribution share it. It holds the
+deals in bitboard.pack_owners() form (13 bytes) and their DD tables as
+20 signed bytes, with dd_cache.UNSOLVED for strains never solved.
+
+A rerun with more simulations reuses the stored deals and only generates
+and solves the rest; an exact repeat is answered from the store alone.
+Like dd_cache.DDTableCache, the store has an in-memory LRU tier, bounded
+by the total number of deals, and an optional sqlite tier.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Mapping
+
+import numpy as np
+
+try:
+    from . import dds
+    from .dd_cache import UNSOLVED
+    from .deal_generator import SeatConstraint
+except ImportError:
+    import dds
+    from dd_cache import UNSOLVED
+    from deal_generator import SeatConstraint
+
+
+__all__ = [
+    "SimulationStore",
+    "derive_seed",
+    "missing_strains",
+    "simulation_key",
+]
+
+TABLE_SHAPE = (dds.DDS_STRAINS, dds.DDS_HANDS)
+OWNERS_BYTES = 13
+
+
+def simulation_key(
+    known: Mapping[int, int],
+    constraints: Mapping[int, SeatConstraint],
+    script: str = "",
+    seed: int | None = None,
+    sampling: str = "random",
+) -> str:
+    """Hash of everything that decides which deals a request draws.
+
+    Constraints that accept every hand are dropped, so "0-13" ranges and
+    missing seats give the same key. Plain random sampling keeps the keys
+    it had before sampling was part of them.
+    """
+
+    normal = {
+        "known": {str(hand): int(mask) for hand, mask in sorted(known.items()) if mask},
+        "constraints": {
+            str(hand): [list(map(list, c.suit_lengths)), list(c.hcp), c.preset]
+            for hand, c in sorted(constraints.items())
+            if c != SeatConstraint()
+        },
+        "script": (script or "").strip(),
+        "seed": seed,
+    }
+    if sampling != "random":
+        normal["sampling"] = sampling
+    return hashlib.sha256(json.dumps(normal, sort_keys=True).encode()).hexdigest()
+
+
+def derive_seed(seed: int | None, offset: int) -> int | None:
+    """Seed for the deals after the first offset of a seeded run.
+
+    offset 0 keeps the seed, so a run without stored deals draws what it
+    always did; later top-ups draw independent deals reproducibly.
+    """
+
+    if seed is None or offset == 0:
+        return seed
+    state = np.random.SeedSequence([seed, offset]).generate_state(1)[0]
+    return int(state) & 0x7FFFFFFF
+
+
+class SimulationStore:
+    """LRU tier in front of an optional sqlite tier of stored runs."""
+
+    def __init__(self, max_deals: int = 200_000, path: str | None = None) -> None:
+        self.max_deals = max_deals
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._deals = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS simulations "
+                "(key TEXT PRIMARY KEY, owners BLOB NOT NULL, tricks BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> SimulationStore:
+        """Store sized by SIM_STORE_DEALS with the sqlite tier at SIM_STORE_PATH."""
+
+        return cls(
+            max_deals=int(os.environ.get("SIM_STORE_DEALS", "200000")),
+            path=os.environ.get("SIM_STORE_PATH") or None,
+        )
+
+    def get(self, key: str) -> tuple[np.ndarray, np.ndarray] | None:
+        """(owners (n, 13) uint8, tables (n, 5, 4) int8) stored for key."""
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0].copy(), entry[1].copy()
+
+    def put(self, key: str, owners, tables) -> None:
+        """Store (replace) the deals and tables of key."""
+
+        entry = _entry(owners, tables)
+        with self._lock:
+            self._store(key, entry)
+
+    def append(self, key: str, owners, tables, expected: int) -> bool:
+        """Add deals after the expected number already stored for key.
+
+        Writes nothing and returns False when key no longer holds
+        expected deals (0 for no entry): a concurrent top-up drew the
+        same derived seed and stored its deals first. With the sqlite
+        tier the check reads the stored row inside the write
+        transaction, so it holds across workers too.
+        """
+
+        entry = _entry(owners, tables)
+        with self._lock:
+            try:
+                if self._db is not None:
+                    self._db.execute("BEGIN IMMEDIATE")
+                    stored = self._read(key)
+                else:
+                    stored = self._lookup(key)
+                if (len(stored[0]) if stored is not None else 0) != expected:
+                    return False
+                if stored is not None:
+                    entry = (np.concatenate([stored[0], entry[0]]), np.concatenate([stored[1], entry[1]]))
+                self._store(key, entry)
+                return True
+            finally:
+                if self._db is not None and self._db.in_transaction:
+                    self._db.rollback()
+
+    def stats(self) -> dict[str, int | bool]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "deals": self._deals,
+                "max_deals": self.max_deals,
+                "persistent": self._db is not None,
+            }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _lookup(self, key: str) -> tuple[np.ndarray, np.ndarray] | None:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        elif self._db is not None:
+            entry = self._read(key)
+            if entry is not None:
+                self._remember(key, entry)
+        return entry
+
+    def _read(self, key: str) -> tuple[np.ndarray, np.ndarray] | None:
+        row = self._db.execute("SELECT owners, tricks FROM simulations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return (
+            np.frombuffer(row[0], dtype=np.uint8).reshape(-1, OWNERS_BYTES).copy(),
+            np.frombuffer(row[1], dtype=np.int8).reshape(-1, *TABLE_SHAPE).copy(),
+        )
+
+    def _store(self, key: str, entry: tuple[np.ndarray, np.ndarray]) -> None:
+        # Called with the lock held.
+        self._remember(key, entry)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO simulations (key, owners, tricks) VALUES (?, ?, ?)",
+                (key, entry[0].tobytes(), entry[1].tobytes()),
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, entry: tuple[np.ndarray, np.ndarray]) -> None:
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._deals -= len(previous[0])
+        self._memory[key] = entry
+        self._deals += len(entry[0])
+        while self._deals > self.max_deals and len(self._memory) > 1:
+            _, (owners, _) = self._memory.popitem(last=False)
+            self._deals -= len(owners)
+
+
+def _entry(owners, tables) -> tuple[np.ndarray, np.ndarray]:
+    entry = (
+        np.ascontiguousarray(owners, dtype=np.uint8).reshape(-1, OWNERS_BYTES),
+        np.ascontiguousarray(tables, dtype=np.int8).reshape(-1, *TABLE_SHAPE),
+    )
+    if len(entry[0]) != len(entry[1]):
+        raise ValueError("owners and tables have different numbers of deals")
+    return entry
+
+
+def missing_strains(tables: np.ndarray, strains) -> np.ndarray:
+    """Which stored deals lack one of the given strains."""
+
+    return (np.asarray(tables)[:, list(strains)] == UNSOLVED).any(axis=(1, 2))
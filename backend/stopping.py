@@ -0,0 +1,149 @@
+"""Sequential stopping for single-dummy simulations.
+
+A run with a precision target solves deals batch by batch and stops once
+the standard error of the make probability of one contract is at most
+the target. The estimate uses the Agresti-Coull adjustment (about two
+makes and two failures added), so a run where every deal makes, or none
+does, does not stop after a handful of deals with a standard error of 0.
+Checking after every batch makes the stopping time depend on the data,
+which biases the estimate slightly; MIN_DEALS keeps the first look from
+coming too early.
+
+Stratified deals (stratified.py) come in batches ordered by shape, and
+the squared differences of neighbours estimate how much less a batch
+mean varies than a binomial one. That design effect scales the standard
+error, so stratified runs stop sooner at the same target. When every
+admissible deal was solved once (exact), the make probability has no
+sampling error at all.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    from . import dds
+except ImportError:
+    import dds
+
+
+__all__ = [
+    "MIN_DEALS",
+    "PrecisionRule",
+    "make_interval",
+    "parse_contract",
+]
+
+MIN_DEALS = 100
+# Two-sided 95% normal quantile.
+Z_95 = 1.959964
+STRAIN_LETTERS = {
+    "S": dds.SUIT_SPADE,
+    "H": dds.SUIT_HEART,
+    "D": dds.SUIT_DIAMOND,
+    "C": dds.SUIT_CLUB,
+    "N": dds.SUIT_NT,
+    "NT": dds.SUIT_NT,
+}
+_CONTRACT_RE = re.compile(r"^\s*([1-7])\s*(NT|[SHDCN])\s*$", re.IGNORECASE)
+
+
+def parse_contract(text: str) -> tuple[int, int]:
+    """(level, DDS strain) of "4S", "3NT", "6c", ..."""
+
+    match = _CONTRACT_RE.match(text or "")
+    if match is None:
+        raise ValueError(f"invalid contract: {text!r}")
+    return int(match.group(1)), STRAIN_LETTERS[match.group(2).upper()]
+
+
+def make_interval(makes: int, deals: int, z: float = Z_95, design_effect: float = 1.0) -> dict[str, float]:
+    """Make probability, its standard error and a confidence interval.
+
+    design_effect is the variance of the sampling design relative to
+    independent deals.
+    """
+
+    adjusted = deals + z * z
+    centre = (makes + z * z / 2) / adjusted
+    standard_error = math.sqrt(centre * (1 - centre) / adjusted * design_effect)
+    return {
+        "make_probability": makes / deals if deals else 0.0,
+        "standard_error": standard_error,
+        "interval": [max(0.0, centre - z * standard_error), min(1.0, centre + z * standard_error)],
+    }
+
+
+@dataclass(slots=True)
+class PrecisionRule:
+    """Counts makes of a contract and says when to stop."""
+
+    level: int
+    strain: int
+    declarer: int
+    target: float
+    min_deals: int = MIN_DEALS
+    stratified: bool = False
+    exact: bool = False
+    makes: int = 0
+    deals: int = 0
+    # Systematic-sample variance terms of stratified batches, and their deals.
+    spread: float = 0.0
+    spread_deals: int = 0
+
+    @classmethod
+    def parse(cls, contract: str, declarer: int, target: float, min_deals: int = MIN_DEALS) -> PrecisionRule:
+        level, strain = parse_contract(contract)
+        return cls(level, strain, declarer, target, min_deals)
+
+    def update(self, tables: np.ndarray) -> bool:
+        """Add (n, 5, 4) DD tables; True once the target is met.
+
+        With stratified, tables is one batch in the order it was drawn.
+        """
+
+        made = np.asarray(tables)[:, self.strain, self.declarer] >= self.level + 6
+        self.makes += int(made.sum())
+        self.deals += len(made)
+        if self.stratified and len(made) > 1:
+            differences = int(np.count_nonzero(made[1:] != made[:-1]))
+            self.spread += len(made) * differences / (2 * (len(made) - 1))
+            self.spread_deals += len(made)
+        return self.met
+
+    @property
+    def design_effect(self) -> float:
+        """Estimated variance relative to independent deals (1 unless stratified)."""
+
+        probability = self.makes / self.deals if self.deals else 0.0
+        if not self.spread_deals or probability in (0.0, 1.0):
+            return 1.0
+        return self.spread / (self.spread_deals * probability * (1 - probability))
+
+    @property
+    def met(self) -> bool:
+        if self.exact:
+            return True
+        interval = make_interval(self.makes, self.deals, design_effect=self.design_effect)
+        return self.deals >= self.min_deals and interval["standard_error"] <= self.target
+
+    def report(self) -> dict:
+        interval = make_interval(self.makes, self.deals, design_effect=self.design_effect)
+        if self.exact:
+            probability = interval["make_probability"]
+            interval = {"make_probability": probability, "standard_error": 0.0, "interval": [probability, probability]}
+        report = {
+            **interval,
+            "deals": self.deals,
+            "target_standard_error": self.target,
+            "met": self.met,
+        }
+        if self.stratified:
+            report["design_effect"] = self.design_effect
+        if self.exact:
+            report["exact"] = True
+        return report
@@ -0,0 +1,193 @@
+"""Deals stratified by the shape of one unknown seat.
+
+Most of the spread of single-dummy results comes from how the missing
+cards split, so the deals are spread over the suit-length patterns
+(S, H, D, C) of one unknown seat in proportion to their exact
+probabilities under the constraints. The probabilities come from the
+exact DP of deal_sampler.ExactDealSampler (pattern_counts()); with North
+and South known, East's pattern also fixes West's.
+
+Each batch is a systematic sample: batch_size equally spaced points
+with one random offset over the cumulative pattern probabilities give
+every pattern floor or ceil of batch_size * probability deals, exactly
+that many on average. Every deal therefore keeps the weight 1 / n and
+plain averages stay unbiased, while the pattern mix no longer varies
+from run to run. The deals of a pattern are taken from the constrained
+deals of deal_sampler.make_generator(), so they are uniform within it.
+Patterns too rare to turn up within MAX_DRAWS candidates per deal are
+drawn by an ExactDealSampler with the seat's shape fixed to the
+pattern, which is uniform within the pattern too; drawn_exactly counts
+those deals.
+
+Deals in a batch are ordered by pattern, so squared differences of
+neighbours estimate the variance of a batch mean (the usual estimator
+for systematic samples); stopping.PrecisionRule uses it when stratified.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+import time
+from typing import Iterator, Mapping
+
+import numpy as np
+
+try:
+    from . import bitboard, dds
+    from .deal_generator import HAND_SIZE, GenerationError, GenerationReport, SeatConstraint
+    from .deal_sampler import ExactDealSampler, make_generator
+except ImportError:
+    import bitboard
+    import dds
+    from deal_generator import HAND_SIZE, GenerationError, GenerationReport, SeatConstraint
+    from deal_sampler import ExactDealSampler, make_generator
+
+
+__all__ = [
+    "ShapeStrata",
+    "StratifiedSampler",
+    "allocate",
+    "stratified_seat",
+]
+
+# Candidates drawn per deal of a batch before rare patterns are given up.
+MAX_DRAWS = 50
+# Seats tried first when choosing the seat to stratify on.
+_SEAT_ORDER = (dds.HAND_EAST, dds.HAND_WEST, dds.HAND_SOUTH, dds.HAND_NORTH)
+# Pattern (S, H, D, C) -> index into a flat lookup table.
+_CODE_BASE = HAND_SIZE + 1
+_CODE_WEIGHTS = _CODE_BASE ** np.arange(dds.DDS_SUITS - 1, -1, -1)
+
+
+def stratified_seat(known: Mapping[int, int] | None) -> int:
+    """The seat with the most unknown cards, East first on ties."""
+
+    known = known or {}
+    return max(_SEAT_ORDER, key=lambda hand: HAND_SIZE - bin(int(known.get(hand, 0))).count("1"))
+
+
+def allocate(probabilities, count: int, rng: np.random.Generator) -> np.ndarray:
+    """Deals per stratum of a systematic sample of count deals."""
+
+    cumulative = np.cumsum(probabilities)
+    points = (rng.random() + np.arange(count)) / count * cumulative[-1]
+    strata = np.minimum(np.searchsorted(cumulative, points, side="right"), len(cumulative) - 1)
+    return np.bincount(strata, minlength=len(cumulative))
+
+
+@dataclass(slots=True)
+class ShapeStrata:
+    """Suit-length patterns of one seat and their exact probabilities.
+
+    patterns is (k, 4), sorted; probabilities sums to 1. Raises
+    deal_sampler.StateLimitExceeded when the DP is too large and
+    GenerationError when no deal satisfies the constraints.
+    """
+
+    seat: int
+    patterns: np.ndarray
+    probabilities: np.ndarray
+
+    @classmethod
+    def build(
+        cls,
+        known: Mapping[int, int] | None,
+        constraints: Mapping[int, SeatConstraint] | None,
+        seat: int | None = None,
+    ) -> ShapeStrata:
+        seat = stratified_seat(known) if seat is None else seat
+        counts = ExactDealSampler(known, constraints, separate=(seat,)).pattern_counts(seat)
+        if not counts:
+            raise GenerationError("No deal satisfies the constraints.")
+        patterns = sorted(counts)
+        total = sum(counts.values())
+        return cls(
+            seat=seat,
+            patterns=np.array(patterns, dtype=np.intp).reshape(-1, dds.DDS_SUITS),
+            probabilities=np.array([counts[pattern] / total for pattern in patterns]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def classify(self, masks) -> np.ndarray:
+        """Stratum of each (n, 4) deal; -1 for patterns with probability 0."""
+
+        lookup = np.full(_CODE_BASE**dds.DDS_SUITS, -1, dtype=np.intp)
+        lookup[self.patterns @ _CODE_WEIGHTS] = np.arange(len(self.patterns))
+        lengths = bitboard.suit_lengths(np.asarray(masks, dtype=np.uint64)[:, self.seat]).astype(np.intp)
+        return lookup[lengths @ _CODE_WEIGHTS]
+
+
+class StratifiedSampler:
+    """Deals spread over the ShapeStrata of one seat.
+
+    Same arguments as deal_sampler.make_generator() plus the strata to use
+    (built from known and constraints when None), and the same batches()
+    and generate() as ConstrainedDealGenerator.
+    """
+
+    def __init__(
+        self,
+        known: Mapping[int, int] | None,
+        constraints: Mapping[int, SeatConstraint] | None,
+        count: int,
+        seed: int | None = None,
+        strata: ShapeStrata | None = None,
+    ) -> None:
+        self.strata = strata if strata is not None else ShapeStrata.build(known, constraints)
+        sequence = np.random.SeedSequence(seed)
+        self.report = GenerationReport(seed=sequence.entropy, generator="stratified")
+        self.drawn_exactly = 0
+        self._rng = np.random.default_rng(sequence.spawn(1)[0])
+        self._source = make_generator(known, constraints, count=count, seed=sequence.entropy)
+        self._known = known
+        self._constraints = dict(constraints or {})
+        self._exact: dict[int, ExactDealSampler] = {}
+
+    def batches(self, count: int, batch_size: int) -> Iterator[np.ndarray]:
+        """Yield count deals as (<= batch_size, 4) mask arrays, each batch stratified."""
+
+        for start in range(0, count, batch_size):
+            started = time.perf_counter()
+            batch = self._batch(min(batch_size, count - start))
+            self.report.seconds += time.perf_counter() - started
+            self.report.accepted += len(batch)
+            yield batch
+
+    def generate(self, count: int) -> np.ndarray:
+        batches = list(self.batches(count, max(count, 1)))
+        return np.concatenate(batches) if batches else np.empty((0, dds.DDS_HANDS), dtype=np.uint64)
+
+    def _batch(self, size: int) -> np.ndarray:
+        quotas = allocate(self.strata.probabilities, size, self._rng)
+        chosen: list[list[np.ndarray]] = [[] for _ in quotas]
+        drawn = 0
+        while quotas.any() and drawn < size * MAX_DRAWS:
+            candidates = self._source.generate(size)
+            drawn += len(candidates)
+            strata = self.strata.classify(candidates)
+            wanted = (strata >= 0) & (quotas[np.maximum(strata, 0)] > 0)
+            for stratum in np.unique(strata[wanted]):
+                rows = np.flatnonzero(strata == stratum)[: quotas[stratum]]
+                chosen[stratum].append(candidates[rows])
+                quotas[stratum] -= len(rows)
+        self.report.candidates += drawn
+        for stratum in np.flatnonzero(quotas):
+            # Patterns too rare to draw: sample them exactly instead.
+            rows = self._exact_sampler(stratum).generate(int(quotas[stratum]))
+            chosen[stratum].append(rows)
+            self.drawn_exactly += len(rows)
+            self.report.candidates += len(rows)
+        return np.concatenate([part for parts in chosen for part in parts])
+
+    def _exact_sampler(self, stratum: int) -> ExactDealSampler:
+        if stratum not in self._exact:
+            seat = self.strata.seat
+            shape = tuple((int(n), int(n)) for n in self.strata.patterns[stratum])
+            constraints = dict(self._constraints)
+            constraints[seat] = replace(constraints.get(seat, SeatConstraint()), suit_lengths=shape)
+            self._exact[stratum] = ExactDealSampler(
+                self._known, constraints, seed=int(self._rng.integers(2**63))
+            )
+        return self._exact[stratum]
@@ -0,0 +1,135 @@
+"""Canonical forms of deals under seat rotation and suit relabelling.
+
+Rotating every hand one seat clockwise or renaming the suits does not
+change the double-dummy result, it only moves it around the table: with
+transform (rotation r, suit permutation p), the deal D maps to T(D) and
+
+    resTable_D[strain][hand] = resTable_T(D)[p(strain)][(hand + r) % 4]
+
+with No-Trump fixed by every p. The canonical representative of a deal
+is the image with the smallest card-owner encoding over all 4 x 24
+transforms, so equivalent deals share one cache entry.
+"""
+
+from __future__ import annotations
+
+from itertools import permutations
+import numpy as np
+
+try:
+    from . import dds
+except ImportError:
+    import dds
+
+
+__all__ = [
+    "IDENTITY",
+    "TRANSFORMS",
+    "canonicalize",
+    "card_owners",
+    "owners_to_holdings",
+    "tables_from_canonical",
+    "tables_to_canonical",
+]
+
+# Rank bits of a DDS holding from the ace (bit 14) down to the two (bit 2).
+RANK_BITS = np.arange(14, 1, -1, dtype=np.uint32)
+
+# (rotation, suit permutation) pairs; suit s of the deal becomes suit
+# permutation[s] of its image. Index 0 is the identity.
+TRANSFORMS = [
+    (rotation, permutation)
+    for rotation in range(dds.DDS_HANDS)
+    for permutation in permutations(range(dds.DDS_SUITS))
+]
+IDENTITY = 0
+
+_ROTATIONS = np.array([rotation for rotation, _ in TRANSFORMS], dtype=np.uint8)
+# STRAIN_MAP[t, s] / HAND_MAP[t, h]: where strain s / hand h goes under t.
+STRAIN_MAP = np.array(
+    [list(permutation) + [dds.SUIT_NT] for _, permutation in TRANSFORMS], dtype=np.intp
+)
+HAND_MAP = (np.arange(dds.DDS_HANDS)[None, :] + _ROTATIONS[:, None]) % dds.DDS_HANDS
+# _SOURCE_SUIT[t, s]: the suit of the deal that becomes suit s of its image.
+_SOURCE_SUIT = np.argsort(STRAIN_MAP[:, : dds.DDS_SUITS], axis=1)
+# Weights that pack 26 two-bit owners into one integer, most significant first.
+_PACK = np.array([1 << (2 * (25 - i)) for i in range(26)], dtype=np.uint64)
+_CHUNK = 512
+
+
+def card_owners(holdings) -> tuple[np.ndarray, np.ndarray]:
+    """Owner seat of every card and whether each deal is complete.
+
+    Returns an (n, 4, 13) uint8 array indexed by DDS suit and rank from
+    the ace down, and an (n,) bool array that is False for deals that do
+    not place each of the 52 cards exactly once.
+    """
+
+    holdings = np.asarray(holdings, dtype=np.uint32)
+    # owned[i, seat, suit, rank] is 1 if seat holds that card.
+    owned = (holdings[..., None] >> RANK_BITS) & 1
+    complete = (owned.sum(axis=1) == 1).all(axis=(1, 2))
+    return owned.argmax(axis=1).astype(np.uint8), complete
+
+
+def owners_to_holdings(owners) -> np.ndarray:
+    """Inverse of card_owners() for complete deals."""
+
+    owners = np.asarray(owners)
+    seats = np.arange(dds.DDS_HANDS, dtype=np.uint8)[None, :, None, None]
+    owned = (owners[:, None] == seats).astype(np.uint32)
+    return (owned << RANK_BITS).sum(axis=-1, dtype=np.uint32)
+
+
+def canonicalize(holdings) -> tuple[np.ndarray, np.ndarray]:
+    """Map (n, 4, 4) holdings to (canonical holdings, transform indices).
+
+    Incomplete deals are returned unchanged with the IDENTITY transform.
+    """
+
+    holdings = np.asarray(holdings, dtype=np.uint32)
+    canonical = holdings.copy()
+    transforms = np.full(len(holdings), IDENTITY, dtype=np.intp)
+    for start in range(0, len(holdings), _CHUNK):
+        owners, complete = card_owners(holdings[start : start + _CHUNK])
+        # images[i, t] is the owner array of deal i under transform t.
+        rotated = (owners[:, None] + _ROTATIONS[None, :, None, None]) % dds.DDS_HANDS
+        images = rotated[:, np.arange(len(TRANSFORMS))[:, None], _SOURCE_SUIT]
+        flat = images.reshape(len(owners), len(TRANSFORMS), 52).astype(np.uint64)
+        high = flat[..., :26] @ _PACK
+        low = flat[..., 26:] @ _PACK
+        ties = high == high.min(axis=1, keepdims=True)
+        best = np.where(ties, low, np.iinfo(np.uint64).max).argmin(axis=1)
+        best[~complete] = IDENTITY
+        indices = np.flatnonzero(complete)
+        canonical[start + indices] = owners_to_holdings(images[indices, best[indices]])
+        transforms[start : start + len(owners)] = best
+    return canonical, transforms
+
+
+def tables_from_canonical(tables, transforms) -> np.ndarray:
+    """Tables of the original deals from (n, 5, 4) canonical tables."""
+
+    tables = np.asarray(tables)
+    transforms = np.asarray(transforms, dtype=np.intp)
+    rows = np.arange(len(tables))[:, None, None]
+    return tables[
+        rows,
+        STRAIN_MAP[transforms][:, :, None],
+        HAND_MAP[transforms][:, None, :],
+    ]
+
+
+def tables_to_canonical(tables, transforms) -> np.ndarray:
+    """Inverse of tables_from_canonical()."""
+
+    tables = np.asarray(tables)
+    transforms = np.asarray(transforms, dtype=np.intp)
+    rows = np.arange(len(tables))[:, None, None]
+    canonical = np.empty_like(tables)
+    canonical[
+        rows,
+        STRAIN_MAP[transforms][:, :, None],
+        HAND_MAP[transforms][:, None, :],
+    ] = tables
+    return canonical
@@ -0,0 +1,71 @@
+import random
+import unittest
+
+import numpy as np
+
+try:
+    from . import bitboard, dds
+    from .test_dds import _random_pbn
+except ImportError:
+    import bitboard
+    import dds
+    from test_dds import _random_pbn
+
+
+class BitboardTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(41)
+        self.pbns = [_random_pbn(rng) for _ in range(50)]
+        self.masks = bitboard.from_pbn(self.pbns)
+
+    def test_conversions_round_trip(self) -> None:
+        holdings = dds.pbn_to_holdings(self.pbns)
+        owners = bitboard.to_owners(self.masks)
+
+        self.assertEqual(bitboard.to_holdings(self.masks).tolist(), holdings.tolist())
+        self.assertEqual(bitboard.to_pbn(self.masks), self.pbns)
+        self.assertEqual(bitboard.from_owners(owners).tolist(), self.masks.tolist())
+        self.assertEqual(bitboard.pack_owners(owners).shape, (50, 13))
+        self.assertEqual(bitboard.unpack_owners(bitboard.pack_owners(owners)).tolist(), owners.tolist())
+        self.assertEqual(bitboard.popcount(self.masks).tolist(), [[13] * 4] * 50)
+
+    def test_card_index(self) -> None:
+        masks = bitboard.from_pbn(["N:A2... .A2.. ..A2. ...A2"])
+
+        self.assertTrue(int(masks[0, dds.HAND_NORTH]) >> bitboard.card_index("SA") & 1)
+        self.assertTrue(int(masks[0, dds.HAND_NORTH]) >> bitboard.card_index("s2") & 1)
+        self.assertTrue(int(masks[0, dds.HAND_WEST]) >> bitboard.card_index("CA") & 1)
+
+    def test_features_match_string_counting(self) -> None:
+        points = {"A": 4, "K": 3, "Q": 2, "J": 1}
+        hcp = bitboard.hcp(self.masks)
+        lengths = bitboard.suit_lengths(self.masks)
+        honours = bitboard.honour_counts(self.masks)
+
+        for i, pbn in enumerate(self.pbns):
+            for seat, hand in enumerate(pbn[2:].split()):
+                suits = hand.split(".")
+                self.assertEqual(hcp[i, seat], sum(points.get(card, 0) for card in hand))
+                self.assertEqual(lengths[i, seat].tolist(), [len(suit) for suit in suits])
+                self.assertEqual(
+                    honours[i, seat].tolist(),
+                    [sum(card in "AKQJT" for card in suit) for suit in suits],
+                )
+
+    def test_patterns_and_presets(self) -> None:
+        lengths = np.array([[4, 3, 3, 3], [2, 3, 5, 3], [5, 3, 3, 2], [2, 2, 4, 5], [6, 3, 2, 2]])
+
+        self.assertEqual(bitboard.pattern_codes(lengths).tolist(), [4333, 5332, 5332, 5422, 6322])
+        self.assertEqual(bitboard.shape_mask(lengths, "balanced").tolist(), [True, True, True, False, False])
+        self.assertEqual(bitboard.shape_mask(lengths, "unbalanced").tolist(), [False, False, False, True, True])
+        self.assertEqual(
+            bitboard.shape_mask(lengths, "balanced-without-major").tolist(),
+            [True, True, False, False, False],
+        )
+        self.assertEqual(
+            bitboard.shape_mask(lengths, "semiBalanced").tolist(), [True, True, True, True, False]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    from . import dds
+    from .dd_cache import UNSOLVED, DDTableCache, cached_calc_all_tables, deal_keys
+    from .symmetry import canonicalize
+    from .test_dds import _random_pbn
+except ImportError:
+    import dds
+    from dd_cache import UNSOLVED, DDTableCache, cached_calc_all_tables, deal_keys
+    from symmetry import canonicalize
+    from test_dds import _random_pbn
+
+
+class CountingSolver:
+    def __init__(self) -> None:
+        self.solved = 0
+
+    def __call__(self, holdings, trump_filter=None):
+        self.solved += len(holdings)
+        # Fake but deterministic tables: tricks depend on the deal only.
+        tables = (holdings.sum(axis=(1, 2)) % 14).astype(int)
+        result = np.zeros((len(holdings), dds.DDS_STRAINS, dds.DDS_HANDS), dtype=np.intc)
+        result[:] = tables[:, None, None]
+        if trump_filter is not None:
+            result[:, [bool(skip) for skip in trump_filter]] = 0
+        return result
+
+
+class DDTableCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(3)
+        self.pbns = [_random_pbn(rng) for _ in range(4)]
+        self.holdings = dds.pbn_to_holdings(self.pbns)
+
+    def test_key_ignores_pbn_first_seat(self) -> None:
+        north_first = "N:AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432. ...AKQJT98765432"
+        west_first = "W:...AKQJT98765432 AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432."
+
+        keys = deal_keys(dds.pbn_to_holdings([north_first, west_first]))
+
+        self.assertEqual(len(keys[0]), 13)
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(deal_keys(self.holdings[:1])[0], keys[0])
+
+    def test_incomplete_deals_are_not_keyed(self) -> None:
+        holdings = self.holdings[:1].copy()
+        holdings[0, dds.HAND_NORTH] = 0
+
+        self.assertEqual(deal_keys(holdings), [None])
+
+    def test_repeated_deals_are_solved_once(self) -> None:
+        cache = DDTableCache()
+        solver = CountingSolver()
+        batch = self.holdings[[0, 1, 0, 2, 1]]
+
+        first = cached_calc_all_tables(cache, batch, None, solver)
+        second = cached_calc_all_tables(cache, batch, None, solver)
+
+        self.assertEqual(solver.solved, 3)
+        self.assertEqual(first.tolist(), solver(batch).tolist())
+        self.assertEqual(second.tolist(), first.tolist())
+        self.assertEqual(cache.stats()["hits"], 5)
+        self.assertEqual(cache.stats()["misses"], 5)
+
+    def test_rotated_and_relabelled_deals_hit_the_same_entry(self) -> None:
+        cache = DDTableCache()
+        solver = CountingSolver()
+        rotated = self.holdings[:, [3, 0, 1, 2]][:, :, [1, 0, 3, 2]]
+
+        cached_calc_all_tables(cache, self.holdings, None, solver)
+        cached_calc_all_tables(cache, rotated, None, solver)
+
+        self.assertEqual(solver.solved, len(self.holdings))
+        self.assertEqual(cache.stats()["entries"], len(self.holdings))
+
+    def test_filtered_strains_are_filled_in_later(self) -> None:
+        cache = DDTableCache()
+        solver = CountingSolver()
+        only_nt = dds.make_trump_filter([dds.SUIT_NT])
+        cached_calc_all_tables(cache, self.holdings[:1], only_nt, solver)
+        key = deal_keys(canonicalize(self.holdings[:1])[0])[0]
+
+        self.assertIsNotNone(cache.get(key, [dds.SUIT_NT]))
+        self.assertEqual(int(cache.get(key, [dds.SUIT_NT])[dds.SUIT_SPADE, 0]), UNSOLVED)
+        self.assertIsNone(cache.get(key))
+
+        cached_calc_all_tables(cache, self.holdings[:1], None, solver)
+
+        self.assertEqual(solver.solved, 2)
+        self.assertIsNotNone(cache.get(key))
+
+    def test_lru_evicts_least_recently_used(self) -> None:
+        cache = DDTableCache(max_entries=2)
+        keys = deal_keys(self.holdings[:3])
+        table = np.zeros((dds.DDS_STRAINS, dds.DDS_HANDS))
+        cache.put_many(keys[:2], [table, table])
+        cache.get(keys[0])
+        cache.put_many(keys[2:3], [table])
+
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+
+    def test_sqlite_tier_is_shared_between_instances(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dd.sqlite")
+            writer = DDTableCache(path=path)
+            cached_calc_all_tables(writer, self.holdings, None, CountingSolver())
+            writer.close()
+
+            reader = DDTableCache(path=path)
+            solver = CountingSolver()
+            tables = cached_calc_all_tables(reader, self.holdings, None, solver)
+            reader.close()
+
+        self.assertEqual(solver.solved, 0)
+        self.assertEqual(tables.tolist(), solver(self.holdings).tolist())
+        self.assertEqual(reader.stats()["disk_hits"], len(self.holdings))
+
+    def test_merge_keeps_strains_stored_on_disk(self) -> None:
+        key = deal_keys(self.holdings[:1])[0]
+        tables = np.full((3, dds.DDS_STRAINS, dds.DDS_HANDS), UNSOLVED)
+        for table, strain in zip(tables, (dds.SUIT_NT, dds.SUIT_SPADE, dds.SUIT_HEART)):
+            table[strain] = strain + 5
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dd.sqlite")
+            first = DDTableCache(max_entries=1, path=path)
+            first.put_many([key], tables[:1])
+            # Evicted from memory before the next strain arrives.
+            first.put_many(deal_keys(self.holdings[1:2]), tables[:1])
+            first.put_many([key], tables[1:2])
+            # Another worker that never had the deal in memory.
+            second = DDTableCache(path=path)
+            second.put_many([key], tables[2:])
+            first.close()
+            second.close()
+
+            reader = DDTableCache(path=path)
+            table = reader.get(key, [dds.SUIT_SPADE, dds.SUIT_HEART, dds.SUIT_NT])
+            reader.close()
+
+        self.assertEqual(table.tolist(), tables.max(axis=0).tolist())
+        self.assertEqual(int(table[dds.SUIT_CLUB, 0]), UNSOLVED)
+
+
+@unittest.skipIf(not dds.library_available(), "libdds is not available")
+class CachedCalcAllTablesTest(unittest.TestCase):
+    def test_cached_tables_match_direct_solve(self) -> None:
+        rng = random.Random(23)
+        holdings = dds.pbn_to_holdings([_random_pbn(rng) for _ in range(3)])
+        cache = DDTableCache()
+        trump_filter = dds.make_trump_filter([dds.SUIT_HEART, dds.SUIT_NT])
+
+        cached_calc_all_tables(cache, holdings, trump_filter)
+        tables = cached_calc_all_tables(cache, holdings, trump_filter)
+
+        self.assertEqual(tables.tolist(), dds.calc_all_tables(holdings, trump_filter).tolist())
+        self.assertEqual(cache.stats()["hits"], 3)
+
+    def test_par_for_cached_and_solved_deals(self) -> None:
+        rng = random.Random(29)
+        holdings = dds.pbn_to_holdings([_random_pbn(rng) for _ in range(3)])
+        cache = DDTableCache()
+        cached_calc_all_tables(cache, holdings[:2])
+
+        tables, par = cached_calc_all_tables(cache, holdings, vulnerable=dds.VUL_BOTH)
+
+        self.assertEqual(par.tolist(), dds.par_from_tables(tables, dds.VUL_BOTH).tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from ctypes import byref
+
+try:
+    from . import dds
+except ImportError:
+    import dds
+
+
+RANKS = "AKQJT98765432"
+
+
+def _random_pbn(rng: random.Random) -> str:
+    cards = [(suit, rank) for suit in range(4) for rank in RANKS]
+    rng.shuffle(cards)
+    hands = []
+    for seat in range(4):
+        hand = cards[seat * 13 : (seat + 1) * 13]
+        suits = []
+        for suit in range(4):
+            holding = sorted((rank for s, rank in hand if s == suit), key=RANKS.index)
+            suits.append("".join(holding))
+        hands.append(".".join(suits))
+    return "N:" + " ".join(hands)
+
+
+@unittest.skipIf(not dds.library_available(), "libdds is not available")
+class CalcAllTablesTest(unittest.TestCase):
+    def test_batch_matches_single_table_calls_across_chunks(self) -> None:
+        rng = random.Random(7)
+        deals = [_random_pbn(rng) for _ in range(dds.MAXNOOFTABLES + 3)]
+
+        tables = dds.calc_all_tables_pbn(deals)
+
+        self.assertEqual(tables.shape, (len(deals), dds.DDS_STRAINS, dds.DDS_HANDS))
+        for index in (0, dds.MAXNOOFTABLES - 1, dds.MAXNOOFTABLES, len(deals) - 1):
+            table_deal = dds.ddTableDealPBN()
+            table_deal.cards = deals[index].encode("utf-8")
+            results = dds.ddTableResults()
+            self.assertEqual(dds.CalcDDtablePBN(table_deal, byref(results)), dds.RETURN_NO_FAULT)
+            expected = [list(row) for row in results.resTable]
+            self.assertEqual(tables[index].tolist(), expected)
+
+    def test_trump_filter_leaves_skipped_strains_empty(self) -> None:
+        rng = random.Random(11)
+        deals = [_random_pbn(rng) for _ in range(3)]
+        only_nt = (1, 1, 1, 1, 0)
+
+        filtered = dds.calc_all_tables_pbn(deals, only_nt)
+        full = dds.calc_all_tables_pbn(deals)
+
+        self.assertEqual(filtered[:, dds.SUIT_NT].tolist(), full[:, dds.SUIT_NT].tolist())
+        self.assertEqual(int(filtered[:, : dds.SUIT_NT].sum()), 0)
+
+    def test_binary_path_matches_pbn_path(self) -> None:
+        rng = random.Random(13)
+        deals = [_random_pbn(rng) for _ in range(4)]
+        holdings = dds.pbn_to_holdings(deals)
+
+        self.assertEqual(dds.calc_all_tables(holdings).tolist(), dds.calc_all_tables_pbn(deals).tolist())
+
+    def test_par_comes_with_the_batch(self) -> None:
+        rng = random.Random(19)
+        holdings = dds.pbn_to_holdings([_random_pbn(rng) for _ in range(3)])
+
+        tables, par = dds.calc_all_tables(holdings, None, dds.VUL_NS)
+
+        self.assertEqual(tables.tolist(), dds.calc_all_tables(holdings).tolist())
+        self.assertEqual(par.tolist(), dds.par_from_tables(tables, dds.VUL_NS).tolist())
+        with self.assertRaises(ValueError):
+            dds.calc_all_tables(holdings, (1, 1, 1, 1, 0), dds.VUL_NS)
+
+    def test_dealer_par(self) -> None:
+        pbn = "N:AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432. ...AKQJT98765432"
+        tables, par = dds.calc_all_tables_pbn([pbn], None, dds.VUL_BOTH)
+
+        self.assertEqual(par.tolist(), [[2210, 2210]])
+        self.assertEqual(dds.dealer_par(tables[0], dds.HAND_EAST, dds.VUL_BOTH), (2210, ["7S-NS"]))
+
+    def test_empty_batch(self) -> None:
+        self.assertEqual(dds.calc_all_tables_pbn([]).shape, (0, dds.DDS_STRAINS, dds.DDS_HANDS))
+
+
+@unittest.skipIf(not dds.library_available(), "libdds is not available")
+class DDSExecutorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.executor = dds.DDSExecutor(max_threads=2).start()
+
+    def tearDown(self) -> None:
+        self.executor.shutdown()
+
+    def test_pool_size_follows_dds_thread_slots(self) -> None:
+        info = dds.DDSInfo()
+        dds.GetDDSInfo(byref(info))
+
+        self.assertEqual(self.executor.num_threads, max(1, info.noOfThreads))
+        self.assertLessEqual(self.executor.num_threads, 2)
+
+    def test_calc_dd_table_matches_calc_dd_table_pbn(self) -> None:
+        pbn = _random_pbn(random.Random(5))
+        table_deal = dds.ddTableDealPBN()
+        table_deal.cards = pbn.encode("utf-8")
+        results = dds.ddTableResults()
+        dds.CalcDDtablePBN(table_deal, byref(results))
+
+        table = self.executor.calc_dd_table(dds.pbn_to_holdings([pbn])[0])
+
+        self.assertEqual(table, [list(row) for row in results.resTable])
+
+    def test_exclusive_waits_for_running_boards(self) -> None:
+        order = []
+        started = threading.Event()
+
+        def slow_job(thread_index: int) -> None:
+            started.set()
+            time.sleep(0.05)
+            order.append("board")
+
+        future = self.executor.submit(slow_job)
+        started.wait()
+        with self.executor.exclusive():
+            order.append("batch")
+        future.result()
+
+        self.assertEqual(order, ["board", "batch"])
+
+    def test_solve_board_error_is_raised_from_future(self) -> None:
+        dl = dds.make_deal(dds.pbn_to_holdings([_random_pbn(random.Random(1))])[0], 9, 0)
+
+        with self.assertRaises(dds.DDSError):
+            self.executor.solve_board(dl).result()
+
+
+class LazyLoadingTest(unittest.TestCase):
+    def _run(self, code: str) -> str:
+        return subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+
+    def test_import_does_not_load_libdds(self) -> None:
+        output = self._run("import dds; print(dds.is_loaded())")
+
+        self.assertEqual(output, "False")
+
+    def test_probability_engine_imports_nothing_native(self) -> None:
+        output = self._run(
+            "import sys, conditional_probability; "
+            "print(sorted(m for m in ('dds', 'numpy', 'ctypes') if m in sys.modules))"
+        )
+
+        self.assertEqual(output, "[]")
+
+
+class TrumpFilterTest(unittest.TestCase):
+    def test_make_trump_filter_marks_unrequested_strains(self) -> None:
+        trump_filter = dds.make_trump_filter([dds.SUIT_SPADE, dds.SUIT_NT])
+
+        self.assertEqual(trump_filter, (0, 1, 1, 1, 0))
+        self.assertEqual(dds.tables_per_call(trump_filter), dds.MAXNOOFBOARDS // 2)
+
+    def test_tables_per_call_grows_as_strains_are_filtered(self) -> None:
+        self.assertEqual(dds.tables_per_call(), dds.MAXNOOFTABLES)
+        self.assertEqual(dds.tables_per_call((1, 1, 1, 1, 0)), dds.MAXNOOFBOARDS)
+        with self.assertRaises(dds.DDSError):
+            dds.tables_per_call((1, 1, 1, 1, 1))
+
+
+class HoldingsConversionTest(unittest.TestCase):
+    def test_pbn_round_trip_with_voids_and_other_first_seat(self) -> None:
+        pbn = "E:AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432. ...AKQJT98765432"
+
+        holdings = dds.pbn_to_holdings([pbn])
+
+        self.assertEqual(holdings.shape, (1, dds.DDS_HANDS, dds.DDS_SUITS))
+        self.assertEqual(int(holdings[0, dds.HAND_EAST, dds.SUIT_SPADE]), 0x7FFC)
+        self.assertEqual(int(holdings[0, dds.HAND_WEST, dds.SUIT_CLUB]), 0)
+        self.assertEqual(int(holdings[0, dds.HAND_NORTH, dds.SUIT_CLUB]), 0x7FFC)
+        self.assertEqual(
+            dds.holdings_to_pbn(holdings),
+            ["N:...AKQJT98765432 AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432."],
+        )
+
+    def test_ace_and_two_use_dds_rank_bits(self) -> None:
+        holdings = dds.pbn_to_holdings(["N:A2... .A2.. ..A2. ...A2"])
+
+        self.assertEqual(int(holdings[0, dds.HAND_NORTH, dds.SUIT_SPADE]), (1 << 14) | (1 << 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import random
+import signal
+import unittest
+
+try:
+    from . import dds
+    from .dds_pool import DDSProcessPool, DDSWorkerError
+    from .test_dds import _random_pbn
+except ImportError:
+    import dds
+    from dds_pool import DDSProcessPool, DDSWorkerError
+    from test_dds import _random_pbn
+
+
+@unittest.skipIf(not dds.library_available(), "libdds is not available")
+class DDSProcessPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.pool = DDSProcessPool(processes=2, capacity=8).start()
+        rng = random.Random(17)
+        cls.holdings = dds.pbn_to_holdings([_random_pbn(rng) for _ in range(12)])
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.pool.close()
+
+    def test_results_match_in_process_solver(self) -> None:
+        only_nt = (1, 1, 1, 1, 0)
+
+        tables = self.pool.calc_all_tables(self.holdings, only_nt)
+
+        self.assertEqual(tables.tolist(), dds.calc_all_tables(self.holdings, only_nt).tolist())
+
+    def test_par_matches_in_process_solver(self) -> None:
+        tables, par = self.pool.calc_all_tables(self.holdings[:4], None, dds.VUL_EW)
+
+        self.assertEqual(par.tolist(), dds.par_from_tables(tables, dds.VUL_EW).tolist())
+
+    def test_crashed_worker_is_replaced(self) -> None:
+        only_nt = (1, 1, 1, 1, 0)
+        victim = self.pool._workers[0]
+        os.kill(victim.process.pid, signal.SIGKILL)
+        victim.process.join()
+
+        tables = self.pool.calc_all_tables(self.holdings, only_nt)
+
+        self.assertNotIn(victim, self.pool._workers)
+        self.assertEqual(len(self.pool._workers), 2)
+        self.assertEqual(tables.tolist(), dds.calc_all_tables(self.holdings, only_nt).tolist())
+
+    def test_worker_errors_are_reported(self) -> None:
+        with self.assertRaises(DDSWorkerError):
+            self.pool.calc_all_tables(self.holdings[:1], (1, 1, 1, 1, 1))
+
+    def test_env_disables_pool_by_default(self) -> None:
+        previous = os.environ.pop("DDS_WORKER_PROCESSES", None)
+        try:
+            self.assertIsNone(DDSProcessPool.from_env())
+        finally:
+            if previous is not None:
+                os.environ["DDS_WORKER_PROCESSES"] = previous
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    from . import deal_archive
+except ImportError:
+    import deal_archive
+
+
+def _rows(rng, count):
+    return {
+        "owners": rng.integers(0, 256, (count, 13), dtype=np.uint8),
+        "tricks": rng.integers(0, 14, (count, 5, 4), dtype=np.uint8),
+    }
+
+
+class DealArchiveTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "deals.dda")
+        rng = np.random.default_rng(3)
+        self.parts = [_rows(rng, count) for count in (3, 9, 5)]
+        self.owners = np.concatenate([part["owners"] for part in self.parts])
+        self.tricks = np.concatenate([part["tricks"] for part in self.parts]).reshape(-1, 20)
+
+    def _write(self, path=None) -> None:
+        path = path or self.path
+        with deal_archive.ArchiveWriter.create(path, chunk_rows=4, meta={"seed": 3}) as writer:
+            writer.append(self.parts[0])
+            writer.append(self.parts[1])
+        with deal_archive.ArchiveWriter.open(path) as writer:
+            writer.append(self.parts[2])
+
+    def test_appends_round_trip_across_chunks(self) -> None:
+        self._write()
+
+        with deal_archive.DealArchive(self.path) as archive:
+            self.assertEqual(len(archive), 17)
+            self.assertEqual(archive.chunk_count, 5)
+            self.assertEqual(archive.meta, {"seed": 3})
+            self.assertEqual(archive.columns, {"owners": 13, "tricks": 20})
+            self.assertEqual(archive.read("owners").tolist(), self.owners.tolist())
+            self.assertEqual(archive.read("tricks", 5, 11).tolist(), self.tricks[5:11].tolist())
+            self.assertEqual(archive.take("tricks", [16, 0, 7]).tolist(), self.tricks[[16, 0, 7]].tolist())
+            self.assertEqual(
+                np.concatenate([block for _, block in archive.chunks("owners")]).tolist(), self.owners.tolist()
+            )
+            self.assertEqual([start for start, _ in archive.chunks("tricks")], [0, 4, 8, 12, 16])
+            zones = archive.zone_map("tricks")
+            for chunk in range(archive.chunk_count):
+                block = self.tricks[chunk * 4 : chunk * 4 + 4]
+                self.assertEqual(zones[chunk].tolist(), [block.min(axis=0).tolist(), block.max(axis=0).tolist()])
+            with self.assertRaises(IndexError):
+                archive.take("owners", [17])
+
+    def test_rows_are_visible_only_after_flush(self) -> None:
+        writer = deal_archive.ArchiveWriter.create(self.path, chunk_rows=4)
+        writer.append(self.parts[0])
+        writer.flush()
+        writer.append(self.parts[1])
+
+        self.assertEqual(len(deal_archive.DealArchive(self.path)), 3)
+        writer.close()
+        self.assertEqual(len(deal_archive.DealArchive(self.path)), 12)
+
+    def test_damaged_index_is_ignored_and_rebuilt(self) -> None:
+        self._write()
+        with open(self.path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+
+        self.assertIsNone(deal_archive.DealArchive(self.path).zone_map("tricks"))
+        deal_archive.ArchiveWriter.open(self.path).close()
+        zones = deal_archive.DealArchive(self.path).zone_map("tricks")
+        self.assertEqual(zones[4].tolist(), [self.tricks[16].tolist()] * 2)
+
+    def test_compact_selects_deduplicates_and_rechunks(self) -> None:
+        with deal_archive.ArchiveWriter.create(self.path, chunk_rows=4) as writer:
+            writer.append(self.parts[1])
+            writer.append({name: block[:4] for name, block in self.parts[1].items()})
+        destination = os.path.join(self.directory.name, "compact.dda")
+
+        kept = deal_archive.compact(self.path, destination, unique=True, chunk_rows=2)
+        with deal_archive.DealArchive(destination) as archive:
+            self.assertEqual(kept, 9)
+            self.assertEqual(archive.chunk_rows, 2)
+            self.assertEqual(archive.read("owners").tolist(), self.parts[1]["owners"].tolist())
+
+        mask = np.zeros(13, dtype=bool)
+        mask[[1, 10]] = True
+        self.assertEqual(deal_archive.compact(self.path, destination, rows=mask), 2)
+        with deal_archive.DealArchive(destination) as archive:
+            self.assertEqual(archive.read("tricks").tolist(), self.tricks[[4, 4]].tolist())
+
+    def test_trick_counts_scan_every_row(self) -> None:
+        self._write()
+        expected = np.array([np.bincount(lane, minlength=14) for lane in self.tricks.T]).reshape(5, 4, 14)
+
+        with deal_archive.DealArchive(self.path) as archive:
+            self.assertEqual(deal_archive.trick_counts(archive).tolist(), expected.tolist())
+            self.assertEqual(deal_archive.trick_counts(archive, [2]).sum(), 20)
+
+    def test_other_files_are_rejected(self) -> None:
+        with open(self.path, "wb") as f:
+            f.write(b"not an archive" * 10)
+
+        with self.assertRaises(deal_archive.ArchiveError):
+            deal_archive.DealArchive(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import time
+import unittest
+
+import numpy as np
+
+try:
+    from . import bitboard, dds, deal_generator
+except ImportError:
+    import bitboard
+    import dds
+    import deal_generator
+
+
+NORTH = "AKQJ.T98.765.432"
+SOUTH = "T98.765.432.AKQJ"
+
+
+class DealGeneratorTest(unittest.TestCase):
+    def test_parse_range_matches_request_format(self) -> None:
+        self.assertEqual(deal_generator.parse_range("3-5", 0, 13), (3, 5))
+        self.assertEqual(deal_generator.parse_range("4", 0, 13), (4, 4))
+        self.assertEqual(deal_generator.parse_range("-5", 0, 13), (0, 5))
+        self.assertEqual(deal_generator.parse_range("12-", 0, 37), (12, 37))
+        self.assertEqual(deal_generator.parse_range("", 0, 37), (0, 37))
+
+        constraint = deal_generator.SeatConstraint.parse("5-,,0-3,", "11-15", "semiBalanced")
+        self.assertEqual(constraint.suit_lengths, ((5, 13), (0, 13), (0, 3), (0, 13)))
+        self.assertEqual(constraint.hcp, (11, 15))
+        self.assertEqual(constraint.preset, "semiBalanced")
+
+    def test_known_hands_are_kept_and_constraints_hold(self) -> None:
+        generator = deal_generator.ConstrainedDealGenerator(
+            known={
+                dds.HAND_NORTH: deal_generator.hand_mask(NORTH),
+                dds.HAND_SOUTH: deal_generator.hand_mask(SOUTH),
+            },
+            constraints={
+                dds.HAND_EAST: deal_generator.SeatConstraint.parse("5-,,,", "11-15"),
+                dds.HAND_WEST: deal_generator.SeatConstraint.parse(preset="unbalanced"),
+            },
+            seed=5,
+        )
+
+        masks = generator.generate(500)
+        lengths = bitboard.suit_lengths(masks)
+        points = bitboard.hcp(masks)
+
+        self.assertEqual(masks.shape, (500, 4))
+        self.assertEqual(bitboard.popcount(masks).tolist(), [[13] * 4] * 500)
+        self.assertTrue((np.bitwise_or.reduce(masks, axis=1) == (1 << 52) - 1).all())
+        self.assertEqual(set(pbn.split()[0] for pbn in bitboard.to_pbn(masks)), {"N:" + NORTH})
+        self.assertTrue((lengths[:, dds.HAND_EAST, dds.SUIT_SPADE] >= 5).all())
+        self.assertTrue(((points[:, dds.HAND_EAST] >= 11) & (points[:, dds.HAND_EAST] <= 15)).all())
+        self.assertFalse(bitboard.shape_mask(lengths[:, dds.HAND_WEST], "balanced").any())
+        self.assertGreaterEqual(generator.report.accepted, 500)
+        self.assertGreater(generator.report.rejection_rate, 0.5)
+
+    def test_seed_repeats_deals_and_batches_cover_count(self) -> None:
+        constraint = {dds.HAND_NORTH: deal_generator.SeatConstraint.parse(hcp="15-17", preset="balanced")}
+        first = deal_generator.ConstrainedDealGenerator(constraints=constraint, seed=11)
+        second = deal_generator.ConstrainedDealGenerator(constraints=constraint, seed=11)
+
+        batches = list(first.batches(25, 10))
+
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        self.assertEqual(np.concatenate(batches).tolist(), second.generate(25).tolist())
+        self.assertEqual(first.report.seed, 11)
+
+    def test_report_times_drawing_not_the_consumer(self) -> None:
+        generator = deal_generator.ConstrainedDealGenerator(seed=5)
+
+        for _ in generator.batches(30, 10):
+            time.sleep(0.2)
+
+        self.assertLess(generator.report.seconds, 0.2)
+
+    def test_unconstrained_shapes_follow_the_deal_distribution(self) -> None:
+        masks = deal_generator.ConstrainedDealGenerator(seed=3).generate(20000)
+
+        balanced = bitboard.shape_mask(bitboard.suit_lengths(masks), "balanced").mean()
+
+        # 4333 + 4432 + 5332 = 47.6% of all hands.
+        self.assertAlmostEqual(balanced, 0.476, delta=0.01)
+
+    def test_impossible_constraints_raise(self) -> None:
+        generator = deal_generator.ConstrainedDealGenerator(
+            known={dds.HAND_NORTH: deal_generator.hand_mask(NORTH)},
+            constraints={dds.HAND_EAST: deal_generator.SeatConstraint.parse("13,,,")},
+            max_candidates=10000,
+        )
+
+        with self.assertRaises(deal_generator.GenerationError):
+            generator.generate(1)
+        self.assertEqual(generator.report.accepted, 0)
+
+    def test_conflicting_known_cards_raise(self) -> None:
+        with self.assertRaises(ValueError):
+            deal_generator.ConstrainedDealGenerator(
+                known={dds.HAND_NORTH: deal_generator.hand_mask(NORTH), dds.HAND_SOUTH: deal_generator.hand_mask("A...")}
+            )
+
+    def test_format_pbn_is_deal_output(self) -> None:
+        masks = bitboard.from_pbn(["N:AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432. ...AKQJT98765432"])
+
+        self.assertEqual(
+            deal_generator.format_pbn(masks),
+            '[Deal "N:AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432. ...AKQJT98765432"]\n\n',
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    from . import bitboard, dds, deal_archive, deal_generator, deal_index, deal_library
+except ImportError:
+    import bitboard
+    import dds
+    import deal_archive
+    import deal_generator
+    import deal_index
+    import deal_library
+
+
+def _append(writer, rng, count):
+    owners = deal_library._random_owners(rng, count)
+    masks = bitboard.from_owners(owners)
+    writer.append(
+        {
+            "owners": bitboard.pack_owners(owners),
+            "tricks": np.zeros((count, 20), dtype=np.uint8),
+            "hcp": bitboard.hcp(masks),
+            "lengths": bitboard.suit_lengths(masks),
+        }
+    )
+
+
+def _constraint(shape="", hcp="", preset="any"):
+    return deal_generator.SeatConstraint.parse(shape, hcp, preset)
+
+
+QUERIES = [
+    ({dds.HAND_NORTH: deal_generator.hand_mask("A...")}, {dds.HAND_EAST: _constraint("4-,,,", "8-15")}, {}),
+    ({}, {dds.HAND_SOUTH: _constraint("", "12-", "balanced")}, {dds.HAND_SOUTH: deal_generator.hand_mask("K.A..")}),
+    ({}, {dds.HAND_WEST: _constraint("", "-9", "unbalanced"), dds.HAND_NORTH: _constraint(preset="semiBalanced")}, {}),
+    ({}, {dds.HAND_EAST: _constraint(",3-4,,0-2", "10", "balanced-without-major")}, {}),
+    ({}, {dds.HAND_EAST: _constraint("14,,,")}, {}),
+]
+
+
+class FeatureIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "library.dda")
+        self.rng = np.random.default_rng(11)
+        with deal_archive.ArchiveWriter.create(self.path, deal_library.COLUMNS, chunk_rows=256) as writer:
+            _append(writer, self.rng, 700)
+
+    def _expected(self, known, constraints, excluded) -> list:
+        library = deal_library.DealLibrary(self.path)
+        masks = library.masks(np.arange(len(library)))
+        ok = np.ones(len(masks), dtype=bool)
+        for cards, holds in ((known, True), (excluded, False)):
+            for hand, mask in cards.items():
+                for card in range(bitboard.NUM_CARDS):
+                    if mask >> card & 1:
+                        ok &= ((masks[:, hand] >> np.uint64(card)) & np.uint64(1) == 1) == holds
+        for hand, constraint in constraints.items():
+            ok &= constraint.accepts(bitboard.suit_lengths(masks)[:, hand], bitboard.hcp(masks)[:, hand])
+        return np.flatnonzero(ok).tolist()
+
+    def test_select_matches_a_full_scan_after_incremental_updates(self) -> None:
+        deal_index.update(self.path, block_rows=128)
+        with deal_archive.ArchiveWriter.open(self.path) as writer:
+            _append(writer, self.rng, 500)
+        self.assertEqual(deal_index.update(self.path), 1200)
+
+        index = deal_index.FeatureIndex.for_archive(self.path)
+        self.assertEqual((len(index), index.block_rows), (1200, 128))
+        for known, constraints, excluded in QUERIES:
+            expected = self._expected(known, constraints, excluded)
+            self.assertEqual(index.select(known, constraints, excluded).tolist(), expected)
+            self.assertEqual(index.select(known, constraints, excluded, limit=5).tolist(), expected[:5])
+        self.assertTrue(all(self._expected(*query) for query in QUERIES[:3]))
+
+    def test_library_scans_rows_the_index_does_not_cover(self) -> None:
+        deal_index.update(self.path, block_rows=128)
+        with deal_archive.ArchiveWriter.open(self.path) as writer:
+            _append(writer, self.rng, 300)
+        library = deal_library.DealLibrary(self.path)
+
+        self.assertEqual(len(library.index), 700)
+        for known, constraints, excluded in QUERIES:
+            expected = self._expected(known, constraints, excluded)
+            self.assertEqual(library.match(known, constraints, excluded=excluded).tolist(), expected)
+            self.assertEqual(library.match(known, constraints, limit=3, excluded=excluded).tolist(), expected[:3])
+
+
+if __name__ == "__main__":
+    unittest.main()
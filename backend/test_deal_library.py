@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+try:
+    from . import bitboard, dds, deal_generator, deal_library
+except ImportError:
+    import bitboard
+    import dds
+    import deal_generator
+    import deal_library
+
+
+class Interrupted(Exception):
+    pass
+
+
+@unittest.skipIf(not dds.library_available(), "libdds is not available")
+class DealLibraryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "library.dda")
+        with mock.patch.object(deal_library, "BUILD_BATCH", 6):
+            deal_library.build(cls.path, 15, seed=7)
+        cls.library = deal_library.DealLibrary(cls.path)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.directory.cleanup()
+
+    def test_columns_hold_solved_random_deals(self) -> None:
+        rows = np.arange(len(self.library))
+        masks = self.library.masks(rows)
+
+        self.assertEqual(len(self.library), 15)
+        self.assertEqual(bitboard.popcount(masks).tolist(), [[13] * 4] * 15)
+        self.assertEqual(len(set(map(tuple, masks.tolist()))), 15)
+        self.assertEqual(self.library.tables(rows).tolist(), dds.calc_all_tables(bitboard.to_holdings(masks)).tolist())
+        self.assertEqual(self.library.archive.read("hcp").tolist(), bitboard.hcp(masks).tolist())
+        self.assertEqual(self.library.archive.read("lengths").tolist(), bitboard.suit_lengths(masks).reshape(15, 16).tolist())
+
+    def test_interrupted_build_resumes_to_the_same_library(self) -> None:
+        path = os.path.join(self.directory.name, "resumed.dda")
+
+        def stop(done, total, seconds):
+            raise Interrupted
+
+        with mock.patch.object(deal_library, "BUILD_BATCH", 6):
+            with self.assertRaises(Interrupted):
+                deal_library.build(path, 15, seed=7, progress=stop)
+            self.assertEqual(len(deal_library.DealLibrary(path)), 6)
+            deal_library.build(path, 15, seed=7)
+            with self.assertRaises(ValueError):
+                deal_library.build(path, 15, seed=8)
+
+        resumed = deal_library.DealLibrary(path)
+        for name in deal_library.COLUMNS:
+            self.assertEqual(resumed.archive.read(name).tolist(), self.library.archive.read(name).tolist())
+
+    def test_match_filters_by_known_cards_and_constraints(self) -> None:
+        masks = self.library.masks(np.arange(len(self.library)))
+        # The first deal's two top North cards and at least its East HCP.
+        north = int(masks[0, dds.HAND_NORTH])
+        known = {dds.HAND_NORTH: north & ~((1 << (north.bit_length() - 2)) - 1)}
+        constraint = deal_generator.SeatConstraint.parse(hcp=f"{bitboard.hcp(masks)[0, dds.HAND_EAST]}-")
+        constraints = {dds.HAND_EAST: constraint}
+
+        rows = self.library.match(known, constraints)
+
+        expected = np.flatnonzero(
+            (masks[:, dds.HAND_NORTH] & np.uint64(known[dds.HAND_NORTH]) == np.uint64(known[dds.HAND_NORTH]))
+            & constraint.accepts(bitboard.suit_lengths(masks)[:, dds.HAND_EAST], bitboard.hcp(masks)[:, dds.HAND_EAST])
+        )
+        self.assertIn(0, expected)
+        self.assertEqual(rows.tolist(), expected.tolist())
+        self.assertEqual(self.library.match(limit=4).tolist(), [0, 1, 2, 3])
+        self.assertEqual(self.library.match({dds.HAND_SOUTH: north}).tolist(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
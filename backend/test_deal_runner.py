@@ -0,0 +1,211 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+try:
+    from . import deal_runner
+except ImportError:
+    import deal_runner
+
+
+def _deal_available() -> bool:
+    return shutil.which(deal_runner.DEAL_COMMAND) is not None and os.path.exists(
+        os.path.join(deal_runner.DEAL_DIR or ".", "format", "pbn")
+    )
+
+
+def _north_hcp(pbn_line: str) -> int:
+    north = pbn_line.split('"')[1][2:].split()[0]
+    return sum({"A": 4, "K": 3, "Q": 2, "J": 1}.get(card, 0) for card in north)
+
+
+@unittest.skipUnless(_deal_available(), "deal is not installed (set DEAL_DIR and PATH)")
+class RunDealTest(unittest.TestCase):
+    def test_concurrent_scripts_do_not_share_constraints(self) -> None:
+        scripts = {
+            "strong": "main {\nreject unless {[hcp north] >= 20}\naccept\n}\n",
+            "weak": "main {\nreject unless {[hcp north] <= 4}\naccept\n}\n",
+        }
+        outputs = {}
+
+        def generate(name: str) -> None:
+            outputs[name] = deal_runner.run_deal(scripts[name], 20, timeout=60)
+
+        threads = [threading.Thread(target=generate, args=(name,)) for name in scripts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for name, check in (("strong", lambda hcp: hcp >= 20), ("weak", lambda hcp: hcp <= 4)):
+            deals = [line for line in outputs[name].splitlines() if line.startswith("[Deal")]
+            self.assertEqual(len(deals), 20)
+            self.assertTrue(all(check(_north_hcp(line)) for line in deals), name)
+
+    def test_stream_batches_yields_every_deal_in_batches(self) -> None:
+        script = "main {\nreject unless {[hcp north] >= 15}\naccept\n}\n"
+
+        batches = list(deal_runner.stream_batches(script, 25, batch_size=10, timeout=60))
+
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        self.assertTrue(all(pbn.startswith("N:") for batch in batches for pbn in batch))
+
+    def test_stream_batches_can_stop_early(self) -> None:
+        batches = deal_runner.stream_batches("main {\naccept\n}\n", 1000, batch_size=5, timeout=60)
+
+        self.assertEqual(len(next(batches)), 5)
+        batches.close()
+
+    def test_closing_does_not_wait_for_the_next_deal(self) -> None:
+        # Accepts the first deal and then rejects every other one.
+        script = "main {\nglobal seen\nif {[info exists seen]} {reject}\nset seen 1\naccept\n}\n"
+        for parallel in (1, 2):
+            batches = deal_runner.stream_batches(script, 5, batch_size=1, timeout=30, parallel=parallel)
+            self.assertEqual(len(next(batches)), 1)
+            started = time.perf_counter()
+            batches.close()
+            self.assertLess(time.perf_counter() - started, 5)
+
+    def test_pipe_deals_feeds_the_consumer(self) -> None:
+        counter = "import sys; print(sum(line.startswith('[Deal') for line in sys.stdin))"
+
+        process = deal_runner.pipe_deals("main {\naccept\n}\n", 12, [sys.executable, "-c", counter])
+
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(process.stdout.strip(), "12")
+
+    def test_script_errors_raise_deal_error(self) -> None:
+        script = "main {\nreject unless {[no_such_proc]}\n}\n"
+        with self.assertRaises(deal_runner.DealError):
+            deal_runner.run_deal(script, 1, timeout=60)
+        with self.assertRaises(deal_runner.DealError):
+            list(deal_runner.stream_batches(script, 1, batch_size=1, timeout=60))
+
+    def test_seed_repeats_deals(self) -> None:
+        script = "main {\naccept\n}\n"
+
+        first = list(deal_runner.stream_deals(script, 5, timeout=60, seed=12))
+        second = list(deal_runner.stream_deals(script, 5, timeout=60, seed=12))
+
+        self.assertEqual(first, second)
+
+    def test_parallel_streams_are_reproducible_and_complete(self) -> None:
+        script = "main {\nreject unless {[hcp north] >= 12}\naccept\n}\n"
+
+        first = list(deal_runner.stream_parallel_deals(script, 11, 3, timeout=60, seed=5))
+        second = list(deal_runner.stream_parallel_deals(script, 11, 3, timeout=60, seed=5))
+        batches = list(deal_runner.stream_batches(script, 11, 4, timeout=60, seed=5, parallel=3))
+
+        self.assertEqual(len(first), 11)
+        self.assertEqual(len(set(first)), 11)
+        self.assertEqual(first, second)
+        self.assertEqual([pbn for batch in batches for pbn in batch], first)
+        self.assertTrue(all(_north_hcp(f'[Deal "{pbn}"]') >= 12 for pbn in first))
+
+    def test_parallel_pipe_deals(self) -> None:
+        counter = "import sys; print(sum(line.startswith('[Deal') for line in sys.stdin))"
+
+        process = deal_runner.pipe_deals(
+            "main {\naccept\n}\n", 10, [sys.executable, "-c", counter], seed=1, parallel=4
+        )
+
+        self.assertEqual(process.stdout.strip(), "10")
+
+
+class DeriveSeedsTest(unittest.TestCase):
+    def test_seeds_are_distinct_and_reproducible(self) -> None:
+        seeds = deal_runner.derive_seeds(42, 8)
+
+        self.assertEqual(seeds, deal_runner.derive_seeds(42, 8))
+        self.assertEqual(len(set(seeds)), 8)
+        self.assertTrue(all(0 <= seed < deal_runner.SEED_RANGE for seed in seeds))
+        self.assertNotEqual(seeds, deal_runner.derive_seeds(43, 8))
+
+
+@unittest.skipUnless(_deal_available(), "deal is not installed (set DEAL_DIR and PATH)")
+class DealWorkerPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pool = deal_runner.DealWorkerPool(1, max_jobs=3).start()
+        self.addCleanup(self.pool.close)
+
+    def _pid(self) -> int:
+        worker = self.pool._idle.get()
+        self.pool._idle.put(worker)
+        return worker.process.pid
+
+    def test_jobs_reuse_the_worker_and_do_not_share_state(self) -> None:
+        pid = self._pid()
+        stacked = "north gets AS KS QS\nmain {\naccept\n}\n"
+
+        first = list(self.pool.stream_deals(stacked, 5, timeout=60, seed=3))
+        second = list(self.pool.stream_deals("main {\naccept\n}\n", 20, timeout=60, seed=3))
+
+        self.assertTrue(all(pbn.startswith("N:AKQ") for pbn in first))
+        self.assertFalse(all(pbn.startswith("N:AKQ") for pbn in second))
+        self.assertEqual(self._pid(), pid)
+        self.assertEqual(list(self.pool.stream_deals(stacked, 5, timeout=60, seed=3)), first)
+
+    def test_globals_and_procs_do_not_outlive_the_job(self) -> None:
+        defines = "set leftover 1\nproc helper {} {return 1}\nshapeclass roundish {expr 1}\nmain {\naccept\n}\n"
+        checks = (
+            "foreach name {leftover helper roundish} {\n"
+            "    if {[info exists $name] || [llength [info commands $name]]} { error \"$name leaked\" }\n"
+            "}\nmain {\naccept\n}\n"
+        )
+
+        list(self.pool.stream_deals(defines, 2, timeout=60, seed=3))
+
+        self.assertEqual(len(list(self.pool.stream_deals(checks, 2, timeout=60, seed=3))), 2)
+
+    def test_workers_are_recycled_after_max_jobs(self) -> None:
+        pid = self._pid()
+        for _ in range(4):
+            list(self.pool.stream_deals("main {\naccept\n}\n", 1, timeout=60))
+
+        self.assertNotEqual(self._pid(), pid)
+
+    def test_errors_and_abandoned_jobs_leave_a_working_pool(self) -> None:
+        with self.assertRaises(deal_runner.DealError):
+            list(self.pool.stream_deals("main {\nreject unless {[no_such_proc]}\n}\n", 1, timeout=60))
+        deals = self.pool.stream_deals("main {\naccept\n}\n", 1000, timeout=60)
+        next(deals)
+        deals.close()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            list(self.pool.stream_deals("main {\nreject\n}\n", 1, timeout=1))
+
+        batches = list(deal_runner.stream_batches("main {\naccept\n}\n", 7, 3, timeout=60, pool=self.pool))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+
+    def test_closing_a_blocked_stream_replaces_the_worker(self) -> None:
+        script = "main {\nglobal seen\nif {[info exists seen]} {reject}\nset seen 1\naccept\n}\n"
+        batches = deal_runner.stream_batches(script, 5, batch_size=1, timeout=30, pool=self.pool)
+        next(batches)
+        started = time.perf_counter()
+        batches.close()
+
+        self.assertLess(time.perf_counter() - started, 5)
+        self.assertEqual(len(list(self.pool.stream_deals("main {\naccept\n}\n", 2, timeout=60))), 2)
+
+    def test_pipe_deals_from_the_pool(self) -> None:
+        counter = "import sys; print(sum(line.startswith('[Deal') for line in sys.stdin))"
+
+        process = deal_runner.pipe_deals(
+            "main {\naccept\n}\n", 12, [sys.executable, "-c", counter], pool=self.pool
+        )
+
+        self.assertEqual(process.stdout.strip(), "12")
+
+    def test_parallel_jobs_share_the_pool(self) -> None:
+        script = "main {\naccept\n}\n"
+
+        deals = list(deal_runner.stream_parallel_deals(script, 9, 3, timeout=60, seed=8, pool=self.pool))
+
+        self.assertEqual(deals, list(deal_runner.stream_parallel_deals(script, 9, 3, timeout=60, seed=8)))
+
+
+if __name__ == "__main__":
+    unittest.main()
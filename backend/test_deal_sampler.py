@@ -0,0 +1,187 @@
+from itertools import combinations
+from math import comb
+import time
+import unittest
+
+import numpy as np
+
+try:
+    from . import bitboard, dds, deal_generator, deal_sampler
+except ImportError:
+    import bitboard
+    import dds
+    import deal_generator
+    import deal_sampler
+
+
+NORTH = "AKQJ.T98.765.432"
+SOUTH = "T98.765.432.AKQJ"
+
+
+def _constraint(shape="", hcp="", preset="any"):
+    return deal_generator.SeatConstraint.parse(shape, hcp, preset)
+
+
+def _east_west_deals(known, constraints):
+    # Every deal of the cards East and West lack that the constraints accept.
+    rejection = deal_generator.ConstrainedDealGenerator(known, constraints)
+    unknown = rejection.unknown_cards.tolist()
+    vacancy = rejection.vacancies[dds.HAND_EAST]
+    deals = []
+    for east in combinations(unknown, vacancy):
+        masks = rejection.known.copy()
+        for card in unknown:
+            masks[dds.HAND_EAST if card in east else dds.HAND_WEST] |= np.uint64(1 << card)
+        deals.append(masks)
+    deals = np.array(deals)
+    return deals[rejection.accepts(deals)]
+
+
+class ExactDealSamplerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.known = {
+            dds.HAND_NORTH: deal_generator.hand_mask(NORTH),
+            dds.HAND_SOUTH: deal_generator.hand_mask(SOUTH),
+        }
+
+    def test_count_and_uniformity_match_brute_force(self) -> None:
+        known = dict(self.known)
+        known[dds.HAND_EAST] = deal_generator.hand_mask("765.432.AKQ.T")
+        constraints = {
+            dds.HAND_EAST: _constraint(hcp="5-", preset="unbalanced"),
+            dds.HAND_WEST: _constraint("2-4,,,"),
+        }
+        deals = _east_west_deals(known, constraints)
+
+        sampler = deal_sampler.ExactDealSampler(known, constraints, seed=4)
+        samples = sampler.generate(4000)
+
+        self.assertEqual(sampler.count, len(deals))
+        index = {tuple(deal): i for i, deal in enumerate(deals.tolist())}
+        counts = np.bincount([index[tuple(deal)] for deal in samples.tolist()], minlength=len(deals))
+        expected = len(samples) / len(deals)
+        chi2 = ((counts - expected) ** 2 / expected).sum()
+        # 99.9th percentile of chi-square with len(deals) - 1 degrees of freedom is well below 2x.
+        self.assertLess(chi2, 2 * len(deals))
+
+    def test_rare_constraints_are_met_without_rejection(self) -> None:
+        constraints = {dds.HAND_EAST: _constraint("6,5,,", "11-12")}
+        sampler = deal_sampler.ExactDealSampler(self.known, constraints, seed=1)
+
+        masks = sampler.generate(300)
+        lengths = bitboard.suit_lengths(masks)
+        points = bitboard.hcp(masks)
+
+        self.assertLess(sampler.probability, 1e-4)
+        self.assertTrue((lengths[:, dds.HAND_EAST, dds.SUIT_SPADE] == 6).all())
+        self.assertTrue((lengths[:, dds.HAND_EAST, dds.SUIT_HEART] == 5).all())
+        self.assertTrue(((points[:, dds.HAND_EAST] >= 11) & (points[:, dds.HAND_EAST] <= 12)).all())
+        self.assertEqual(set(pbn.split()[0] for pbn in bitboard.to_pbn(masks)), {"N:" + NORTH})
+        self.assertEqual(bitboard.popcount(masks).tolist(), [[13] * 4] * 300)
+        self.assertEqual(sampler.report.rejection_rate, 0.0)
+        self.assertEqual(sampler.report.as_dict()["generator"], "exact")
+
+    def test_probability_matches_rejection_sampling(self) -> None:
+        known = {dds.HAND_WEST: deal_generator.hand_mask(NORTH)}
+        constraints = {
+            dds.HAND_SOUTH: _constraint(hcp="15-17", preset="balanced"),
+            dds.HAND_NORTH: _constraint(preset="semiBalanced"),
+        }
+        sampler = deal_sampler.ExactDealSampler(known, constraints, seed=2)
+        rejection = deal_generator.ConstrainedDealGenerator(known, constraints, seed=2)
+
+        estimate = rejection.accepts(rejection.candidates(200000)).mean()
+
+        self.assertAlmostEqual(sampler.probability, estimate, delta=0.002)
+        self.assertTrue(rejection.accepts(sampler.generate(500)).all())
+
+    def test_impossible_constraints_have_no_deals(self) -> None:
+        sampler = deal_sampler.ExactDealSampler(self.known, {dds.HAND_WEST: _constraint(preset="balanced", shape="13,,,")})
+
+        self.assertEqual(sampler.count, 0)
+        with self.assertRaises(deal_generator.GenerationError):
+            sampler.generate(1)
+
+    def test_seed_repeats_deals(self) -> None:
+        constraints = {dds.HAND_EAST: _constraint("5-,,,", "11-15")}
+
+        first = deal_sampler.ExactDealSampler(self.known, constraints, seed=9).generate(20)
+        second = deal_sampler.ExactDealSampler(self.known, constraints, seed=9).generate(20)
+
+        self.assertEqual(first.tolist(), second.tolist())
+
+    def test_enumeration_lists_every_deal_once(self) -> None:
+        known = dict(self.known)
+        known[dds.HAND_EAST] = deal_generator.hand_mask("765.432.AKQ.T")
+        constraints = {dds.HAND_EAST: _constraint(hcp="5-", preset="unbalanced")}
+        deals = _east_west_deals(known, constraints)
+
+        sampler = deal_sampler.ExactDealSampler(known, constraints)
+        enumerated = deal_sampler.DealEnumerator(sampler).generate(1000)
+
+        self.assertEqual(len(enumerated), sampler.count)
+        self.assertEqual(sorted(map(tuple, enumerated.tolist())), sorted(map(tuple, deals.tolist())))
+        with self.assertRaises(IndexError):
+            sampler.unrank(sampler.count)
+
+    def test_enumeration_resumes_and_splits_unconstrained_seats(self) -> None:
+        known = {
+            dds.HAND_NORTH: deal_generator.hand_mask(NORTH),
+            dds.HAND_EAST: deal_generator.hand_mask("765.432.AKQ.T9"),
+            dds.HAND_WEST: deal_generator.hand_mask("432.AKQ.T98.765"),
+        }
+        constraints = {dds.HAND_SOUTH: _constraint(hcp="-8")}
+        sampler = deal_sampler.ExactDealSampler(known, constraints)
+        enumerator = deal_sampler.DealEnumerator(sampler, start=5)
+        batches = list(enumerator.batches(1000, 7))
+        deals = np.concatenate([sampler.unrank(rank)[None] for rank in range(5)] + batches)
+
+        self.assertEqual(len(deals), sampler.count)
+        self.assertEqual(len(set(map(tuple, deals.tolist()))), sampler.count)
+        self.assertTrue(deal_generator.ConstrainedDealGenerator(known, constraints).accepts(deals).all())
+        self.assertEqual(bitboard.popcount(deals).tolist(), [[13] * 4] * len(deals))
+        self.assertEqual(enumerator.report.as_dict()["generator"], "enumeration")
+        self.assertEqual(list(enumerator.batches(10, 7)), [])
+
+    def test_layout_bound_is_cheap_and_never_below_the_count(self) -> None:
+        known = dict(self.known)
+        known[dds.HAND_EAST] = deal_generator.hand_mask("765.432.AKQ.T")
+        cases = [
+            (known, {}),
+            (known, {dds.HAND_EAST: _constraint(hcp="5-", preset="unbalanced")}),
+            (self.known, {dds.HAND_EAST: _constraint("5,4,3,1")}),
+            (self.known, {dds.HAND_EAST: _constraint("4-,,,", preset="balanced"), dds.HAND_WEST: _constraint("5,,,")}),
+        ]
+        for case_known, constraints in cases:
+            count = deal_sampler.ExactDealSampler(case_known, constraints).count
+            self.assertGreaterEqual(deal_sampler.layout_bound(case_known, constraints), count)
+
+        self.assertEqual(deal_sampler.layout_bound(known), comb(16, 3))
+        self.assertEqual(deal_sampler.layout_bound(self.known), comb(26, 13))
+        # Without HCP ranges a single constrained seat's bound is exact.
+        east = {dds.HAND_EAST: _constraint("5,4,3,1")}
+        self.assertEqual(
+            deal_sampler.layout_bound(self.known, east), deal_sampler.ExactDealSampler(self.known, east).count
+        )
+
+    def test_make_generator_uses_exact_sampler_only_for_rare_constraints(self) -> None:
+        common = deal_sampler.make_generator(self.known, {dds.HAND_EAST: _constraint(hcp="8-")}, 1000)
+        rare = deal_sampler.make_generator(self.known, {dds.HAND_EAST: _constraint("6,5,,", "11-12")}, 1000)
+
+        self.assertIsInstance(common, deal_generator.ConstrainedDealGenerator)
+        self.assertIsInstance(rare, deal_sampler.ExactDealSampler)
+
+    def test_make_generator_gives_up_on_a_large_dp_quickly(self) -> None:
+        known = {dds.HAND_NORTH: deal_generator.hand_mask(NORTH)}
+        constraints = {dds.HAND_EAST: _constraint("6,5,,", "11-12"), dds.HAND_WEST: _constraint(",,5,", "5-")}
+
+        started = time.perf_counter()
+        generator = deal_sampler.make_generator(known, constraints, 10**6)
+
+        self.assertIsInstance(generator, deal_generator.ConstrainedDealGenerator)
+        # A full DEFAULT_MAX_STEPS attempt takes several seconds.
+        self.assertLess(time.perf_counter() - started, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+try:
+    from . import bitboard, dds, deal_generator, paired
+except ImportError:
+    import bitboard
+    import dds
+    import deal_generator
+    import paired
+
+
+NORTH = "AKJ32.K4.A92.Q83"
+SOUTH = "QT98.A73.K54.AJ2"
+# NORTH with the HQ in place of the S2, far apart in card order.
+SWAPPED = "AKJ3.KQ4.A92.Q83"
+
+
+def _known(north=NORTH):
+    return {
+        dds.HAND_NORTH: deal_generator.hand_mask(north),
+        dds.HAND_SOUTH: deal_generator.hand_mask(SOUTH),
+    }
+
+
+class PairedDealGeneratorTest(unittest.TestCase):
+    def test_same_hands_get_the_same_deals(self) -> None:
+        generator = paired.PairedDealGenerator([_known(), _known()], seed=3)
+        masks = np.concatenate(list(generator.batches(500, 128)), axis=1)
+
+        self.assertEqual(masks.shape, (2, 500, dds.DDS_HANDS))
+        self.assertEqual(masks[0].tolist(), masks[1].tolist())
+
+    def test_swapped_card_keeps_the_rest_of_the_layout(self) -> None:
+        east = deal_generator.SeatConstraint.parse("", "6-")
+        generator = paired.PairedDealGenerator([_known(), _known(SWAPPED)], {dds.HAND_EAST: east}, seed=5)
+        base, variant = np.concatenate(list(generator.batches(300, 100)), axis=1)
+        spade_two = np.uint64(deal_generator.hand_mask("2..."))
+        heart_queen = np.uint64(deal_generator.hand_mask(".Q.."))
+
+        # The hand that gets the HQ in the baseline gets the S2 in the variant,
+        # and every other unknown card stays where it was.
+        self.assertTrue(((base ^ variant) & ~(spade_two | heart_queen) == 0).all())
+        self.assertEqual(((base & heart_queen) != 0).tolist(), ((variant & spade_two) != 0).tolist())
+        self.assertEqual(bitboard.popcount(variant).tolist(), [[13] * 4] * 300)
+        self.assertTrue((bitboard.hcp(base[:, dds.HAND_EAST]) >= 6).all())
+        self.assertTrue((bitboard.hcp(variant[:, dds.HAND_EAST]) >= 6).all())
+        self.assertGreaterEqual(generator.report.accepted, 300)
+        joint = generator.report.accepted / generator.report.candidates
+        self.assertTrue(all(rate >= joint for rate in generator.acceptance))
+
+    def test_variants_need_the_same_vacancies(self) -> None:
+        partial = {dds.HAND_NORTH: deal_generator.hand_mask(NORTH), dds.HAND_SOUTH: deal_generator.hand_mask("QT98.A73.K54.AJ")}
+
+        with self.assertRaises(ValueError):
+            paired.PairedDealGenerator([_known(), partial])
+
+
+class ScoringTest(unittest.TestCase):
+    def test_contract_scores(self) -> None:
+        self.assertEqual(paired.contract_score(3, dds.SUIT_NT, [9, 10, 7], False).tolist(), [400, 430, -100])
+        self.assertEqual(paired.contract_score(4, dds.SUIT_SPADE, [10], True).tolist(), [620])
+        self.assertEqual(paired.contract_score(6, dds.SUIT_HEART, [12, 11], True).tolist(), [1430, -100])
+        self.assertEqual(paired.contract_score(7, dds.SUIT_NT, [13], False).tolist(), [1520])
+        self.assertEqual(paired.contract_score(5, dds.SUIT_CLUB, [11], False).tolist(), [400])
+        self.assertEqual(paired.contract_score(2, dds.SUIT_DIAMOND, [9], False).tolist(), [110])
+
+    def test_imps(self) -> None:
+        self.assertEqual(paired.imps([0, 10, 20, -50, 420, 430, 1000, -4000]).tolist(), [0, 0, 1, -2, 9, 10, 14, -24])
+
+    def test_pairing_shrinks_the_standard_error(self) -> None:
+        rng = np.random.default_rng(1)
+        layout = rng.random(2000)
+        baseline = (layout < 0.5).astype(float)
+        variant = (layout < 0.55).astype(float)
+        summary = paired.paired_difference(variant, baseline)
+
+        self.assertAlmostEqual(summary["mean_difference"], variant.mean() - baseline.mean())
+        self.assertLess(summary["standard_error"], summary["independent_standard_error"] / 2)
+        self.assertGreater(summary["simulation_ratio"], 4)
+        low, high = summary["interval"]
+        self.assertLess(low, summary["mean_difference"])
+        self.assertGreater(high, summary["mean_difference"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+try:
+    from . import dds, deal_generator, sim_store
+    from .dd_cache import UNSOLVED
+except ImportError:
+    import dds
+    import deal_generator
+    import sim_store
+    from dd_cache import UNSOLVED
+
+
+def _deals(count, value=7):
+    owners = np.arange(count * 13, dtype=np.uint8).reshape(count, 13)
+    tables = np.full((count, 5, 4), value, dtype=np.int8)
+    return owners, tables
+
+
+class SimulationStoreTest(unittest.TestCase):
+    def test_key_ignores_trivial_constraints_only(self) -> None:
+        known = {dds.HAND_NORTH: deal_generator.hand_mask("AKQJ.T98.765.432"), dds.HAND_SOUTH: 0}
+        east = deal_generator.SeatConstraint.parse("5-13,0-13,0-13,0-13", "8-37", "any")
+        key = sim_store.simulation_key(known, {dds.HAND_EAST: east}, "", 3)
+
+        self.assertEqual(
+            key,
+            sim_store.simulation_key(
+                {dds.HAND_NORTH: known[dds.HAND_NORTH]},
+                {dds.HAND_EAST: east, dds.HAND_WEST: deal_generator.SeatConstraint.parse("0-13,,,", "0-37")},
+                "  ",
+                3,
+            ),
+        )
+        self.assertNotEqual(key, sim_store.simulation_key(known, {dds.HAND_EAST: east}, "", 4))
+        self.assertNotEqual(key, sim_store.simulation_key(known, {dds.HAND_WEST: east}, "", 3))
+        self.assertNotEqual(key, sim_store.simulation_key(known, {dds.HAND_EAST: east}, "reject", 3))
+
+    def test_derive_seed_keeps_first_run_and_separates_top_ups(self) -> None:
+        self.assertIsNone(sim_store.derive_seed(None, 100))
+        self.assertEqual(sim_store.derive_seed(9, 0), 9)
+        self.assertEqual(sim_store.derive_seed(9, 100), sim_store.derive_seed(9, 100))
+        self.assertNotEqual(sim_store.derive_seed(9, 100), sim_store.derive_seed(9, 200))
+        self.assertLess(sim_store.derive_seed(9, 100), 1 << 31)
+
+    def test_append_and_evict_by_deal_count(self) -> None:
+        store = sim_store.SimulationStore(max_deals=12)
+        store.append("a", *_deals(4), 0)
+        store.append("a", *_deals(2, value=3), 4)
+        store.put("b", *_deals(5))
+
+        owners, tables = store.get("a")
+        self.assertEqual(len(owners), 6)
+        self.assertEqual(tables[:, 0, 0].tolist(), [7] * 4 + [3] * 2)
+        store.put("c", *_deals(5))
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(store.stats()["deals"], 11)
+        self.assertEqual((store.stats()["hits"], store.stats()["misses"]), (1, 1))
+
+    def test_concurrent_appends_keep_every_deal(self) -> None:
+        store = sim_store.SimulationStore()
+
+        def top_up(value):
+            for _ in range(50):
+                while True:
+                    stored = store.get("a")
+                    if store.append("a", *_deals(1, value), len(stored[0]) if stored else 0):
+                        break
+
+        threads = [threading.Thread(target=top_up, args=(value,)) for value in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        _, tables = store.get("a")
+        self.assertEqual(len(tables), 400)
+        self.assertEqual(np.bincount(tables[:, 0, 0]).tolist(), [50] * 8)
+
+    def test_append_after_another_top_up_writes_nothing(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "simulations.sqlite")
+            first = sim_store.SimulationStore(path=path)
+            second = sim_store.SimulationStore(path=path)
+            self.assertTrue(first.append("key", *_deals(3), 0))
+            first.get("key")
+            # Both workers read 3 deals and top up with the same derived seed.
+            self.assertTrue(second.append("key", *_deals(2, value=5), 3))
+            self.assertFalse(first.append("key", *_deals(2, value=5), 3))
+            self.assertFalse(second.append("key", *_deals(2, value=5), 3))
+            first.close()
+            second.close()
+
+            reader = sim_store.SimulationStore(path=path)
+            _, tables = reader.get("key")
+            reader.close()
+
+        self.assertEqual(tables[:, 0, 0].tolist(), [7] * 3 + [5] * 2)
+
+    def test_sqlite_tier_outlives_the_process_memory(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "simulations.sqlite")
+            first = sim_store.SimulationStore(path=path)
+            first.append("key", *_deals(3), 0)
+            first.close()
+
+            second = sim_store.SimulationStore(path=path)
+            owners, tables = second.get("key")
+            second.close()
+
+        self.assertEqual(owners.tolist(), _deals(3)[0].tolist())
+        self.assertEqual(tables.shape, (3, 5, 4))
+
+    def test_missing_strains_marks_deals_to_solve_again(self) -> None:
+        _, tables = _deals(3)
+        tables[1, dds.SUIT_NT] = UNSOLVED
+
+        self.assertEqual(sim_store.missing_strains(tables, [dds.SUIT_SPADE]).tolist(), [False] * 3)
+        self.assertEqual(
+            sim_store.missing_strains(tables, [dds.SUIT_SPADE, dds.SUIT_NT]).tolist(), [False, True, False]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
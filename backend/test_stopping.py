@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+try:
+    from . import dds, stopping
+except ImportError:
+    import dds
+    import stopping
+
+
+def _tables(tricks, strain, hand):
+    tables = np.zeros((len(tricks), 5, 4), dtype=np.intc)
+    tables[:, strain, hand] = tricks
+    return tables
+
+
+class StoppingTest(unittest.TestCase):
+    def test_parse_contract(self) -> None:
+        self.assertEqual(stopping.parse_contract("4S"), (4, dds.SUIT_SPADE))
+        self.assertEqual(stopping.parse_contract(" 3nt"), (3, dds.SUIT_NT))
+        self.assertEqual(stopping.parse_contract("6 C"), (6, dds.SUIT_CLUB))
+        for text in ("8S", "4X", "", "S4"):
+            with self.assertRaises(ValueError):
+                stopping.parse_contract(text)
+
+    def test_interval_never_collapses(self) -> None:
+        none = stopping.make_interval(0, 400)
+        half = stopping.make_interval(200, 400)
+
+        self.assertEqual(none["make_probability"], 0.0)
+        self.assertGreater(none["standard_error"], 0.0)
+        self.assertEqual(none["interval"][0], 0.0)
+        self.assertAlmostEqual(half["standard_error"], 0.5 / np.sqrt(400 + 1.959964**2), places=6)
+        self.assertAlmostEqual(sum(half["interval"]) / 2, 0.5)
+        self.assertLess(stopping.make_interval(2000, 4000)["standard_error"], half["standard_error"])
+
+    def test_rule_counts_the_declarers_makes_and_stops_at_the_target(self) -> None:
+        rule = stopping.PrecisionRule.parse("4H", dds.HAND_SOUTH, target=0.04)
+        batch = _tables([10, 9] * 25, dds.SUIT_HEART, dds.HAND_SOUTH)
+
+        self.assertFalse(rule.update(batch))
+        self.assertFalse(rule.update(_tables([13] * 50, dds.SUIT_HEART, dds.HAND_NORTH)))
+        self.assertEqual((rule.makes, rule.deals), (25, 100))
+        for _ in range(3):
+            rule.update(batch)
+        self.assertTrue(rule.met)
+        self.assertEqual(rule.report()["deals"], 250)
+        self.assertAlmostEqual(rule.report()["make_probability"], 0.4)
+        self.assertTrue(rule.report()["met"])
+
+    def test_rule_waits_for_the_minimum_number_of_deals(self) -> None:
+        rule = stopping.PrecisionRule.parse("1NT", dds.HAND_NORTH, target=0.5)
+
+        self.assertFalse(rule.update(_tables([7] * 99, dds.SUIT_NT, dds.HAND_NORTH)))
+        self.assertTrue(rule.update(_tables([7], dds.SUIT_NT, dds.HAND_NORTH)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import math
+import unittest
+
+import numpy as np
+
+try:
+    from . import bitboard, dds, deal_generator, deal_sampler, stopping, stratified
+except ImportError:
+    import bitboard
+    import dds
+    import deal_generator
+    import deal_sampler
+    import stopping
+    import stratified
+
+
+NORTH = "AKJ32.K4.A92.Q83"
+SOUTH = "QT98.A73.K54.AJ2"
+
+
+def _known():
+    return {
+        dds.HAND_NORTH: deal_generator.hand_mask(NORTH),
+        dds.HAND_SOUTH: deal_generator.hand_mask(SOUTH),
+    }
+
+
+class StratifiedSamplingTest(unittest.TestCase):
+    def test_pattern_probabilities_are_exact(self) -> None:
+        strata = stratified.ShapeStrata.build(_known(), {})
+        unknown = [13 - a - b for a, b in zip((5, 2, 3, 3), (4, 3, 3, 3))]
+
+        self.assertEqual(strata.seat, dds.HAND_EAST)
+        self.assertAlmostEqual(strata.probabilities.sum(), 1.0)
+        for pattern, probability in zip(strata.patterns.tolist(), strata.probabilities):
+            expected = math.prod(math.comb(n, k) for n, k in zip(unknown, pattern)) / math.comb(26, 13)
+            self.assertAlmostEqual(probability, expected)
+
+    def test_pattern_counts_follow_the_constraints(self) -> None:
+        east = deal_generator.SeatConstraint.parse("", "3-8")
+        constraints = {dds.HAND_EAST: east}
+        strata = stratified.ShapeStrata.build(_known(), constraints)
+
+        for pattern, probability in list(zip(strata.patterns.tolist(), strata.probabilities))[:8]:
+            shape = ",".join(str(n) for n in pattern)
+            fixed = deal_sampler.ExactDealSampler(
+                _known(), {dds.HAND_EAST: deal_generator.SeatConstraint.parse(shape, "3-8")}
+            )
+            whole = deal_sampler.ExactDealSampler(_known(), constraints)
+            self.assertAlmostEqual(probability, fixed.count / whole.count)
+
+    def test_allocation_is_systematic(self) -> None:
+        rng = np.random.default_rng(5)
+        probabilities = np.array([0.5, 0.3, 0.15, 0.05])
+
+        for _ in range(20):
+            quotas = stratified.allocate(probabilities, 30, rng)
+            self.assertEqual(quotas.sum(), 30)
+            self.assertTrue((np.abs(quotas - probabilities * 30) < 1).all())
+
+    def test_batches_follow_the_pattern_probabilities_in_order(self) -> None:
+        east = deal_generator.SeatConstraint.parse("", "4-")
+        sampler = stratified.StratifiedSampler(_known(), {dds.HAND_EAST: east}, 4000, seed=2)
+        batches = list(sampler.batches(4000, 200))
+        deals = np.concatenate(batches)
+        counts = np.bincount(sampler.strata.classify(deals), minlength=len(sampler.strata))
+
+        self.assertEqual(len(deals), 4000)
+        self.assertTrue((bitboard.hcp(deals[:, dds.HAND_EAST]) >= 4).all())
+        self.assertTrue((deals[:, dds.HAND_NORTH] == _known()[dds.HAND_NORTH]).all())
+        self.assertLess(np.abs(counts / 4000 - sampler.strata.probabilities).max() * 4000, 20)
+        for batch in batches:
+            self.assertTrue((np.diff(sampler.strata.classify(batch)) >= 0).all())
+        self.assertEqual(sampler.report.accepted, 4000)
+
+    def test_rare_patterns_are_drawn_in_their_own_shape(self) -> None:
+        east = deal_generator.SeatConstraint.parse("", "4-")
+        sampler = stratified.StratifiedSampler(_known(), {dds.HAND_EAST: east}, 300, seed=4)
+        stratum = int(sampler.strata.probabilities.argmin())
+        # What _batch falls back to when the candidates never hit stratum.
+        deals = sampler._exact_sampler(stratum).generate(200)
+
+        self.assertTrue((sampler.strata.classify(deals) == stratum).all())
+        self.assertTrue((bitboard.hcp(deals[:, dds.HAND_EAST]) >= 4).all())
+        self.assertTrue((deals[:, dds.HAND_SOUTH] == _known()[dds.HAND_SOUTH]).all())
+
+    def test_every_quota_is_met_when_candidates_run_out(self) -> None:
+        east = deal_generator.SeatConstraint.parse("", "4-")
+        sampler = stratified.StratifiedSampler(_known(), {dds.HAND_EAST: east}, 300, seed=4)
+        original, stratified.MAX_DRAWS = stratified.MAX_DRAWS, 0
+        try:
+            deals = sampler.generate(300)
+        finally:
+            stratified.MAX_DRAWS = original
+        counts = np.bincount(sampler.strata.classify(deals), minlength=len(sampler.strata))
+
+        self.assertEqual(sampler.drawn_exactly, 300)
+        self.assertTrue((np.abs(counts - sampler.strata.probabilities * 300) < 1).all())
+
+    def test_precision_rule_uses_the_design_effect(self) -> None:
+        tables = np.zeros((200, 5, 4), dtype=np.intc)
+        tables[:120, dds.SUIT_SPADE, dds.HAND_NORTH] = 12
+        plain = stopping.PrecisionRule.parse("6S", dds.HAND_NORTH, target=0.01)
+        ordered = stopping.PrecisionRule.parse("6S", dds.HAND_NORTH, target=0.01)
+        ordered.stratified = True
+        plain.update(tables)
+        ordered.update(tables)
+
+        self.assertEqual(plain.design_effect, 1.0)
+        self.assertLess(ordered.design_effect, 0.05)
+        self.assertLess(ordered.report()["standard_error"], plain.report()["standard_error"] / 4)
+        self.assertIn("design_effect", ordered.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import random
+import unittest
+
+import numpy as np
+
+try:
+    from . import dds, symmetry
+    from .test_dds import _random_pbn
+except ImportError:
+    import dds
+    import symmetry
+    from test_dds import _random_pbn
+
+
+def _relabel(holdings, rotation, permutation):
+    owners, _ = symmetry.card_owners(holdings)
+    image = owners.copy()
+    for suit, target in enumerate(permutation):
+        image[:, target] = (owners[:, suit] + rotation) % dds.DDS_HANDS
+    return symmetry.owners_to_holdings(image)
+
+
+class CanonicalizeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(31)
+        self.holdings = dds.pbn_to_holdings([_random_pbn(rng) for _ in range(8)])
+
+    def test_owner_round_trip(self) -> None:
+        owners, complete = symmetry.card_owners(self.holdings)
+
+        self.assertTrue(complete.all())
+        self.assertEqual(symmetry.owners_to_holdings(owners).tolist(), self.holdings.tolist())
+
+    def test_equivalent_deals_share_a_canonical_form(self) -> None:
+        canonical, transforms = symmetry.canonicalize(self.holdings)
+        relabelled = _relabel(self.holdings, 3, (2, 0, 3, 1))
+
+        self.assertEqual(symmetry.canonicalize(relabelled)[0].tolist(), canonical.tolist())
+        self.assertEqual(
+            _relabel(self.holdings[:1], *symmetry.TRANSFORMS[transforms[0]]).tolist(),
+            canonical[:1].tolist(),
+        )
+
+    def test_table_transforms_are_inverse(self) -> None:
+        rng = random.Random(2)
+        tables = np.array(
+            [[[rng.randrange(14) for _ in range(4)] for _ in range(5)] for _ in range(8)]
+        )
+        transforms = np.arange(8) * 11
+
+        canonical = symmetry.tables_to_canonical(tables, transforms)
+
+        self.assertEqual(symmetry.tables_from_canonical(canonical, transforms).tolist(), tables.tolist())
+        self.assertEqual(canonical[:, dds.SUIT_NT].sum(), tables[:, dds.SUIT_NT].sum())
+
+    def test_incomplete_deals_are_left_alone(self) -> None:
+        holdings = self.holdings[:1].copy()
+        holdings[0, dds.HAND_EAST, dds.SUIT_CLUB] = 0
+
+        canonical, transforms = symmetry.canonicalize(holdings)
+
+        self.assertEqual(canonical.tolist(), holdings.tolist())
+        self.assertEqual(transforms.tolist(), [symmetry.IDENTITY])
+
+
+@unittest.skipIf(not dds.library_available(), "libdds is not available")
+class CanonicalTableTest(unittest.TestCase):
+    def test_tables_follow_from_the_canonical_deal(self) -> None:
+        rng = random.Random(37)
+        holdings = dds.pbn_to_holdings([_random_pbn(rng) for _ in range(4)])
+
+        canonical, transforms = symmetry.canonicalize(holdings)
+
+        self.assertEqual(
+            symmetry.tables_from_canonical(dds.calc_all_tables(canonical), transforms).tolist(),
+            dds.calc_all_tables(holdings).tolist(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()